@@ -0,0 +1,430 @@
+"""
+幼小衔接规划 HTTP/JSON 服务，供小程序、学校系统等直接调用
+- POST /v1/assess  能力评估（不需要 LLM）；传 profiles 列表时批量评估，"save": true 时存入评估记录库
+- GET  /v1/children/{child_id}/assessments 某个孩子的历次评估；GET /v1/classes/{class_id}/stats 班级汇总与跨学期进度
+- POST /v1/plan    生成个性化计划
+- POST /v1/chat    问答；"stream": true 时以 SSE 逐段返回，"tenant" 指定地区知识库
+- GET  /healthz 存活检查；GET /readyz 就绪检查（Agent 预热完成才返回 200）；GET /metrics Prometheus 指标
+所有请求共用一个启动时预热的 Agent；同时处理的 LLM 请求数有上限，排队超时返回 503，处理超时返回 504
+
+启动：python api_server.py --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+try:
+    from aiohttp import web
+except ImportError as exc:
+    raise ImportError("缺少依赖：aiohttp") from exc
+
+import metrics
+from assessment import calculate_assessment, calculate_assessments_batch, expand_batch_results, flatten_profile
+from assessment_store import AssessmentStore
+
+load_dotenv()
+
+logger = logging.getLogger("api_server")
+
+# ==================== 配置 ====================
+
+class Config:
+    API_HOST = os.getenv("API_HOST", "0.0.0.0")
+    API_PORT = int(os.getenv("API_PORT", "8080"))
+    API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "64"))  # 同时处理的计划 / 问答请求数
+    API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "10"))  # 排队超过这么多秒返回 503
+    API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "120"))  # 单个请求处理超时（秒），超时返回 504
+    API_MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_BYTES", str(256 * 1024)))
+    API_MAX_BATCH = int(os.getenv("API_MAX_BATCH", "1000"))  # 批量评估一次最多多少个档案
+    ASSESSMENT_DB_PATH = os.getenv("ASSESSMENT_DB_PATH", ".data/assessments.sqlite3")  # 空字符串表示不保存评估记录
+
+# ==================== 请求模型 ====================
+
+class Profile(BaseModel):
+    """孩子档案，字段与 Web 界面一致；只校验嵌套结构，其余字段原样保留"""
+
+    model_config = ConfigDict(extra="allow")
+
+    language: Dict[str, Any] = Field(default_factory=dict)
+    math: Dict[str, Any] = Field(default_factory=dict)
+
+    def data(self) -> Dict[str, Any]:
+        return self.model_dump(exclude_unset=True)
+
+
+class AssessRequest(BaseModel):
+    profile: Optional[Profile] = None
+    profiles: Optional[List[Profile]] = None
+    save: bool = False  # 存入评估记录库；孩子以 child_id（批量时取各档案的 child_id 或 name）区分
+    child_id: Optional[str] = Field(None, max_length=128)
+    class_id: str = Field("", max_length=64)
+    term: Optional[str] = Field(None, max_length=16)  # 默认按评估时间推算，如 "2025秋"
+
+
+class PlanRequest(BaseModel):
+    profile: Profile = Field(default_factory=Profile)
+    duration: str = Field("3个月", max_length=20)
+    force_refresh: bool = False
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=2000)
+    session_id: Optional[str] = Field(None, max_length=128)
+    profile: Optional[Profile] = None
+    tenant: Optional[str] = Field(None, max_length=64, pattern=r"^[\w-]+$")  # 地区，对应 KNOWLEDGE_BASE_DIR/<地区>.md
+    stream: bool = False
+
+# ==================== 服务状态 ====================
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, **extra):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.extra = extra
+
+
+class AgentService:
+    """共享的 Agent 与并发上限；Agent 在后台线程中构建，构建完成前 /readyz 返回 503"""
+
+    def __init__(self, max_concurrency: int = Config.API_MAX_CONCURRENCY):
+        self.agent = None
+        self.error: Optional[str] = None
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._warmup: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._warmup = asyncio.create_task(self._build())
+
+    async def stop(self) -> None:
+        if self._warmup is not None and not self._warmup.done():
+            self._warmup.cancel()
+
+    async def _build(self) -> None:
+        def build():
+            from kindergarten_agent_full import KindergartenAgent
+
+            agent = KindergartenAgent()
+            agent._chat_chain()  # 提示词链也提前建好
+            return agent
+
+        start = time.perf_counter()
+        try:
+            self.agent = await asyncio.to_thread(build)
+        except Exception as exc:
+            self.error = f"{type(exc).__name__}: {exc}"
+            logger.error("Agent 初始化失败：%s", self.error)
+        else:
+            logger.info("Agent 就绪，用时 %.1f 秒", time.perf_counter() - start)
+
+    @property
+    def ready(self) -> bool:
+        return self.agent is not None
+
+    def require_agent(self):
+        if self.agent is None:
+            raise ApiError(503, self.error or "服务预热中，请稍后重试", retry_after=5)
+        return self.agent
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个处理名额；排队超过 API_QUEUE_TIMEOUT 直接返回 503，避免请求无限堆积"""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), Config.API_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.inc("kg_http_rejected_total", reason="queue_timeout")
+            raise ApiError(503, "服务繁忙，请稍后重试", retry_after=1) from None
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+
+SERVICE = web.AppKey("service", AgentService)
+STORE = web.AppKey("assessment_store", AssessmentStore)  # 未配置 ASSESSMENT_DB_PATH 时为 None
+
+# ==================== 辅助函数 ====================
+
+async def _read(request: web.Request, model):
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        raise ApiError(400, "请求体不是合法的 JSON") from None
+    if not isinstance(data, dict):
+        raise ApiError(400, "请求体应为 JSON 对象")
+    return model.model_validate(data)
+
+
+async def _with_timeout(coro):
+    try:
+        return await asyncio.wait_for(coro, Config.API_REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ApiError(504, "处理超时") from None
+
+
+def _sse(data: dict, event: Optional[str] = None) -> bytes:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+@web.middleware
+async def _errors(request: web.Request, handler):
+    """统一的 JSON 错误格式，并按路由统计请求数和耗时"""
+    route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unmatched"
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except ApiError as exc:
+        status = exc.status
+        headers = {"Retry-After": str(exc.extra.pop("retry_after"))} if "retry_after" in exc.extra else None
+        return web.json_response({"error": exc.message, **exc.extra}, status=status, headers=headers)
+    except ValidationError as exc:
+        status = 400
+        errors = [
+            {"loc": ".".join(str(part) for part in error["loc"]), "msg": error["msg"]}
+            for error in exc.errors()
+        ]
+        return web.json_response({"error": "参数不正确", "details": errors}, status=status)
+    except web.HTTPException as exc:
+        status = exc.status
+        raise
+    except Exception:
+        logger.exception("处理 %s 失败", route)
+        return web.json_response({"error": "服务内部错误"}, status=500)
+    finally:
+        metrics.inc("kg_http_requests_total", route=route, status=status)
+        metrics.observe("kg_http_seconds", time.perf_counter() - start, route=route)
+
+# ==================== 接口 ====================
+
+async def healthz(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def readyz(request: web.Request) -> web.Response:
+    service = request.app[SERVICE]
+    body: Dict[str, Any] = {
+        "ready": service.ready,
+        "in_flight": service.in_flight,
+        "max_concurrency": service.max_concurrency,
+    }
+    if service.error:
+        body["error"] = service.error
+    if service.ready:
+        body["tenants"] = service.agent.knowledge_bases.loaded()  # 已加载的地区知识库及其内存估算
+    health = getattr(getattr(service.agent, "llm", None), "health", None)
+    if callable(health):
+        body["llm"] = health()  # 多网关路由时各网关的状态
+    return web.json_response(body, status=200 if service.ready else 503)
+
+
+async def metrics_text(request: web.Request) -> web.Response:
+    return web.Response(
+        body=metrics.render_prometheus().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+@contextmanager
+def _profile_errors():
+    """档案中的取值无法使用（如分数为 Infinity、列表字段不是列表）时返回 400，而不是服务内部错误"""
+    try:
+        yield
+    except (TypeError, AttributeError, OverflowError) as exc:
+        raise ApiError(400, f"档案格式不正确：{exc}") from None
+
+
+def _require_store(request: web.Request) -> AssessmentStore:
+    store = request.app[STORE]
+    if store is None:
+        raise ApiError(400, "未启用评估记录库（ASSESSMENT_DB_PATH）")
+    return store
+
+
+async def _save(request: web.Request, body: AssessRequest, profiles: List[Dict], results: List[Dict]) -> None:
+    store = _require_store(request)
+    records = [
+        {
+            "profile": profile,
+            "result": result,
+            "child_id": body.child_id if body.profile is not None else None,
+            "class_id": body.class_id,
+            "term": body.term,
+        }
+        for profile, result in zip(profiles, results)
+    ]
+    try:
+        # 一个事务写入整批，同时更新班级聚合
+        await asyncio.to_thread(store.add_many, records)
+    except ValueError as exc:
+        raise ApiError(400, str(exc)) from None
+
+
+async def assess(request: web.Request) -> web.Response:
+    body = await _read(request, AssessRequest)
+    if body.profiles is not None:
+        if len(body.profiles) > Config.API_MAX_BATCH:
+            raise ApiError(413, f"一次最多评估 {Config.API_MAX_BATCH} 个档案")
+        if not body.profiles:
+            return web.json_response({"results": []})
+        profiles = [profile.data() for profile in body.profiles]
+        # 向量化批量评估，结果与逐条评估一致
+        with _profile_errors():
+            batch = calculate_assessments_batch([flatten_profile(profile) for profile in profiles])
+        results = expand_batch_results(batch)
+        if body.save:
+            await _save(request, body, profiles, results)
+        return web.json_response({"results": results})
+    if body.profile is None:
+        raise ApiError(400, "需要提供 profile 或 profiles")
+    profile = body.profile.data()
+    with _profile_errors():
+        result = calculate_assessment(profile)
+    if body.save:
+        await _save(request, body, [profile], [result])
+    return web.json_response(result)
+
+
+async def child_assessments(request: web.Request) -> web.Response:
+    store = _require_store(request)
+    try:
+        limit = int(request.query.get("limit", "0")) or None
+    except ValueError:
+        raise ApiError(400, "limit 应为整数") from None
+    history = await asyncio.to_thread(store.history, request.match_info["child_id"], limit)
+    return web.json_response({"history": history})
+
+
+async def class_stats(request: web.Request) -> web.Response:
+    store = _require_store(request)
+    class_id = request.match_info["class_id"]
+    stats = await asyncio.to_thread(store.class_stats, class_id, request.query.get("term"))
+    stats["progress"] = await asyncio.to_thread(store.class_progress, class_id)
+    return web.json_response(stats)
+
+
+async def plan(request: web.Request) -> web.Response:
+    body = await _read(request, PlanRequest)
+    service = request.app[SERVICE]
+    agent = service.require_agent()
+    with _profile_errors():
+        profile = agent.build_profile(body.profile.data())
+    async with service.slot():
+        result = await _with_timeout(agent.agenerate_plan(profile, body.duration, body.force_refresh))
+    return web.json_response({"plan": result})
+
+
+async def chat(request: web.Request) -> web.StreamResponse:
+    body = await _read(request, ChatRequest)
+    service = request.app[SERVICE]
+    agent = service.require_agent()
+    profile_data = body.profile.data() if body.profile is not None else {}
+    with _profile_errors():
+        profile = agent.build_profile(profile_data) if profile_data else None
+    if body.tenant:
+        # 先加载地区知识库：不存在时在流式响应开始前返回 404
+        try:
+            await _with_timeout(agent.aknowledge_base_for(body.tenant))
+        except FileNotFoundError:
+            raise ApiError(404, f"未找到地区知识库：{body.tenant}") from None
+    async with service.slot():
+        if not body.stream:
+            answer = await _with_timeout(agent.achat(body.message, body.session_id, profile, body.tenant))
+            return web.json_response({"answer": answer, "session_id": body.session_id})
+        return await _chat_stream(request, agent, body, profile)
+
+
+async def _chat_stream(request: web.Request, agent, body: ChatRequest, profile) -> web.StreamResponse:
+    """SSE：每段回答一条 data 事件，结束时发送 done 事件；响应头发出后的错误以 error 事件告知"""
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # 经过 nginx 时不缓冲
+    })
+    await response.prepare(request)
+    try:
+        async with asyncio.timeout(Config.API_REQUEST_TIMEOUT):
+            async with aclosing(agent.achat_stream(body.message, body.session_id, profile, body.tenant)) as pieces:
+                async for piece in pieces:
+                    await response.write(_sse({"delta": piece}))
+        await response.write(_sse({"session_id": body.session_id}, event="done"))
+    except ConnectionResetError:
+        pass  # 客户端已断开；生成器关闭后不会写入回答缓存和会话记忆
+    except TimeoutError:
+        await response.write(_sse({"error": "处理超时"}, event="error"))
+    except Exception as exc:
+        logger.exception("流式问答失败")
+        await response.write(_sse({"error": f"{type(exc).__name__}"}, event="error"))
+    return response
+
+# ==================== 应用 ====================
+
+async def _on_startup(app: web.Application) -> None:
+    app[SERVICE].start()
+
+
+async def _on_cleanup(app: web.Application) -> None:
+    await app[SERVICE].stop()
+
+
+async def _close_store(app: web.Application) -> None:
+    app[STORE].close()
+
+
+def build_app(service: Optional[AgentService] = None, store: Optional[AssessmentStore] = None) -> web.Application:
+    """service 可传入已就绪的实例（如测试时注入），否则启动时在后台构建 Agent；store 默认按 ASSESSMENT_DB_PATH 打开"""
+    app = web.Application(client_max_size=Config.API_MAX_BODY_BYTES, middlewares=[_errors])
+    app[SERVICE] = service or AgentService()
+    if store is None and Config.ASSESSMENT_DB_PATH:
+        store = AssessmentStore(Config.ASSESSMENT_DB_PATH)
+        app.on_cleanup.append(_close_store)  # 传入的实例由调用方负责关闭
+    app[STORE] = store
+    if service is None:
+        app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    app.router.add_get("/metrics", metrics_text)
+    app.router.add_post("/v1/assess", assess)
+    app.router.add_get("/v1/children/{child_id}/assessments", child_assessments)
+    app.router.add_get("/v1/classes/{class_id}/stats", class_stats)
+    app.router.add_post("/v1/plan", plan)
+    app.router.add_post("/v1/chat", chat)
+    return app
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="幼小衔接规划 HTTP/JSON 服务")
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--port", type=int, default=Config.API_PORT)
+    parser.add_argument("--access-log", action="store_true", help="输出每个请求的访问日志")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    web.run_app(
+        build_app(),
+        host=args.host,
+        port=args.port,
+        access_log=logging.getLogger("aiohttp.access") if args.access_log else None,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,864 @@
+"""
+Web 界面的页面与组件，供 app.py 调用
+- Streamlit 每次整页重跑都会重新执行 app.py；放在这里的静态内容、缓存函数和片段定义只在导入时构建一次
+- 页面内的交互区域都是 st.fragment：点击只重跑所在片段，不重跑侧边栏和页面其余部分
+- 切换页面的按钮放在片段外，通过 on_click 改菜单后整页重跑
+- agent 在后台线程构建（warm_up_agent），页面渲染不等待；生成计划、问答时再 get_agent 取用
+- 提交的评估存入 ASSESSMENT_DB_PATH 指向的评估记录库，报告下方显示该孩子的历次评估和同龄百分位
+- 班级看板只读评估记录库的汇总表，图表数据量与记录条数无关
+"""
+
+import itertools
+import os
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+import streamlit as st
+
+import cohort_charts
+import metrics
+from assessment import calculate_assessment, profile_scores
+from assessment_store import AssessmentStore
+from cohort_norms import ALL_AGES, CohortNorms
+
+load_dotenv()
+
+
+# ==================== 辅助函数 ====================
+def llm_enabled() -> bool:
+    return bool(
+        os.getenv("OPENAI_API_KEY")
+        or os.getenv("ANTHROPIC_AUTH_TOKEN")
+        or os.getenv("ANTHROPIC_API_KEY")
+    )
+
+
+def _build_agent():
+    from kindergarten_agent_full import KindergartenAgent
+
+    agent = KindergartenAgent()
+    agent._chat_chain()  # 提示词链也提前建好
+    return agent
+
+
+@st.cache_resource(show_spinner=False)
+def _agent_warmup() -> Future:
+    # 每个进程只构建一次，在后台线程进行，页面渲染不等它
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-warmup")
+    future = executor.submit(_build_agent)
+    executor.shutdown(wait=False)
+    return future
+
+
+def warm_up_agent() -> None:
+    """启用 LLM 时在后台开始构建 agent，立即返回"""
+    if llm_enabled():
+        _agent_warmup()
+
+
+def get_agent():
+    """等待后台构建完成并返回 agent；构建失败时清掉缓存，下次调用重新构建"""
+    future = _agent_warmup()
+    try:
+        return future.result()
+    except Exception:
+        _agent_warmup.clear()
+        raise
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def tenant_options() -> List[str]:
+    # 地区列表来自目录扫描，一分钟内的重跑直接复用
+    return get_agent().tenants()
+
+
+@st.cache_resource
+def get_assessment_store() -> Optional[AssessmentStore]:
+    # 每个进程一个连接；ASSESSMENT_DB_PATH 设为空字符串时不保存评估记录
+    path = os.getenv("ASSESSMENT_DB_PATH", ".data/assessments.sqlite3")
+    return AssessmentStore(path) if path else None
+
+
+@st.cache_resource(ttl=600, show_spinner=False)
+def get_cohort_norms() -> Optional[CohortNorms]:
+    # 本进程写入的评估随时计入；每 10 分钟从库里重新载入一次，带上其他进程写入的评估
+    store = get_assessment_store()
+    return CohortNorms.from_store(store) if store is not None else None
+
+
+@st.cache_resource
+def start_metrics_server():
+    # 每个进程只启动一次；METRICS_PORT 未设置时不对外暴露
+    port = int(os.getenv("METRICS_PORT", "0"))
+    return metrics.start_http_server(port) if port > 0 else None
+
+
+def is_admin() -> bool:
+    """访问地址带 ?admin=<METRICS_ADMIN_TOKEN> 时视为管理员，本次浏览器会话内有效"""
+    token = os.getenv("METRICS_ADMIN_TOKEN", "")
+    if token and st.query_params.get("admin") == token:
+        st.session_state["is_admin"] = True
+    return bool(token) and st.session_state.get("is_admin", False)
+
+
+@st.fragment
+def render_metrics_page() -> None:
+    # 片段：点“刷新”只重跑指标页本身
+    st.title("📈 运行指标")
+    st.caption(f"本进程启动以来的统计；分位数取每项最近 {metrics.WINDOW} 次")
+    st.button("刷新")
+
+    st.markdown("### 各阶段耗时（毫秒）")
+    stages = metrics.stage_summary()
+    if stages:
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+    else:
+        st.info("暂无数据")
+
+    st.markdown("### LLM 调用耗时（毫秒）")
+    calls = metrics.llm_summary()
+    if calls:
+        st.dataframe(calls, use_container_width=True, hide_index=True)
+    else:
+        st.info("暂无数据")
+
+    counters = metrics.REGISTRY.counters()
+    tokens = [row for row in counters if row["name"] == "kg_llm_tokens_total"]
+    caches = [row for row in counters if row["name"] == "kg_cache_requests_total"]
+    routes = [row for row in counters if row["name"] in ("kg_llm_route_total", "kg_llm_hedge_total")]
+    errors = [
+        row for row in counters
+        if row["name"] in ("kg_llm_errors_total", "kg_stage_errors_total")
+    ]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### Token 用量")
+        if tokens:
+            st.dataframe(tokens, use_container_width=True, hide_index=True)
+        else:
+            st.info("暂无数据")
+    with col2:
+        st.markdown("### 缓存命中")
+        for cache in sorted({row["cache"] for row in caches}):
+            hits = sum(row["value"] for row in caches if row["cache"] == cache and row["result"] != "miss")
+            total = sum(row["value"] for row in caches if row["cache"] == cache)
+            st.metric(f"{cache} 缓存命中率", f"{hits / total:.0%}", f"{int(hits)}/{int(total)}")
+        if not caches:
+            st.info("暂无数据")
+
+    if routes:
+        st.markdown("### 网关路由")
+        st.dataframe(routes, use_container_width=True, hide_index=True)
+
+    st.markdown("### 错误")
+    if errors:
+        st.dataframe(errors, use_container_width=True, hide_index=True)
+    else:
+        st.success("暂无错误")
+
+    with st.expander("Prometheus 文本"):
+        st.code(metrics.render_prometheus(), language="text")
+
+
+def set_menu(target: str) -> None:
+    st.session_state["menu"] = target
+
+
+def scored_radio(prompt, options, index=2, key=None):
+    scores = list(range(1, len(options) + 1))
+    return st.radio(
+        prompt,
+        scores,
+        index=index,
+        horizontal=True,
+        format_func=lambda x: options[x - 1],
+        key=key,
+    )
+
+
+def render_plan(plan: dict) -> None:
+    if not isinstance(plan, dict):
+        st.markdown(str(plan))
+        return
+
+    if "raw" in plan:
+        st.markdown(plan["raw"])
+        return
+
+    duration = plan.get("duration")
+    if duration:
+        st.markdown(f"**周期：** {duration}")
+
+    weekly_goals = plan.get("weekly_goals", [])
+    if weekly_goals:
+        st.markdown("### 每周重点目标")
+        for item in weekly_goals:
+            st.markdown(f"- {item}")
+
+    daily_activities = plan.get("daily_activities", [])
+    if daily_activities:
+        st.markdown("### 每日推荐活动")
+        st.table(daily_activities)
+
+    resources = plan.get("resources", [])
+    if resources:
+        st.markdown("### 推荐资源")
+        for item in resources:
+            st.markdown(f"- {item}")
+
+    parent_tips = plan.get("parent_tips", [])
+    if parent_tips:
+        st.markdown("### 家长注意事项")
+        for item in parent_tips:
+            st.markdown(f"- {item}")
+
+    evaluation = plan.get("evaluation_criteria", [])
+    if evaluation:
+        st.markdown("### 评估标准")
+        for item in evaluation:
+            st.markdown(f"- {item}")
+
+
+FALLBACK_QA = {
+    "要不要提前学小学内容": "不建议系统学习小学内容，但可以通过游戏方式接触：\n\n1. **亲子阅读** - 培养语感和文字认知\n2. **数学游戏** - 通过积木、扑克牌等理解数概念\n3. **生活实践** - 认识时间、钱币等\n\n避免超前学习导致孩子入学后失去新鲜感，产生厌学情绪。",
+    "孩子不想去小学": "可以尝试以下方法：\n\n1. **参观小学** - 熟悉校园环境\n2. **读绘本** - 《我上小学了》《小魔怪要上学》\n3. **认识新朋友** - 了解邻居的哥哥姐姐\n4. **正向引导** - 避免用'小学很辛苦'恐吓",
+    "孩子注意力不集中": "建议：\n\n1. **时间管理** - 从15分钟开始训练\n2. **环境营造** - 保持安静，关掉电视\n3. **游戏培养** - 拼图、积木、棋类\n4. **一次一件事** - 避免边玩边学",
+    "如何培养时间观念": "方法：\n\n1. **可视化计时器** - 沙漏、番茄钟\n2. **固定作息表** - 严格执行\n3. **提前提醒** - 还有5分钟要出发\n4. **参与管理** - 再玩5分钟回家",
+    "需要提前学拼音": "不建议系统学习拼音，但可以：\n\n1. **亲子阅读** - 培养语感\n2. **拼音游戏** - 增加熟悉度\n3. **避免超前** - 以免入学后厌学",
+}
+
+
+def local_answer(question: str) -> str:
+    for key, answer in FALLBACK_QA.items():
+        if key in question:
+            return answer
+    return "这个问题建议咨询专业教育人士或查看当地教育部门官方指南。"
+
+
+
+# ==================== 静态内容 ====================
+PAGE_CSS = """
+<style>
+    .main {
+        background-color: #f8f9fa;
+    }
+    .stButton>button {
+        background-color: #4CAF50;
+        color: white;
+        border-radius: 10px;
+        padding: 10px 24px;
+    }
+    .stButton>button:hover {
+        background-color: #45a049;
+    }
+    .feature-card {
+        background-color: white;
+        padding: 20px;
+        border-radius: 10px;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        margin: 10px 0;
+    }
+    .success-box {
+        background-color: #d4edda;
+        border-left: 4px solid #28a745;
+        padding: 15px;
+        border-radius: 5px;
+    }
+    .warning-box {
+        background-color: #fff3cd;
+        border-left: 4px solid #ffc107;
+        padding: 15px;
+        border-radius: 5px;
+    }
+    .info-box {
+        background-color: #d1ecf1;
+        border-left: 4px solid #17a2b8;
+        padding: 15px;
+        border-radius: 5px;
+    }
+    .header-title {
+        font-size: 2.5em;
+        font-weight: bold;
+        color: #2c3e50;
+        text-align: center;
+        margin-bottom: 10px;
+    }
+    .header-subtitle {
+        font-size: 1.2em;
+        color: #7f8c8d;
+        text-align: center;
+        margin-bottom: 30px;
+    }
+</style>
+"""
+
+USAGE_NOTES = """
+1. 先进行**能力评估**
+2. 根据评估结果**生成计划**
+3. 有问题可以**问答咨询**
+4. 评估时填写班级，可在**班级看板**查看全班情况
+"""
+
+FEATURE_CARDS = [
+    ("📋 能力评估", "根据《3-6岁儿童学习与发展指南》，评估孩子语言、数学、社交等各方面发展水平"),
+    ("📅 个性化计划", "根据评估结果，生成针对性的幼小衔接计划，每日活动推荐"),
+    ("💬 专家问答", "解答关于入学准备、能力培养等方面的疑问"),
+]
+
+# 评估题目：(分组, 题目)；分组为 None 的题目直接作为档案顶层字段，key 同时是单选控件的 key
+ASSESSMENT_SECTIONS: List[tuple] = [
+    ("language", [
+        {
+            "key": "lang_listening",
+            "field": "listening",
+            "title": "👂 倾听理解",
+            "prompt": "孩子能否听懂并按要求做事？",
+            "options": [
+                "只能听懂简单的词语和指令，需要反复提醒",
+                "能听懂简单指令，但复杂指令需要重复或简化",
+                "能听懂日常对话和简单指令，基本能按要求做事",
+                "能听懂较复杂的指令，按要求做事较主动",
+                "能很好理解对话内容，准确执行各种指令",
+            ],
+        },
+        {
+            "key": "lang_expression",
+            "field": "expression",
+            "title": "🗣️ 表达交流",
+            "prompt": "孩子能否清楚表达自己的想法？",
+            "options": [
+                "较少主动表达，说话较短或不清楚",
+                "能说简单句子，但不太连贯",
+                "能基本清楚表达自己的想法，但有时需要引导",
+                "能较流畅地表达，讲述事情较完整",
+                "能流畅、完整地讲述事情，词汇丰富",
+            ],
+        },
+        {
+            "key": "lang_reading",
+            "field": "reading",
+            "title": "📖 阅读习惯",
+            "prompt": "孩子对阅读的兴趣和表现如何？",
+            "options": [
+                "不太愿意听故事或看书",
+                "愿意听故事，但注意力较短",
+                "喜欢听故事，能安静听一会儿",
+                "有阅读兴趣，能自己翻看图书",
+                "非常喜欢阅读，能专注阅读15分钟以上",
+            ],
+        },
+        {
+            "key": "lang_writing",
+            "field": "writing_interest",
+            "title": "✍️ 书写兴趣",
+            "prompt": "孩子对写字、画画的态度？",
+            "options": [
+                "不太愿意拿笔或涂画",
+                "愿意涂画但握笔姿势不正确",
+                "愿意模仿写简单笔画，姿势基本正确",
+                "能正确握笔，写自己的名字",
+                "对书写很有兴趣，姿势正确，字迹清楚",
+            ],
+        },
+    ]),
+    ("math", [
+        {
+            "key": "math_counting",
+            "field": "counting",
+            "title": "🔢 数数能力",
+            "prompt": "孩子数数和点数的能力？",
+            "options": [
+                "能数到10，但经常跳数或漏数",
+                "能数到10，基本手口一致",
+                "能数到20，手口基本一致",
+                "能数到20以上，理解数的含义",
+                "能数到100，理解数的组成和顺序",
+            ],
+        },
+        {
+            "key": "math_operation",
+            "field": "operation",
+            "title": "➕ 计算能力",
+            "prompt": "孩子进行简单加减的能力？",
+            "options": [
+                "不太理解数量的增加和减少",
+                "能通过数实物进行简单加减",
+                "能做5以内加减法",
+                "能做10以内加减法",
+                "能做20以内加减法，理解运算含义",
+            ],
+        },
+        {
+            "key": "math_shapes",
+            "field": "shapes",
+            "title": "🔺 图形认知",
+            "prompt": "孩子认识图形的能力？",
+            "options": [
+                "能认识圆形",
+                "能认识圆形、三角形",
+                "能认识正方形、长方形、三角形、圆形",
+                "能说出图形特点并进行简单分类",
+                "能认识立体图形（正方体、球体等）",
+            ],
+        },
+        {
+            "key": "math_space",
+            "field": "space",
+            "title": "🧭 空间方位",
+            "prompt": "孩子对方位和空间的理解？",
+            "options": [
+                "不太理解上下、前后",
+                "能理解上下、前后",
+                "基本能区分上下、前后、左右",
+                "能准确区分并表达方位",
+                "能理解更复杂的空间关系",
+            ],
+        },
+    ]),
+    (None, [
+        {
+            "key": "social",
+            "field": "social",
+            "title": "👫 社交能力",
+            "prompt": "孩子与同伴交往的表现？",
+            "options": [
+                "较害羞，不太愿意与同伴玩耍",
+                "愿意与同伴玩，但不知道怎么加入",
+                "能与同伴一起玩，但有时会有冲突",
+                "能主动与同伴交往，合作游戏",
+                "社交能力强，有很多好朋友",
+            ],
+        },
+        {
+            "key": "self_care",
+            "field": "self_care",
+            "title": "🧹 自理能力",
+            "prompt": "孩子独立做事的能力？",
+            "options": [
+                "依赖大人较多，需要帮助",
+                "能做简单事情，如收拾玩具",
+                "基本能自己穿脱衣服",
+                "能自己整理书包，如厕",
+                "自理能力强，基本不需要大人帮忙",
+            ],
+        },
+        {
+            "key": "motor",
+            "field": "motor",
+            "title": "🏃 运动能力",
+            "prompt": "孩子的运动和动手能力？",
+            "options": [
+                "大运动和精细动作发展较慢",
+                "能进行基本运动，精细动作稍弱",
+                "运动能力发展正常",
+                "运动能力强，精细动作好",
+                "运动能力突出，动手能力强",
+            ],
+        },
+    ]),
+]
+
+INTEREST_OPTIONS = ["画画", "拼图", "积木", "阅读", "运动", "音乐", "科学小实验"]
+CONCERN_OPTIONS = ["语言表达", "数学基础", "自理能力", "社交能力", "专注力", "入学焦虑"]
+
+DEMO_PLAN = """
+### 第一周：习惯养成
+| 时间 | 活动 | 目标 |
+|------|------|------|
+| 早晨 | 亲子阅读15分钟 | 语言发展 |
+| 下午 | 益智游戏 | 数学思维 |
+| 傍晚 | 户外运动30分钟 | 体能发展 |
+| 睡前 | 整理书包 | 自理能力 |
+
+### 第二周：能力提升
+| 时间 | 活动 | 目标 |
+|------|------|------|
+| 早晨 | 讲述昨天的事情 | 语言表达 |
+| 下午 | 简单加减法游戏 | 数学运算 |
+| 傍晚 | 与同伴游戏 | 社交能力 |
+| 睡前 | 整理衣物 | 自理能力 |
+
+### 第三周：综合训练
+### 第四周：巩固强化
+"""
+
+PARENT_TIPS_HTML = """
+<div class="info-box">
+    <h4>📌 家长注意事项</h4>
+    <ul>
+        <li>每天坚持，形成习惯</li>
+        <li>多鼓励、少批评</li>
+        <li>保持耐心，循序渐进</li>
+        <li>定期回顾调整</li>
+    </ul>
+</div>
+"""
+
+COMMON_QUESTIONS = [
+    "要不要提前学小学内容？",
+    "孩子不想去小学怎么办？",
+    "孩子注意力不集中怎么办？",
+    "如何培养时间观念？",
+    "需要提前学拼音吗？",
+]
+
+
+# ==================== 首页 ====================
+def render_home_page() -> None:
+    st.markdown('<p class="header-title">🎒 幼小衔接规划助手</p>', unsafe_allow_html=True)
+    st.markdown('<p class="header-subtitle">帮助孩子顺利过渡到小学生活</p>', unsafe_allow_html=True)
+
+    # 核心功能介绍
+    for col, (title, text) in zip(st.columns(len(FEATURE_CARDS)), FEATURE_CARDS):
+        with col:
+            st.markdown(
+                f'<div class="feature-card"><h3>{title}</h3><p>{text}</p></div>',
+                unsafe_allow_html=True,
+            )
+
+    # 快速评估入口
+    st.markdown("### 🚀 快速开始")
+    st.button(
+        "开始能力评估 →",
+        use_container_width=True,
+        on_click=set_menu,
+        args=("📋 能力评估",),
+    )
+
+
+# ==================== 能力评估 ====================
+def render_assessment_result(profile: Dict, result: Dict) -> None:
+    st.markdown("---")
+    st.markdown(f"## 📊 {profile['name']}的评估报告")
+
+    # 整体评价
+    level_colors = {"优秀": "🟢", "良好": "🟡", "需加强关注": "🔴"}
+    st.info(f"{level_colors.get(result['overall_level'], '')} 整体水平: {result['overall_level']}")
+
+    sections = [
+        ("### ✨ 优势", result["strengths"]),
+        ("### 📌 需加强", result["areas_to_improve"]),
+        ("### 💡 建议", result["recommendations"]),
+    ]
+    for heading, items in sections:
+        if items:
+            st.markdown(heading)
+            for item in items:
+                st.markdown(f"- {item}")
+
+
+def render_assessment_history(history: List[Dict]) -> None:
+    """同一个孩子评估过不止一次时，列出历次总分和等级，并与上一次比较"""
+    if len(history) < 2:
+        return
+    st.markdown("### 📈 历次评估")
+    latest, previous = history[-1], history[-2]
+    st.metric("总分", f"{latest['total']:.2f}", f"{latest['total'] - previous['total']:+.2f}（与上次相比）")
+    st.dataframe(
+        [
+            {
+                "学期": record["term"],
+                "日期": datetime.fromtimestamp(record["assessed_at"]).strftime("%Y-%m-%d"),
+                "总分": round(record["total"], 2),
+                "等级": record["overall_level"],
+            }
+            for record in history
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+def save_assessment(profile: Dict, result: Dict, class_id: str) -> List[Dict]:
+    """存入评估记录库并返回该孩子的历次记录；未启用或写入失败时返回空列表"""
+    store = get_assessment_store()
+    if store is None:
+        return []
+    # 不同班级可能有同名的孩子
+    child_id = f"{class_id}/{profile['name']}" if class_id else profile["name"]
+    # 先取常模再写入：缓存过期时 from_store 在这里重新载入，载入的数据还不含这次评估，下面只计入一次
+    norms = get_cohort_norms()
+    try:
+        store.add(profile, result, child_id=child_id, class_id=class_id)
+        history = store.history(child_id, limit=10)
+    except sqlite3.Error as exc:
+        st.warning(f"评估记录保存失败：{exc}")
+        return []
+    norms.add(profile_scores(profile), profile.get("age"))
+    return history
+
+
+def render_percentile_view(profile: Dict) -> None:
+    """孩子各能力项在同龄人中的百分位雷达图；未启用评估记录库时不显示"""
+    norms = get_cohort_norms()
+    if norms is None or norms.size() == 0:
+        return
+    percentiles = norms.percentiles(profile_scores(profile), profile.get("age"))
+    st.markdown("### 🎯 同龄对比")
+    st.metric("总分", f"超过 {percentiles['total']:.0f}% 的同龄孩子")
+    if percentiles["cohort"] == ALL_AGES:
+        st.caption(f"同龄样本不足 {norms.min_count} 人，与全部 {percentiles['n']} 名孩子比较")
+    st.plotly_chart(cohort_charts.percentile_radar(percentiles, profile["name"]), use_container_width=True)
+
+
+@st.fragment
+def assessment_form() -> None:
+    # 片段：提交评估只重跑表单和结果，侧边栏与页面其余部分不动
+    with st.form("assessment_form", clear_on_submit=False):
+        # 基本信息
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            name = st.text_input("孩子姓名", placeholder="请输入姓名")
+        with col2:
+            class_id = st.text_input("班级（选填）", placeholder="如：大一班").strip()
+        with col3:
+            age = st.number_input("年龄", min_value=5.0, max_value=6.5, value=5.5, step=0.5)
+
+        scores: Dict[str, int] = {}
+        for _, questions in ASSESSMENT_SECTIONS:
+            st.markdown("---")
+            for question in questions:
+                st.markdown(f"### {question['title']}")
+                st.markdown(question["prompt"])
+                scores[question["key"]] = scored_radio(
+                    "选择最符合的描述：", question["options"], index=2, key=question["key"]
+                )
+
+        st.markdown("---")
+        st.markdown("### 其他信息")
+        col1, col2 = st.columns(2)
+        with col1:
+            interests = st.multiselect("兴趣爱好", INTEREST_OPTIONS)
+        with col2:
+            concerns = st.multiselect("家长担忧的问题", CONCERN_OPTIONS)
+
+        submitted = st.form_submit_button("提交评估", use_container_width=True, type="primary")
+
+        if submitted:
+            if not name:
+                st.error("请输入孩子姓名")
+            else:
+                # 保存评估数据
+                profile: Dict = {"name": name, "age": age}
+                for group, questions in ASSESSMENT_SECTIONS:
+                    target = profile.setdefault(group, {}) if group else profile
+                    for question in questions:
+                        target[question["field"]] = scores[question["key"]]
+                profile["interests"] = interests
+                profile["concerns"] = concerns
+
+                st.session_state.profile = profile
+                st.session_state.assessment_result = calculate_assessment(profile)
+                st.session_state.plan = None
+                history = save_assessment(profile, st.session_state.assessment_result, class_id)
+                st.success("评估完成！")
+                render_assessment_result(profile, st.session_state.assessment_result)
+                render_percentile_view(profile)
+                render_assessment_history(history)
+
+
+def render_assessment_page() -> None:
+    st.title("📋 孩子能力评估")
+    st.markdown("请根据孩子的日常表现选择最符合的选项")
+
+    assessment_form()
+
+    # 生成计划按钮（放在表单和片段外：切换页面需要整页重跑）
+    st.markdown("---")
+    st.button(
+        "根据评估结果生成计划 →",
+        use_container_width=True,
+        on_click=set_menu,
+        args=("📅 生成计划",),
+    )
+
+
+# ==================== 生成计划 ====================
+@st.fragment
+def plan_section() -> None:
+    # 片段：勾选、生成只重跑计划区域
+    force_refresh = st.checkbox("不使用缓存，重新生成", value=False)
+    if st.button("生成个性化计划", use_container_width=True, type="primary"):
+        placeholder = st.empty()
+        try:
+            with st.spinner("生成计划中..."):
+                agent = get_agent()
+                child_profile = agent.build_profile(st.session_state.profile)
+                plan_stream = agent.generate_plan_stream(child_profile, force_refresh=force_refresh)
+                plan = next(plan_stream, None)
+            # 边生成边渲染：每周目标先出现，后续内容陆续补全
+            final_plan = None
+            while plan is not None:
+                with placeholder.container():
+                    render_plan(plan)
+                final_plan = plan
+                plan = next(plan_stream, None)
+            st.session_state.plan = final_plan
+        except Exception as exc:
+            st.error(f"计划生成失败：{exc}")
+            if st.session_state.plan:
+                with placeholder.container():
+                    render_plan(st.session_state.plan)
+    elif st.session_state.plan:
+        render_plan(st.session_state.plan)
+    else:
+        st.info("点击上方按钮生成个性化计划。")
+
+
+def render_plan_page() -> None:
+    st.title("📅 幼小衔接计划")
+
+    if not st.session_state.profile:
+        st.warning("请先完成能力评估")
+        st.button(
+            "去评估 →",
+            on_click=set_menu,
+            args=("📋 能力评估",),
+        )
+        return
+
+    st.markdown(f"### 👶 {st.session_state.profile['name']}的个性化计划")
+
+    if llm_enabled():
+        plan_section()
+    else:
+        st.warning("未检测到 OPENAI_API_KEY，显示示例计划。")
+        st.markdown(DEMO_PLAN)
+
+    st.markdown(PARENT_TIPS_HTML, unsafe_allow_html=True)
+
+    st.markdown("---")
+    st.button(
+        "有更多问题？去问答咨询 →",
+        use_container_width=True,
+        on_click=set_menu,
+        args=("💬 问答咨询",),
+    )
+
+
+# ==================== 问答咨询 ====================
+def answer_question(question: str, tenant: Optional[str]) -> None:
+    st.markdown("### 💡 回答")
+    if not llm_enabled():
+        st.markdown(local_answer(question))
+        return
+    try:
+        with st.spinner("思考中..."):
+            agent = get_agent()
+            child_profile = (
+                agent.build_profile(st.session_state.profile)
+                if st.session_state.profile else None
+            )
+            answer_stream = agent.chat_stream(
+                question,
+                session_id=st.session_state.chat_session_id,
+                profile=child_profile,
+                tenant=tenant,
+            )
+            first_piece = next(answer_stream, "")
+        st.write_stream(itertools.chain([first_piece], answer_stream))
+    except Exception as exc:
+        st.error(f"调用问答失败：{exc}")
+        st.markdown(local_answer(question))
+
+
+@st.fragment
+def qa_section() -> None:
+    # 片段：点选常见问题、切换地区、提问都只重跑问答区域
+    st.markdown("### 常见问题")
+    cols = st.columns(2)
+    for i, q in enumerate(COMMON_QUESTIONS):
+        with cols[i % 2]:
+            if st.button(q, key=f"q_{i}"):
+                st.session_state['current_question'] = q
+
+    # 问答输入
+    st.markdown("---")
+    st.markdown("### 提问")
+
+    default_value = st.session_state.get('current_question', "")
+
+    # 配置了多地区知识库时可选择地区
+    tenant = None
+    if llm_enabled() and os.getenv("KNOWLEDGE_BASE_DIR"):
+        tenants = tenant_options()
+        if tenants:
+            choice = st.selectbox("地区知识库", ["默认"] + tenants, key="tenant")
+            tenant = None if choice == "默认" else choice
+
+    question = st.text_area("请输入你的问题", value=default_value, height=100)
+
+    if st.button("获取回答", use_container_width=True) and question:
+        answer_question(question, tenant)
+
+
+def render_qa_page() -> None:
+    st.title("💬 问答咨询")
+    st.markdown("有什么关于幼小衔接的问题，欢迎提问")
+    qa_section()
+
+
+# ==================== 班级看板 ====================
+@st.fragment
+def class_dashboard(store: AssessmentStore) -> None:
+    # 片段：切换班级、学期只重跑看板
+    classes = sorted({entry["class_id"] for entry in store.classes() if entry["class_id"]})
+    if not classes:
+        st.info("暂无班级评估记录：评估时填写班级后，这里按班级汇总。")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        class_id = st.selectbox("班级", classes, key="dashboard_class")
+    with col2:
+        progress = store.class_progress(class_id)
+        terms = [entry["term"] for entry in progress]
+        term_choice = st.selectbox("学期", ["全部学期"] + terms[::-1], key="dashboard_term")
+    term = None if term_choice == "全部学期" else term_choice
+
+    stats = store.class_stats(class_id, term)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("评估人次", stats["n"])
+    col2.metric("总分均值", f"{stats['total_mean']:.2f}" if stats["total_mean"] is not None else "-")
+    col3.metric("需加强关注", stats["levels"].get("需加强关注", 0))
+
+    norms = get_cohort_norms()
+    reference = norms.distribution(ALL_AGES) if norms is not None else None
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(
+            cohort_charts.mean_radar(stats["dimensions"], reference, name=class_id), use_container_width=True
+        )
+    with col2:
+        st.plotly_chart(cohort_charts.score_distribution(stats["dimensions"]), use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(cohort_charts.level_bar(stats["levels"]), use_container_width=True)
+    with col2:
+        st.plotly_chart(cohort_charts.progress_lines(progress), use_container_width=True)
+
+    with st.expander("各班级对比"):
+        st.plotly_chart(cohort_charts.classes_heatmap(store.dimension_means(term)), use_container_width=True)
+
+
+def render_dashboard_page() -> None:
+    st.title("🏫 班级看板")
+    st.markdown("按班级、学期汇总的评估结果，与全部孩子对比")
+    store = get_assessment_store()
+    if store is None:
+        st.info("未启用评估记录库（ASSESSMENT_DB_PATH 为空）。")
+        return
+    class_dashboard(store)
+
+
+PAGES = {
+    "🏠 首页": render_home_page,
+    "📋 能力评估": render_assessment_page,
+    "📅 生成计划": render_plan_page,
+    "💬 问答咨询": render_qa_page,
+    "🏫 班级看板": render_dashboard_page,
+}
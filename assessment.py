@@ -2,11 +2,42 @@
 幼小衔接评估核心逻辑
 """
 
-from typing import Dict, List
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 
 
 LANG_KEYS = ["listening", "expression", "reading", "writing_interest"]
 MATH_KEYS = ["counting", "operation", "shapes", "space"]
+OTHER_KEYS = ["social", "self_care", "motor"]
+
+# 批量评估的列顺序：语言 4 项、数学 4 项、社交/自理/运动
+SCORE_FIELDS = LANG_KEYS + MATH_KEYS + OTHER_KEYS
+
+# 与 SCORE_FIELDS 一一对应：(优势描述, 需加强项, 建议)
+FEEDBACK_RULES = [
+    ("倾听能力较好，能听懂指令", "倾听理解能力", "多与孩子交流复杂指令，锻炼理解能力"),
+    ("语言表达清晰流畅", "语言表达能力", "每天15分钟亲子对话，鼓励孩子复述故事"),
+    ("阅读兴趣浓厚", "阅读习惯", "建立固定阅读时间，选择孩子感兴趣的绘本"),
+    ("对书写有兴趣，能进行简单书写", "书写兴趣与握笔习惯", "用描红、描写名字等方式增强书写兴趣"),
+    ("计数能力较强", "计数能力", "通过实物点数练习，20以内手口一致点数"),
+    ("运算能力发展良好", "简单运算", "用实物游戏理解加减法含义"),
+    ("图形认知能力好", "图形认知", "通过积木、拼图认识基本几何图形"),
+    ("空间方位感较强", "空间感知", "多进行上下前后左右的方位游戏"),
+    ("社交能力强，愿意与同伴合作", "社交能力", "创造合作游戏机会，鼓励轮流与分享"),
+    ("自理能力强", "自理能力", "开始训练独立整理书包、穿脱衣物"),
+    ("运动和动手能力好", "运动能力", "增加户外运动和精细动作练习"),
+]
+
+STRENGTH_THRESHOLD = 4
+WEAKNESS_THRESHOLD = 2
+
+# 总分 = 语言均分 + 数学均分 + 社交 + 自理 + 运动
+LEVELS = ["优秀", "良好", "需加强关注"]
+LEVEL_THRESHOLDS = [18, 12]
+LEVEL_RECOMMENDATIONS = {
+    "优秀": "孩子发展良好，可以顺利过渡到小学",
+    "需加强关注": "建议增加幼小衔接训练的投入",
+}
 
 
 def _to_int(value: int) -> int:
@@ -24,118 +55,275 @@ def _score(value: int) -> int:
     return _clamp(_to_int(value))
 
 
-def calculate_assessment(profile: Dict) -> Dict:
-    """计算评估结果"""
+def _level(total: float) -> str:
+    for level, threshold in zip(LEVELS, LEVEL_THRESHOLDS):
+        if total >= threshold:
+            return level
+    return LEVELS[-1]
+
+
+def flatten_profile(profile: Dict) -> List:
+    """把 app.py 的档案字典展开成 SCORE_FIELDS 顺序的原始分数列表"""
     language = profile.get("language", {})
     math = profile.get("math", {})
+    return (
+        [language.get(k) for k in LANG_KEYS]
+        + [math.get(k) for k in MATH_KEYS]
+        + [profile.get(k) for k in OTHER_KEYS]
+    )
 
-    lang_vals = [_score(language.get(k, 3)) for k in LANG_KEYS]
-    math_vals = [_score(math.get(k, 3)) for k in MATH_KEYS]
 
-    lang_avg = sum(lang_vals) / len(lang_vals)
-    math_avg = sum(math_vals) / len(math_vals)
+def profile_scores(profile: Dict) -> List[int]:
+    """SCORE_FIELDS 顺序的 11 项分数，缺失或非法取值按 3 分，超出范围的裁剪到 1-5"""
+    return [_score(value) for value in flatten_profile(profile)]
 
-    social = _score(profile.get("social", 3))
-    self_care = _score(profile.get("self_care", 3))
-    motor = _score(profile.get("motor", 3))
 
-    total = lang_avg + math_avg + social + self_care + motor
+def total_score(scores: Sequence[int]) -> float:
+    """总分 = 语言均分 + 数学均分 + 社交 + 自理 + 运动（scores 为 profile_scores 的结果）"""
+    lang_avg = sum(scores[:4]) / len(LANG_KEYS)
+    math_avg = sum(scores[4:8]) / len(MATH_KEYS)
+    return lang_avg + math_avg + sum(scores[8:])
+
+
+def calculate_assessment(profile: Dict) -> Dict:
+    """计算评估结果"""
+    scores = profile_scores(profile)
+    total = total_score(scores)
 
     strengths: List[str] = []
     areas_to_improve: List[str] = []
     recommendations: List[str] = []
 
-    def add_feedback(score: int, strength: str, area: str, tip: str) -> None:
-        if score >= 4:
+    for score, (strength, area, tip) in zip(scores, FEEDBACK_RULES):
+        if score >= STRENGTH_THRESHOLD:
             strengths.append(strength)
-        elif score <= 2:
+        elif score <= WEAKNESS_THRESHOLD:
             areas_to_improve.append(area)
             recommendations.append(tip)
 
-    # 语言分析
-    add_feedback(
-        _score(language.get("listening")),
-        "倾听能力较好，能听懂指令",
-        "倾听理解能力",
-        "多与孩子交流复杂指令，锻炼理解能力",
-    )
-    add_feedback(
-        _score(language.get("expression")),
-        "语言表达清晰流畅",
-        "语言表达能力",
-        "每天15分钟亲子对话，鼓励孩子复述故事",
-    )
-    add_feedback(
-        _score(language.get("reading")),
-        "阅读兴趣浓厚",
-        "阅读习惯",
-        "建立固定阅读时间，选择孩子感兴趣的绘本",
-    )
-    add_feedback(
-        _score(language.get("writing_interest")),
-        "对书写有兴趣，能进行简单书写",
-        "书写兴趣与握笔习惯",
-        "用描红、描写名字等方式增强书写兴趣",
-    )
+    overall = _level(total)
+    if overall in LEVEL_RECOMMENDATIONS:
+        recommendations.append(LEVEL_RECOMMENDATIONS[overall])
 
-    # 数学分析
-    add_feedback(
-        _score(math.get("counting")),
-        "计数能力较强",
-        "计数能力",
-        "通过实物点数练习，20以内手口一致点数",
-    )
-    add_feedback(
-        _score(math.get("operation")),
-        "运算能力发展良好",
-        "简单运算",
-        "用实物游戏理解加减法含义",
-    )
-    add_feedback(
-        _score(math.get("shapes")),
-        "图形认知能力好",
-        "图形认知",
-        "通过积木、拼图认识基本几何图形",
-    )
-    add_feedback(
-        _score(math.get("space")),
-        "空间方位感较强",
-        "空间感知",
-        "多进行上下前后左右的方位游戏",
-    )
+    return {
+        "overall_level": overall,
+        "strengths": strengths,
+        "areas_to_improve": areas_to_improve,
+        "recommendations": recommendations,
+    }
 
-    # 社交、自理、运动
-    add_feedback(
-        social,
-        "社交能力强，愿意与同伴合作",
-        "社交能力",
-        "创造合作游戏机会，鼓励轮流与分享",
-    )
-    add_feedback(
-        self_care,
-        "自理能力强",
-        "自理能力",
-        "开始训练独立整理书包、穿脱衣物",
-    )
-    add_feedback(
-        motor,
-        "运动和动手能力好",
-        "运动能力",
-        "增加户外运动和精细动作练习",
-    )
 
-    if total >= 18:
-        overall = "优秀"
-        recommendations.append("孩子发展良好，可以顺利过渡到小学")
-    elif total >= 12:
-        overall = "良好"
+# ==================== 批量评估 ====================
+
+def _batch_scores(scores):
+    """把 DataFrame / 二维数组转换为 (n, 11) 的 int8 分数矩阵，规则与 _score 一致"""
+    import numpy as np
+
+    if hasattr(scores, "columns"):
+        # DataFrame：缺失的列按 3 分处理，与单条评估的默认值一致
+        n = len(scores)
+        columns = [
+            scores[field].to_numpy() if field in scores.columns else np.full(n, 3)
+            for field in SCORE_FIELDS
+        ]
+        matrix = np.column_stack(columns) if n else np.empty((0, len(SCORE_FIELDS)))
     else:
-        overall = "需加强关注"
-        recommendations.append("建议增加幼小衔接训练的投入")
+        matrix = np.asarray(scores)
+        if matrix.ndim == 1 and matrix.size == 0:
+            matrix = matrix.reshape(0, len(SCORE_FIELDS))
+
+    if matrix.ndim != 2 or matrix.shape[1] != len(SCORE_FIELDS):
+        raise ValueError(f"分数矩阵形状应为 (n, {len(SCORE_FIELDS)})，实际为 {matrix.shape}")
+
+    if matrix.dtype.kind in "biu":
+        values = matrix.astype(np.int64)
+    elif matrix.dtype.kind == "f":
+        missing = np.isnan(matrix)
+        if np.isinf(matrix).any():
+            raise OverflowError("cannot convert float infinity to integer")
+        values = np.where(missing, 3, np.trunc(np.where(missing, 0, matrix)))
+    else:
+        # object / 字符串列：逐个走 _to_int，保证与单条评估完全一致
+        with np.errstate(invalid="ignore"):
+            values = np.vectorize(_to_int, otypes=[np.int64])(matrix) if matrix.size else matrix
+
+    return np.clip(values, 1, 5).astype(np.int8)
+
+
+def calculate_assessments_batch(scores) -> Dict:
+    """向量化批量评估
+
+    scores 可以是列名为 SCORE_FIELDS 的 pandas DataFrame，或按 SCORE_FIELDS 顺序排列的
+    (n, 11) NumPy 数组。返回的各数组按行与输入对齐；如需与 calculate_assessment
+    完全相同的字典列表，调用 expand_batch_results。
+    """
+    import numpy as np
+
+    values = _batch_scores(scores)
+    wide = values.astype(np.int16)
+
+    # 先求整数和再除，与单条评估的 sum(...) / 4 取得同样的浮点结果
+    lang_avg = wide[:, :4].sum(axis=1) / len(LANG_KEYS)
+    math_avg = wide[:, 4:8].sum(axis=1) / len(MATH_KEYS)
+    total = lang_avg + math_avg + wide[:, 8:].sum(axis=1)
+
+    level_code = np.full(len(total), len(LEVELS) - 1, dtype=np.int8)
+    for code in reversed(range(len(LEVEL_THRESHOLDS))):
+        level_code[total >= LEVEL_THRESHOLDS[code]] = code
 
     return {
-        "overall_level": overall,
+        "language_avg": lang_avg,
+        "math_avg": math_avg,
+        "total": total,
+        "level_code": level_code,
+        "overall_level": np.asarray(LEVELS, dtype=object)[level_code],
+        "strength_mask": values >= STRENGTH_THRESHOLD,
+        "weakness_mask": values <= WEAKNESS_THRESHOLD,
+    }
+
+
+def _pack_masks(strength_mask, weakness_mask):
+    """把每行的优势/不足掩码压成一个整数：低 11 位为优势，高 11 位为不足"""
+    import numpy as np
+
+    weights = np.left_shift(1, np.arange(len(SCORE_FIELDS), dtype=np.int64))
+    strengths = strength_mask.astype(np.int64) @ weights
+    weaknesses = weakness_mask.astype(np.int64) @ weights
+    return strengths | (weaknesses << len(SCORE_FIELDS))
+
+
+def _feedback_for_code(code: int, level: str) -> Dict:
+    strengths: List[str] = []
+    areas_to_improve: List[str] = []
+    recommendations: List[str] = []
+    for i, (strength, area, tip) in enumerate(FEEDBACK_RULES):
+        if code >> i & 1:
+            strengths.append(strength)
+        elif code >> (i + len(SCORE_FIELDS)) & 1:
+            areas_to_improve.append(area)
+            recommendations.append(tip)
+    if level in LEVEL_RECOMMENDATIONS:
+        recommendations.append(LEVEL_RECOMMENDATIONS[level])
+    return {
+        "overall_level": level,
         "strengths": strengths,
         "areas_to_improve": areas_to_improve,
         "recommendations": recommendations,
     }
+
+
+def expand_batch_results(batch: Dict, shared: bool = False) -> List:
+    """把批量结果展开成与 calculate_assessment 逐条输出相同的字典列表
+
+    shared=True 时返回查表得到的共享只读结果（见 lookup_assessment），不再逐行复制列表。
+    """
+    import numpy as np
+
+    codes = _pack_masks(batch["strength_mask"], batch["weakness_mask"])
+    keys = codes * len(LEVELS) + batch["level_code"]
+    unique, inverse = np.unique(keys, return_inverse=True)
+
+    if shared:
+        results = [_interned_result(int(key)) for key in unique]
+        return [results[i] for i in inverse.ravel()]
+
+    # 同一班级里不同的结果组合很少，每种组合只生成一次字符串
+    templates = [
+        _feedback_for_code(int(key) // len(LEVELS), LEVELS[int(key) % len(LEVELS)])
+        for key in unique
+    ]
+    return [
+        {
+            "overall_level": t["overall_level"],
+            "strengths": list(t["strengths"]),
+            "areas_to_improve": list(t["areas_to_improve"]),
+            "recommendations": list(t["recommendations"]),
+        }
+        for t in (templates[i] for i in inverse.ravel())
+    ]
+
+
+# ==================== 查表评估 ====================
+#
+# 裁剪后每项分数只有 1-5 五种取值，评估结果只取决于：
+#   1. 每项落在「优势 / 一般 / 需加强」哪一档 —— 压成 22 位的反馈位掩码；
+#   2. 4 × 总分（语言和 + 数学和 + 4 × 其他三项和，取值 20-100）—— 直接查等级表。
+# 两张表都在首次使用时生成；(位掩码, 等级) 相同的结果只构造一次并在调用方之间共享。
+
+_DIMENSION_BITS: Optional[Tuple[Tuple[int, ...], ...]] = None
+_LEVEL_TABLE: Optional[Tuple[int, ...]] = None
+_INTERNED: Dict[int, Mapping] = {}
+_CLAMPED = {score: score for score in range(1, 6)}
+
+
+def _build_tables() -> None:
+    global _DIMENSION_BITS, _LEVEL_TABLE
+    bits = []
+    for i in range(len(SCORE_FIELDS)):
+        row = [0] * 6
+        for score in range(1, 6):
+            if score >= STRENGTH_THRESHOLD:
+                row[score] = 1 << i
+            elif score <= WEAKNESS_THRESHOLD:
+                row[score] = 1 << (i + len(SCORE_FIELDS))
+        bits.append(tuple(row))
+    max_quarter = 5 * (len(LANG_KEYS) + len(MATH_KEYS)) + 4 * 5 * len(OTHER_KEYS)
+    _LEVEL_TABLE = tuple(LEVELS.index(_level(q / 4)) for q in range(max_quarter + 1))
+    _DIMENSION_BITS = tuple(bits)
+
+
+def _interned_result(key: int) -> Mapping:
+    result = _INTERNED.get(key)
+    if result is None:
+        code, level_code = divmod(key, len(LEVELS))
+        built = _feedback_for_code(code, LEVELS[level_code])
+        result = MappingProxyType({
+            "overall_level": built["overall_level"],
+            "strengths": tuple(built["strengths"]),
+            "areas_to_improve": tuple(built["areas_to_improve"]),
+            "recommendations": tuple(built["recommendations"]),
+        })
+        result = _INTERNED.setdefault(key, result)
+    return result
+
+
+def lookup_scores(scores: Sequence[int]) -> Mapping:
+    """按 SCORE_FIELDS 顺序的 11 个已裁剪分数查表得到评估结果"""
+    if _DIMENSION_BITS is None:
+        _build_tables()
+    code = 0
+    for dimension_bits, score in zip(_DIMENSION_BITS, scores):
+        code |= dimension_bits[score]
+    quarter = sum(scores[:8]) + 4 * sum(scores[8:])
+    return _interned_result(code * len(LEVELS) + _LEVEL_TABLE[quarter])
+
+
+def lookup_assessment(profile: Dict) -> Mapping:
+    """查表版 calculate_assessment
+
+    结果内容与 calculate_assessment 相同，但返回的是共享的只读映射（列表换成元组），
+    调用方不要修改；需要可变结果时请继续使用 calculate_assessment。
+    """
+    values = flatten_profile(profile)
+    try:
+        scores = [_CLAMPED.get(value) or _score(value) for value in values]
+    except TypeError:  # 不可哈希的取值，走完整的转换逻辑
+        scores = [_score(value) for value in values]
+    return lookup_scores(scores)
+
+
+def reset_assessment_tables() -> None:
+    """评估规则（FEEDBACK_RULES、阈值等）变更后调用，下次查表时重新生成"""
+    global _DIMENSION_BITS, _LEVEL_TABLE
+    _DIMENSION_BITS = None
+    _LEVEL_TABLE = None
+    _INTERNED.clear()
+
+
+def profiles_to_matrix(profiles: Sequence[Dict]):
+    """把多份档案字典转换为 calculate_assessments_batch 可用的分数矩阵"""
+    import numpy as np
+
+    return np.array([flatten_profile(p) for p in profiles], dtype=object).reshape(
+        len(profiles), len(SCORE_FIELDS)
+    )
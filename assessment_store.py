@@ -0,0 +1,446 @@
+"""
+评估记录持久化（SQLite）：每次评估的档案与 calculate_assessment 结果，按孩子、班级、学期和时间记录
+- assessments 表每次评估一行；11 项裁剪后的分数各占一列，另存总分、等级、原始档案和结果 JSON
+- 索引 (child_id, assessed_at) 服务单个孩子的历次记录，(class_id, term, assessed_at) 服务按班级、学期的查询
+- add_many 在一个事务内批量写入，并在同一事务里增量更新班级聚合表：
+  class_dimension_stats 为每个 班级×学期×能力项 的人次、分数和、平方和与 1-5 分各档人数，
+  class_level_stats 为每个 班级×学期×等级 的人次与总分和；看板直接读聚合表，不随历史记录增长而变慢
+- 同一事务里还更新同龄常模的计数（见 cohort_norms.py）：age_band_stats 为每个 年龄段×能力项 的 1-5 分各档人数，
+  age_band_totals 为每个年龄段的总分（×4 取整）分布
+- 删除记录时按相同方式扣减聚合；rebuild_aggregates 从原始记录整体重算（核对或规则变更后使用）
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from assessment import LEVELS, SCORE_FIELDS, lookup_scores, profile_scores, total_score
+from cohort_norms import age_band, total_quarter
+
+SCORE_LEVELS = range(1, 6)
+_COUNT_COLUMNS = [f"count_{score}" for score in SCORE_LEVELS]
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS assessments ("
+    " id INTEGER PRIMARY KEY,"
+    " child_id TEXT NOT NULL,"
+    " child_name TEXT NOT NULL DEFAULT '',"
+    " class_id TEXT NOT NULL DEFAULT '',"
+    " term TEXT NOT NULL,"
+    " age REAL,"
+    " assessed_at REAL NOT NULL,"
+    + "".join(f" {field} INTEGER NOT NULL," for field in SCORE_FIELDS)
+    + " total REAL NOT NULL,"
+    " overall_level TEXT NOT NULL,"
+    " profile TEXT NOT NULL,"
+    " result TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_assessments_child ON assessments (child_id, assessed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_assessments_class ON assessments (class_id, term, assessed_at)",
+    "CREATE TABLE IF NOT EXISTS class_dimension_stats ("
+    " class_id TEXT NOT NULL,"
+    " term TEXT NOT NULL,"
+    " dimension TEXT NOT NULL,"
+    " n INTEGER NOT NULL,"
+    " score_sum INTEGER NOT NULL,"
+    " score_sq INTEGER NOT NULL,"
+    + "".join(f" {column} INTEGER NOT NULL," for column in _COUNT_COLUMNS)
+    + " PRIMARY KEY (class_id, term, dimension))",
+    "CREATE TABLE IF NOT EXISTS class_level_stats ("
+    " class_id TEXT NOT NULL,"
+    " term TEXT NOT NULL,"
+    " level TEXT NOT NULL,"
+    " n INTEGER NOT NULL,"
+    " total_sum REAL NOT NULL,"
+    " total_sq REAL NOT NULL,"
+    " PRIMARY KEY (class_id, term, level))",
+    "CREATE TABLE IF NOT EXISTS age_band_stats ("
+    " age_band TEXT NOT NULL,"
+    " dimension TEXT NOT NULL,"
+    " n INTEGER NOT NULL,"
+    + "".join(f" {column} INTEGER NOT NULL," for column in _COUNT_COLUMNS)
+    + " PRIMARY KEY (age_band, dimension))",
+    "CREATE TABLE IF NOT EXISTS age_band_totals ("
+    " age_band TEXT NOT NULL,"
+    " quarter INTEGER NOT NULL,"
+    " n INTEGER NOT NULL,"
+    " PRIMARY KEY (age_band, quarter))",
+]
+
+_INSERT = (
+    "INSERT INTO assessments (child_id, child_name, class_id, term, age, assessed_at, "
+    + ", ".join(SCORE_FIELDS)
+    + ", total, overall_level, profile, result) VALUES ("
+    + ", ".join("?" * (len(SCORE_FIELDS) + 10))
+    + ")"
+)
+
+# 增量更新：delta 可以为负（删除记录时扣减）
+_UPSERT_DIMENSION = (
+    "INSERT INTO class_dimension_stats (class_id, term, dimension, n, score_sum, score_sq, "
+    + ", ".join(_COUNT_COLUMNS)
+    + ") VALUES (" + ", ".join("?" * (6 + len(_COUNT_COLUMNS))) + ")"
+    " ON CONFLICT (class_id, term, dimension) DO UPDATE SET"
+    " n = n + excluded.n, score_sum = score_sum + excluded.score_sum, score_sq = score_sq + excluded.score_sq, "
+    + ", ".join(f"{column} = {column} + excluded.{column}" for column in _COUNT_COLUMNS)
+)
+_UPSERT_LEVEL = (
+    "INSERT INTO class_level_stats (class_id, term, level, n, total_sum, total_sq) VALUES (?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (class_id, term, level) DO UPDATE SET"
+    " n = n + excluded.n, total_sum = total_sum + excluded.total_sum, total_sq = total_sq + excluded.total_sq"
+)
+
+_UPSERT_BAND = (
+    "INSERT INTO age_band_stats (age_band, dimension, n, "
+    + ", ".join(_COUNT_COLUMNS)
+    + ") VALUES (" + ", ".join("?" * (3 + len(_COUNT_COLUMNS))) + ")"
+    " ON CONFLICT (age_band, dimension) DO UPDATE SET n = n + excluded.n, "
+    + ", ".join(f"{column} = {column} + excluded.{column}" for column in _COUNT_COLUMNS)
+)
+_UPSERT_BAND_TOTAL = (
+    "INSERT INTO age_band_totals (age_band, quarter, n) VALUES (?, ?, ?)"
+    " ON CONFLICT (age_band, quarter) DO UPDATE SET n = n + excluded.n"
+)
+
+_RECORD_COLUMNS = ["id", "child_id", "child_name", "class_id", "term", "age", "assessed_at"]
+
+
+def term_of(timestamp: float) -> str:
+    """学期名：2-7 月为当年春季学期，8-12 月为当年秋季学期，1 月仍属上一年的秋季学期
+
+    名称按字符串排序即按时间先后（"2025春" < "2025秋" < "2026春"）。
+    """
+    day = datetime.fromtimestamp(timestamp)
+    if 2 <= day.month <= 7:
+        return f"{day.year}春"
+    return f"{day.year if day.month >= 8 else day.year - 1}秋"
+
+
+def _mean_std(n: int, total: float, squares: float) -> Tuple[Optional[float], Optional[float]]:
+    if n <= 0:
+        return None, None
+    mean = total / n
+    return mean, max(squares / n - mean * mean, 0.0) ** 0.5
+
+
+class AssessmentStore:
+    """评估记录库；同一实例可在多个线程中使用（内部串行化）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.create_function("age_band", 1, age_band, deterministic=True)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下断电最多丢最后几个事务，不会损坏
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            # 早于常模表建立的库：按已有记录补齐一次
+            if (self._conn.execute("SELECT 1 FROM assessments LIMIT 1").fetchone()
+                    and not self._conn.execute("SELECT 1 FROM age_band_stats LIMIT 1").fetchone()):
+                self._rebuild_norms()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM assessments").fetchone()[0]
+
+    # ==================== 写入 ====================
+
+    def add(
+        self,
+        profile: Dict,
+        result: Optional[Dict] = None,
+        child_id: Optional[str] = None,
+        class_id: str = "",
+        term: Optional[str] = None,
+        assessed_at: Optional[float] = None,
+    ) -> int:
+        """保存一次评估并返回记录 id；result 为空时按档案计算"""
+        record = {
+            "profile": profile,
+            "result": result,
+            "child_id": child_id,
+            "class_id": class_id,
+            "term": term,
+            "assessed_at": assessed_at,
+        }
+        row = self._row(record)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(_INSERT, row)
+            self._apply_aggregates([row], sign=1)
+        return cursor.lastrowid
+
+    def add_many(self, records: Iterable[Dict]) -> int:
+        """批量保存，全部成功或全部不写；返回写入条数
+
+        每条为 {"profile": ..., "result"?, "child_id"?, "class_id"?, "term"?, "assessed_at"?}，含义同 add。
+        """
+        rows = [self._row(record) for record in records]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT, rows)
+            self._apply_aggregates(rows, sign=1)
+        return len(rows)
+
+    @staticmethod
+    def _row(record: Dict) -> Tuple:
+        profile = record["profile"]
+        child_id = record.get("child_id") or profile.get("child_id") or profile.get("name")
+        if not child_id:
+            raise ValueError("评估记录缺少 child_id（或档案中的 name）")
+        scores = profile_scores(profile)
+        result = record.get("result")
+        if result is None:
+            result = lookup_scores(scores)  # 与 calculate_assessment 相同，只是不重复解析档案
+        assessed_at = record.get("assessed_at") or time.time()
+        try:
+            age = float(profile["age"]) if profile.get("age") is not None else None
+        except (TypeError, ValueError):
+            age = None
+        return (
+            str(child_id),
+            str(profile.get("name") or ""),
+            str(record.get("class_id") or ""),
+            record.get("term") or term_of(assessed_at),
+            age,
+            float(assessed_at),
+            *scores,
+            total_score(scores),
+            result["overall_level"],
+            json.dumps(profile, ensure_ascii=False),
+            json.dumps({key: list(value) if isinstance(value, tuple) else value for key, value in result.items()},
+                       ensure_ascii=False),
+        )
+
+    def _apply_aggregates(self, rows: Sequence[Tuple], sign: int) -> None:
+        """先在内存里按 班级×学期 合并，再每组一条 upsert；调用方持有锁并处于事务中"""
+        dimensions: Dict[Tuple[str, str, str], List[int]] = defaultdict(lambda: [0] * (3 + len(_COUNT_COLUMNS)))
+        levels: Dict[Tuple[str, str, str], List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        bands: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0] * (1 + len(_COUNT_COLUMNS)))
+        band_totals: Dict[Tuple[str, int], int] = defaultdict(int)
+        first_score = 6  # _row 中分数之前的列数
+        for row in rows:
+            class_id, term, band = row[2], row[3], age_band(row[4])
+            for field, score in zip(SCORE_FIELDS, row[first_score:first_score + len(SCORE_FIELDS)]):
+                stats = dimensions[(class_id, term, field)]
+                stats[0] += sign
+                stats[1] += sign * score
+                stats[2] += sign * score * score
+                stats[2 + score] += sign
+                stats = bands[(band, field)]
+                stats[0] += sign
+                stats[score] += sign
+            total, level = row[first_score + len(SCORE_FIELDS)], row[first_score + len(SCORE_FIELDS) + 1]
+            stats = levels[(class_id, term, level)]
+            stats[0] += sign
+            stats[1] += sign * total
+            stats[2] += sign * total * total
+            band_totals[(band, total_quarter(total))] += sign
+        self._conn.executemany(_UPSERT_DIMENSION, [key + tuple(values) for key, values in dimensions.items()])
+        self._conn.executemany(_UPSERT_LEVEL, [key + tuple(values) for key, values in levels.items()])
+        self._conn.executemany(_UPSERT_BAND, [key + tuple(values) for key, values in bands.items()])
+        self._conn.executemany(_UPSERT_BAND_TOTAL, [key + (count,) for key, count in band_totals.items()])
+        if sign < 0:
+            self._conn.execute("DELETE FROM class_dimension_stats WHERE n <= 0")
+            self._conn.execute("DELETE FROM class_level_stats WHERE n <= 0")
+            self._conn.execute("DELETE FROM age_band_stats WHERE n <= 0")
+            self._conn.execute("DELETE FROM age_band_totals WHERE n <= 0")
+
+    def delete_child(self, child_id: str) -> int:
+        """删除某个孩子的全部记录（如家长要求），同步扣减班级聚合；返回删除条数"""
+        columns = ", ".join(["child_id", "child_name", "class_id", "term", "age", "assessed_at", *SCORE_FIELDS,
+                             "total", "overall_level"])
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM assessments WHERE child_id = ?", (child_id,)
+            ).fetchall()
+            if rows:
+                self._conn.execute("DELETE FROM assessments WHERE child_id = ?", (child_id,))
+                self._apply_aggregates(rows, sign=-1)
+        return len(rows)
+
+    def _rebuild_norms(self) -> None:
+        """按原始记录重算年龄段汇总表；调用方持有锁并处于事务中"""
+        counts = ", ".join(f"SUM({{field}} = {score})" for score in SCORE_LEVELS)
+        self._conn.execute("DELETE FROM age_band_stats")
+        self._conn.execute("DELETE FROM age_band_totals")
+        for field in SCORE_FIELDS:
+            self._conn.execute(
+                "INSERT INTO age_band_stats SELECT age_band(age), ?, COUNT(*), "
+                + counts.format(field=field)
+                + " FROM assessments GROUP BY age_band(age)",
+                (field,),
+            )
+        self._conn.execute(
+            "INSERT INTO age_band_totals"
+            " SELECT age_band(age), CAST(ROUND(total * 4) AS INTEGER) AS quarter, COUNT(*)"
+            " FROM assessments GROUP BY age_band(age), quarter"
+        )
+
+    def rebuild_aggregates(self) -> None:
+        """按原始记录重算全部聚合表（班级汇总与年龄段常模）"""
+        counts = ", ".join(f"SUM({{field}} = {score})" for score in SCORE_LEVELS)
+        with self._lock, self._conn:
+            self._rebuild_norms()
+            self._conn.execute("DELETE FROM class_dimension_stats")
+            self._conn.execute("DELETE FROM class_level_stats")
+            for field in SCORE_FIELDS:
+                self._conn.execute(
+                    "INSERT INTO class_dimension_stats"
+                    f" SELECT class_id, term, ?, COUNT(*), SUM({field}), SUM({field} * {field}), "
+                    + counts.format(field=field)
+                    + " FROM assessments GROUP BY class_id, term",
+                    (field,),
+                )
+            self._conn.execute(
+                "INSERT INTO class_level_stats"
+                " SELECT class_id, term, overall_level, COUNT(*), SUM(total), SUM(total * total)"
+                " FROM assessments GROUP BY class_id, term, overall_level"
+            )
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    def _record(row: Sequence, with_profile: bool) -> Dict:
+        record: Dict[str, Any] = dict(zip(_RECORD_COLUMNS, row))
+        offset = len(_RECORD_COLUMNS)
+        record["scores"] = dict(zip(SCORE_FIELDS, row[offset:offset + len(SCORE_FIELDS)]))
+        offset += len(SCORE_FIELDS)
+        record["total"], record["overall_level"] = row[offset], row[offset + 1]
+        record["result"] = json.loads(row[offset + 2])
+        if with_profile:
+            record["profile"] = json.loads(row[offset + 3])
+        return record
+
+    def _select(self, where: str, params: Sequence, limit: Optional[int], with_profile: bool) -> List[Dict]:
+        columns = _RECORD_COLUMNS + SCORE_FIELDS + ["total", "overall_level", "result"]
+        if with_profile:
+            columns.append("profile")
+        sql = f"SELECT {', '.join(columns)} FROM assessments WHERE {where} ORDER BY assessed_at"
+        if limit:
+            # 取最近的 limit 条，再按时间正序返回
+            sql = f"SELECT * FROM ({sql} DESC LIMIT {int(limit)}) ORDER BY assessed_at"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._record(row, with_profile) for row in rows]
+
+    def history(self, child_id: str, limit: Optional[int] = None, with_profile: bool = False) -> List[Dict]:
+        """某个孩子的历次评估，按时间先后；limit 只取最近几次"""
+        return self._select("child_id = ?", (child_id,), limit, with_profile)
+
+    def class_records(
+        self,
+        class_id: str,
+        term: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """某个班级（可限定学期、起始时间）的评估记录，按时间先后"""
+        where, params = "class_id = ?", [class_id]
+        if term is not None:
+            where, params = where + " AND term = ?", params + [term]
+        if since is not None:
+            where, params = where + " AND assessed_at >= ?", params + [since]
+        return self._select(where, params, limit, with_profile=False)
+
+    def classes(self) -> List[Dict]:
+        """各 班级×学期 的评估人次（读聚合表）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT class_id, term, SUM(n) FROM class_level_stats GROUP BY class_id, term ORDER BY class_id, term"
+            ).fetchall()
+        return [{"class_id": class_id, "term": term, "n": n} for class_id, term, n in rows]
+
+    def norm_counts(self) -> Tuple[List[Tuple], List[Tuple]]:
+        """年龄段常模的计数，供 CohortNorms.load：(年龄段, 能力项, 1-5 分各档人数...) 与 (年龄段, 总分×4, 人数)"""
+        with self._lock:
+            dimension_rows = self._conn.execute(
+                f"SELECT age_band, dimension, {', '.join(_COUNT_COLUMNS)} FROM age_band_stats"
+            ).fetchall()
+            total_rows = self._conn.execute("SELECT age_band, quarter, n FROM age_band_totals").fetchall()
+        return dimension_rows, total_rows
+
+    def dimension_means(self, term: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """所有班级各能力项的均值（读聚合表），{班级: {能力项: 均值}}；term 为空时合并所有学期"""
+        where, params = ("WHERE term = ?", (term,)) if term is not None else ("", ())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT class_id, dimension, SUM(n), SUM(score_sum) FROM class_dimension_stats {where}"
+                " GROUP BY class_id, dimension ORDER BY class_id",
+                params,
+            ).fetchall()
+        means: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for class_id, dimension, n, score_sum in rows:
+            if n > 0:
+                means[class_id][dimension] = score_sum / n
+        return dict(means)
+
+    def class_stats(self, class_id: str, term: Optional[str] = None) -> Dict:
+        """班级汇总（读聚合表）：各能力项的均值、标准差和 1-5 分各档人数，各等级人数和总分均值
+
+        term 为空时合并该班级的所有学期。
+        """
+        where, params = "class_id = ?", [class_id]
+        if term is not None:
+            where, params = where + " AND term = ?", params + [term]
+        counts = ", ".join(f"SUM({column})" for column in _COUNT_COLUMNS)
+        with self._lock:
+            dimension_rows = self._conn.execute(
+                f"SELECT dimension, SUM(n), SUM(score_sum), SUM(score_sq), {counts}"
+                f" FROM class_dimension_stats WHERE {where} GROUP BY dimension",
+                params,
+            ).fetchall()
+            level_rows = self._conn.execute(
+                f"SELECT level, SUM(n), SUM(total_sum), SUM(total_sq) FROM class_level_stats WHERE {where} GROUP BY level",
+                params,
+            ).fetchall()
+
+        dimensions: Dict[str, Dict] = {}
+        for dimension, n, score_sum, score_sq, *histogram in dimension_rows:
+            mean, std = _mean_std(n, score_sum, score_sq)
+            dimensions[dimension] = {"n": n, "mean": mean, "std": std, "counts": histogram}
+        levels = {level: 0 for level in LEVELS}
+        n = total_sum = total_sq = 0
+        for level, count, level_sum, level_sq in level_rows:
+            levels[level] = count
+            n, total_sum, total_sq = n + count, total_sum + level_sum, total_sq + level_sq
+        total_mean, total_std = _mean_std(n, total_sum, total_sq)
+        return {
+            "class_id": class_id,
+            "term": term,
+            "n": n,
+            "total_mean": total_mean,
+            "total_std": total_std,
+            "levels": levels,
+            "dimensions": {field: dimensions[field] for field in SCORE_FIELDS if field in dimensions},
+        }
+
+    def class_progress(self, class_id: str) -> List[Dict]:
+        """班级各学期的能力项均值与总分均值，按学期先后，用于跟踪跨学期的进步"""
+        with self._lock:
+            dimension_rows = self._conn.execute(
+                "SELECT term, dimension, n, score_sum FROM class_dimension_stats WHERE class_id = ?", (class_id,)
+            ).fetchall()
+            level_rows = self._conn.execute(
+                "SELECT term, SUM(n), SUM(total_sum) FROM class_level_stats WHERE class_id = ? GROUP BY term",
+                (class_id,),
+            ).fetchall()
+        means: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for term, dimension, n, score_sum in dimension_rows:
+            if n > 0:
+                means[term][dimension] = score_sum / n
+        return [
+            {"term": term, "n": n, "total_mean": total_sum / n if n else None, "means": means.get(term, {})}
+            for term, n, total_sum in sorted(level_rows)
+        ]
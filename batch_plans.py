@@ -0,0 +1,215 @@
+"""
+批量生成幼小衔接计划
+读取整个班级/园所的花名册（CSV 或 JSONL），相同档案只调用一次 LLM，
+并发受限，结果逐行写入 JSONL；输出文件同时作为断点，中断后重新运行会从上次位置继续。
+
+用法：python batch_plans.py roster.csv -o plans.jsonl --concurrency 8
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from assessment import LANG_KEYS, MATH_KEYS, OTHER_KEYS, _score
+
+_LIST_SEPARATORS = re.compile(r"[;；、|]")
+
+
+def _split_list(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    if not value:
+        return []
+    return [item.strip() for item in _LIST_SEPARATORS.split(str(value)) if item.strip()]
+
+
+def _number(value, default):
+    if value in (None, ""):
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return int(number) if number.is_integer() else number
+
+
+def row_to_profile(row: Dict) -> Dict:
+    """CSV 平铺的一行 -> 与 app.py 相同结构的档案字典
+
+    分数与 calculate_assessment 的规则一致：取整并裁剪到 1-5，空白或非法取值按 3 分。
+    """
+    return {
+        "name": row.get("name", ""),
+        "age": _number(row.get("age"), 5.5),
+        "language": {k: _score(_number(row.get(k), 3)) for k in LANG_KEYS},
+        "math": {k: _score(_number(row.get(k), 3)) for k in MATH_KEYS},
+        **{k: _score(_number(row.get(k), 3)) for k in OTHER_KEYS},
+        "interests": _split_list(row.get("interests")),
+        "concerns": _split_list(row.get("concerns")),
+    }
+
+
+def load_roster(path: Path) -> List[Dict]:
+    """读取花名册：.csv 为平铺列（兴趣/担忧用 ; 或 、 分隔），其他按 JSONL 处理"""
+    if path.suffix.lower() == ".csv":
+        with path.open(encoding="utf-8-sig", newline="") as f:
+            return [row_to_profile(row) for row in csv.DictReader(f)]
+    profiles = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                profile = json.loads(line)
+                profile["interests"] = _split_list(profile.get("interests"))
+                profile["concerns"] = _split_list(profile.get("concerns"))
+                profiles.append(profile)
+    return profiles
+
+
+def load_checkpoint(path: Path) -> Tuple[set, Dict[str, dict]]:
+    """从已有输出中恢复：已完成的行号，以及 签名 -> 计划"""
+    done_rows: set = set()
+    plans: Dict[str, dict] = {}
+    if not path.exists():
+        return done_rows, plans
+    data = path.read_bytes()
+    if data and not data.endswith(b"\n"):
+        # 上次中断时最后一行只写了一半：截掉，避免新记录接在它后面
+        data = data[:data.rfind(b"\n") + 1]
+        with path.open("r+b") as f:
+            f.truncate(len(data))
+    for line in data.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if "plan" in record:
+            done_rows.add(record["row"])
+            plans[record["signature"]] = record["plan"]
+    return done_rows, plans
+
+
+class _Writer:
+    def __init__(self, path: Path):
+        self._file = path.open("a", encoding="utf-8")
+        self._lock = asyncio.Lock()
+
+    async def write(self, records: List[Dict]) -> None:
+        async with self._lock:
+            for record in records:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def run_batch(
+    agent,
+    profiles: List[Dict],
+    output_path: Path,
+    duration: str = "3个月",
+    concurrency: int = 4,
+    force_refresh: bool = False,
+) -> Dict:
+    """批量生成计划，返回统计信息；输出每行为 {row, name, signature, plan | error}，档案无法解析的行为 {row, name, error}"""
+    done_rows, known_plans = load_checkpoint(output_path)
+
+    groups: Dict[str, List[Tuple[int, Dict]]] = {}
+    child_profiles = {}
+    invalid: List[Dict] = []
+    for row, data in enumerate(profiles):
+        if row in done_rows:
+            continue
+        try:
+            child = agent.build_profile(data)
+        except (ValueError, TypeError, AttributeError) as exc:
+            # 花名册里的一行有问题只记为该行失败，不中断整批（下次运行会重试这一行）
+            invalid.append({"row": row, "name": str(data.get("name", "")), "error": f"档案格式不正确：{exc}"})
+            continue
+        signature = agent.plan_signature(child, duration)
+        groups.setdefault(signature, []).append((row, data))
+        child_profiles.setdefault(signature, child)
+
+    stats = {
+        "rows": len(profiles),
+        "resumed": len(done_rows),
+        "distinct": len(groups),
+        "llm_calls": 0,
+        "reused": 0,
+        "failed": len(invalid),
+    }
+    writer = _Writer(output_path)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    def records(signature: str, members, **result) -> List[Dict]:
+        return [
+            {"row": row, "name": data.get("name", ""), "signature": signature, **result}
+            for row, data in members
+        ]
+
+    async def generate(signature: str, members) -> None:
+        async with semaphore:
+            stats["llm_calls"] += 1
+            try:
+                plan = await agent.agenerate_plan(
+                    child_profiles[signature], duration, force_refresh=force_refresh
+                )
+            except Exception as exc:
+                stats["failed"] += len(members)
+                await writer.write(records(signature, members, error=str(exc)))
+                return
+        stats["reused"] += len(members) - 1
+        await writer.write(records(signature, members, plan=plan))
+
+    try:
+        if invalid:
+            await writer.write(invalid)
+        tasks = []
+        for signature, members in groups.items():
+            if signature in known_plans:
+                stats["reused"] += len(members)
+                await writer.write(records(signature, members, plan=known_plans[signature]))
+            else:
+                tasks.append(generate(signature, members))
+        await asyncio.gather(*tasks)
+    finally:
+        writer.close()
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量生成幼小衔接计划")
+    parser.add_argument("roster", type=Path, help="花名册文件（.csv 或 .jsonl）")
+    parser.add_argument("-o", "--output", type=Path, default=Path("plans.jsonl"), help="输出 JSONL，兼作断点")
+    parser.add_argument("--duration", default="3个月", help="计划周期")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的 LLM 请求数")
+    parser.add_argument("--force-refresh", action="store_true", help="忽略计划缓存，全部重新生成")
+    args = parser.parse_args(argv)
+
+    from kindergarten_agent_full import KindergartenAgent
+
+    profiles = load_roster(args.roster)
+    agent = KindergartenAgent()
+    start = time.perf_counter()
+    stats = asyncio.run(run_batch(
+        agent, profiles, args.output, args.duration, args.concurrency, args.force_refresh
+    ))
+    print(
+        f"共 {stats['rows']} 人（断点恢复 {stats['resumed']} 人），不同档案 {stats['distinct']} 种；"
+        f"调用 LLM {stats['llm_calls']} 次，复用计划 {stats['reused']} 人，失败 {stats['failed']} 人；"
+        f"用时 {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+页面交互的服务端 CPU 基准：用 Streamlit AppTest 驱动 app.py，统计每次交互引起的脚本重跑在脚本线程上消耗的 CPU 时间
+- 被操作的控件位于 st.fragment 内时，和浏览器一样只重跑该片段（RerunData.fragment_id_queue），否则整页重跑
+- 每个场景在全新的 AppTest 中先完成前置操作，只计量最后一次交互；同时统计这次重跑发往浏览器的元素数
+- 默认不配置 LLM（显示示例计划与本地问答），计量的是页面本身的开销；加 --llm 时接本地替身服务，
+  并增加只在启用 LLM 时出现的“生成计划”页交互（agent 的构建在预热轮次完成，不计入）
+
+用法：python benchmarks/bench_app_reruns.py [--llm] [重复次数] [脚本路径 ...]
+  不给路径时计量 app.py；给多个路径时并排对比，如改动前后：
+  git show HEAD~1:app.py > /tmp/app_before.py && python benchmarks/bench_app_reruns.py 20 /tmp/app_before.py app.py
+"""
+
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as app_test_module
+from streamlit.testing.v1 import local_script_runner as local_script_runner_module
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+class _FragmentAwareRunner(LocalScriptRunner):
+    """AppTest 总是整页重跑；这里按需带上 fragment_id，记录脚本线程的 CPU 时间和最近一次运行发出的消息
+
+    只计脚本线程的 CPU（time.thread_time），不含 AppTest 自身搭建模拟运行时的开销。
+    """
+
+    next_fragment: Optional[str] = None
+    messages: List = []
+    cpu_seconds = 0.0
+
+    def _run_script(self, rerun_data):
+        # 运行器创建时已排好一次整页重跑，所以在执行前而不是 request_rerun 时改写
+        if _FragmentAwareRunner.next_fragment:
+            rerun_data = replace(rerun_data, fragment_id_queue=[_FragmentAwareRunner.next_fragment])
+        started = time.thread_time()
+        try:
+            super()._run_script(rerun_data)
+        finally:
+            _FragmentAwareRunner.cpu_seconds += time.thread_time() - started
+
+    def run(self, *args, **kwargs):
+        tree = super().run(*args, **kwargs)
+        _FragmentAwareRunner.messages = self.forward_msgs()
+        return tree
+
+
+app_test_module.LocalScriptRunner = _FragmentAwareRunner
+# AppTest 每次运行都新建 ScriptCache、重新编译脚本；线上服务只编译一次，这里同样共用一个
+_SCRIPT_CACHE = local_script_runner_module.ScriptCache()
+local_script_runner_module.ScriptCache = lambda: _SCRIPT_CACHE
+# AppTest 在主线程构造时会提示缺少 ScriptRunContext，与计量无关（Streamlit 会重设日志级别，只能整体关闭）
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+
+
+def _elements(messages) -> List:
+    return [
+        msg.delta.new_element for msg in messages
+        if msg.HasField("delta") and msg.delta.WhichOneof("type") == "new_element"
+    ]
+
+
+def _fragment_of(widget_id: str) -> str:
+    """上一次运行中该控件所在的片段 id，不在片段内时为空串"""
+    for msg in _FragmentAwareRunner.messages:
+        if not msg.HasField("delta") or msg.delta.WhichOneof("type") != "new_element":
+            continue
+        element = msg.delta.new_element
+        proto = getattr(element, element.WhichOneof("type"))
+        if getattr(proto, "id", None) == widget_id:
+            return msg.delta.fragment_id
+    raise LookupError(f"上一次运行中没有找到控件 {widget_id}")
+
+
+def _goto(at: AppTest, page: str) -> None:
+    at.sidebar.radio(key="menu").set_value(page).run()
+
+
+def _open_home(at: AppTest):
+    return None  # 首次打开：计量的就是第一次整页运行
+
+
+def _switch_to_assessment(at: AppTest):
+    at.run()
+    return at.sidebar.radio(key="menu").set_value("📋 能力评估")
+
+
+def _submit_assessment(at: AppTest):
+    at.run()
+    _goto(at, "📋 能力评估")
+    at.text_input[0].input("小明")
+    at.radio(key="social").set_value(4)
+    return next(b for b in at.button if b.label == "提交评估").click()
+
+
+def _pick_common_question(at: AppTest):
+    at.run()
+    _goto(at, "💬 问答咨询")
+    return at.button(key="q_0").click()
+
+
+def _ask_question(at: AppTest):
+    at.run()
+    _goto(at, "💬 问答咨询")
+    at.button(key="q_0").click().run()
+    return next(b for b in at.button if b.label == "获取回答").click()
+
+
+def _toggle_force_refresh(at: AppTest):
+    _submit_assessment(at).run()
+    _goto(at, "📅 生成计划")
+    return at.checkbox[0].check()
+
+
+SCENARIOS: List[Tuple[str, Callable]] = [
+    ("打开首页", _open_home),
+    ("切换到能力评估", _switch_to_assessment),
+    ("提交能力评估", _submit_assessment),
+    ("问答：点选常见问题", _pick_common_question),
+    ("问答：获取回答", _ask_question),
+]
+LLM_SCENARIOS: List[Tuple[str, Callable]] = [
+    ("计划：勾选不使用缓存", _toggle_force_refresh),
+]
+
+
+def measure(script: Path, prepare: Callable) -> Tuple[float, str, int]:
+    """返回 (CPU 秒数, 重跑范围, 发往浏览器的元素数)"""
+    at = AppTest.from_file(str(script), default_timeout=30)
+    widget = prepare(at)
+    fragment = _fragment_of(widget.id) if widget is not None else ""
+    _FragmentAwareRunner.next_fragment = fragment or None
+    _FragmentAwareRunner.cpu_seconds = 0.0
+    try:
+        at.run()
+    finally:
+        _FragmentAwareRunner.next_fragment = None
+    if at.exception:
+        raise RuntimeError(f"脚本运行出错：{at.exception[0].message}")
+    return _FragmentAwareRunner.cpu_seconds, "片段" if fragment else "整页", len(_elements(_FragmentAwareRunner.messages))
+
+
+def main(runs: int, scripts: List[Path], scenarios: List[Tuple[str, Callable]]) -> int:
+    """多个脚本时逐轮交替计量，机器负载的波动对各脚本的影响相同"""
+    print(f"每项 {runs} 次取中位数，单位 ms；范围：整页 / 片段，括号内为发往浏览器的元素数")
+    for index, script in enumerate(scripts):
+        print(f"[{index}] {script}")
+    print(f"{'场景':<22}" + "".join(f"{f'[{index}]':>20}" for index in range(len(scripts))))
+    for name, prepare in scenarios:
+        samples: Dict[Path, List[Tuple[float, str, int]]] = {script: [] for script in scripts}
+        for script in scripts:
+            measure(script, prepare)  # 预热：导入模块、填充缓存
+        for _ in range(runs):
+            for script in scripts:
+                samples[script].append(measure(script, prepare))
+        cells = []
+        for script in scripts:
+            cpu = statistics.median(sample[0] for sample in samples[script])
+            _, scope, elements = samples[script][-1]
+            cells.append(f"{cpu * 1000:.1f} {scope}({elements})")
+        print(f"{name:<22}" + "".join(f"{cell:>20}" for cell in cells))
+    return 0
+
+
+def with_llm_standin(runs: int, scripts: List[Path]) -> int:
+    from llm_standin import spawn
+
+    server, base_url = spawn(latency="fixed:0")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # agent 的配置在导入时读取，须在第一次运行脚本之前设置
+            os.environ.update(
+                OPENAI_API_KEY="sk-bench",
+                OPENAI_BASE_URL=base_url,
+                OPENAI_USE_EMBEDDINGS="0",
+                RESPONSE_CACHE="0",
+                PLAN_CACHE="off",
+                CHROMA_DIR=str(Path(tmp) / "chroma"),
+                KEYWORD_INDEX_PATH=str(Path(tmp) / "keyword_index.json"),
+            )
+            return main(runs, scripts, SCENARIOS + LLM_SCENARIOS)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    use_llm = "--llm" in args
+    args = [arg for arg in args if arg != "--llm"]
+    runs = int(args[0]) if args else 10
+    scripts = [Path(arg).resolve() for arg in args[1:]] or [ROOT / "app.py"]
+    if not use_llm:
+        for key in ("OPENAI_API_KEY", "ANTHROPIC_AUTH_TOKEN", "ANTHROPIC_API_KEY"):
+            os.environ.pop(key, None)
+    with tempfile.TemporaryDirectory() as data_dir:
+        # 提交评估会写入评估记录库，放在临时目录
+        os.environ["ASSESSMENT_DB_PATH"] = str(Path(data_dir) / "assessments.sqlite3")
+        code = with_llm_standin(runs, scripts) if use_llm else main(runs, scripts, SCENARIOS)
+    sys.exit(code)
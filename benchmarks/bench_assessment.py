@@ -0,0 +1,89 @@
+"""
+批量评估基准：逐条 calculate_assessment 循环 vs calculate_assessments_batch
+
+用法：python benchmarks/bench_assessment.py [行数 ...]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from assessment import (  # noqa: E402
+    LANG_KEYS,
+    MATH_KEYS,
+    SCORE_FIELDS,
+    calculate_assessment,
+    calculate_assessments_batch,
+    expand_batch_results,
+    lookup_assessment,
+)
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.integers(1, 6, size=(rows, len(SCORE_FIELDS))), columns=SCORE_FIELDS)
+
+
+def to_profiles(frame: pd.DataFrame):
+    profiles = []
+    for row in frame.itertuples(index=False):
+        values = row._asdict()
+        profiles.append({
+            "language": {k: values[k] for k in LANG_KEYS},
+            "math": {k: values[k] for k in MATH_KEYS},
+            "social": values["social"],
+            "self_care": values["self_care"],
+            "motor": values["motor"],
+        })
+    return profiles
+
+
+def bench(rows: int) -> None:
+    frame = make_frame(rows)
+    profiles = to_profiles(frame)
+
+    start = time.perf_counter()
+    expected = [calculate_assessment(p) for p in profiles]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = calculate_assessments_batch(frame)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expanded = expand_batch_results(batch)
+    expand_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shared = expand_batch_results(batch, shared=True)
+    shared_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looked_up = [lookup_assessment(p) for p in profiles]
+    lookup_time = time.perf_counter() - start
+
+    assert expanded == expected, "批量结果与逐条结果不一致"
+    assert all(dict(a, **{k: list(a[k]) for k in a if k != "overall_level"}) == b
+               for a, b in zip(looked_up[:1000], expected[:1000])), "查表结果与逐条结果不一致"
+    assert shared[:1000] == looked_up[:1000]
+    print(
+        f"{rows:>9} 行 | 循环 {loop_time:8.3f}s | 向量化 {batch_time:8.4f}s "
+        f"({loop_time / batch_time:6.1f}x) | 展开为字典 {expand_time:7.3f}s "
+        f"(合计 {loop_time / (batch_time + expand_time):5.1f}x)"
+    )
+    print(
+        f"{'':>9}    | 逐条查表 {lookup_time:6.3f}s ({loop_time / lookup_time:4.1f}x) | "
+        f"向量化 + 共享结果 {batch_time + shared_time:6.3f}s "
+        f"({loop_time / (batch_time + shared_time):5.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 1_000_000]
+    for size in sizes:
+        bench(size)
@@ -0,0 +1,100 @@
+"""
+评估记录库基准：逐条 add vs 批量 add_many 的写入速度；班级汇总读聚合表 vs 从原始记录重算；单个孩子的历史查询
+
+用法：python benchmarks/bench_assessment_store.py [记录数，默认 200000]
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from assessment import LANG_KEYS, MATH_KEYS, OTHER_KEYS, SCORE_FIELDS  # noqa: E402
+from assessment_store import AssessmentStore  # noqa: E402
+
+CLASSES = 200
+TERMS = ["2024秋", "2025春", "2025秋", "2026春"]
+BATCH = 1000
+
+
+def make_records(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(1, 6, size=(n, len(SCORE_FIELDS)))
+    for i, row in enumerate(scores.tolist()):
+        values = dict(zip(SCORE_FIELDS, row))
+        child = i % (n // len(TERMS) or 1)  # 每个孩子每学期评估一次
+        yield {
+            "profile": {
+                "name": f"c{child}",
+                "age": 5.5,
+                "language": {k: values[k] for k in LANG_KEYS},
+                "math": {k: values[k] for k in MATH_KEYS},
+                **{k: values[k] for k in OTHER_KEYS},
+            },
+            "child_id": f"c{child}",
+            "class_id": f"class{child % CLASSES}",
+            "term": TERMS[i * len(TERMS) // n],
+            "assessed_at": 1.7e9 + i,
+        }
+
+
+def timed(func, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def raw_class_stats(store: AssessmentStore, class_id: str):
+    """不用聚合表：每次从原始记录按能力项统计"""
+    columns = ", ".join(f"AVG({field}), COUNT({field})" for field in SCORE_FIELDS)
+    with store._lock:
+        return store._conn.execute(
+            f"SELECT overall_level, COUNT(*), AVG(total), {columns} FROM assessments"
+            " WHERE class_id = ? GROUP BY overall_level",
+            (class_id,),
+        ).fetchall()
+
+
+def main(n: int) -> None:
+    records = list(make_records(n))
+    with tempfile.TemporaryDirectory() as tmp:
+        single = AssessmentStore(Path(tmp) / "single.sqlite3")
+        sample = records[:2000]
+        start = time.perf_counter()
+        for record in sample:
+            single.add(**record)
+        per_row = (time.perf_counter() - start) / len(sample)
+        single.close()
+
+        store = AssessmentStore(Path(tmp) / "batch.sqlite3")
+        start = time.perf_counter()
+        for i in range(0, n, BATCH):
+            store.add_many(records[i:i + BATCH])
+        batched = (time.perf_counter() - start) / n
+        print(f"写入 {n} 条 | 逐条 add {1 / per_row:9.0f} 条/秒 | add_many(每批 {BATCH}) {1 / batched:9.0f} 条/秒"
+              f" ({per_row / batched:.1f}x)")
+
+        # 取中等规模的班级，加上全部学期
+        class_id = f"class{CLASSES // 2}"
+        aggregated = timed(lambda: store.class_stats(class_id))
+        raw = timed(lambda: raw_class_stats(store, class_id))
+        size = store.class_stats(class_id)["n"]
+        print(f"班级汇总（{size} 条记录） | 聚合表 {aggregated * 1000:7.2f}ms | 原始记录重算 {raw * 1000:7.2f}ms"
+              f" ({raw / aggregated:.0f}x)")
+        progress = timed(lambda: store.class_progress(class_id))
+        print(f"班级跨学期进度 | {progress * 1000:.2f}ms")
+        history = timed(lambda: store.history("c42"), repeat=200)
+        print(f"单个孩子历史（{len(store.history('c42'))} 条） | {history * 1e6:.0f}µs")
+        store.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,125 @@
+"""
+同龄常模与班级看板基准
+- 百分位：CohortNorms 由累计人数直接计算 vs 每次在原始记录上按年龄段计数
+- 看板：一个班级的全部图表与各班级热力图由汇总表生成，统计生成耗时和发往浏览器的 JSON 大小；
+  对照为直接把全部记录的总分画成直方图（数据点随记录数增长）
+
+用法：python benchmarks/bench_cohort_norms.py [记录数，默认 200000]
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cohort_charts  # noqa: E402
+from assessment import LANG_KEYS, MATH_KEYS, OTHER_KEYS, SCORE_FIELDS  # noqa: E402
+from assessment_store import AssessmentStore  # noqa: E402
+from cohort_norms import ALL_AGES, CohortNorms, age_band  # noqa: E402
+
+CLASSES = 200
+TERMS = ["2024秋", "2025春", "2025秋", "2026春"]
+AGES = [4.5, 5.0, 5.5, 6.0, 6.5]
+BATCH = 1000
+
+
+def make_records(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(1, 6, size=(n, len(SCORE_FIELDS)))
+    ages = rng.choice(AGES, size=n)
+    for i, (row, age) in enumerate(zip(scores.tolist(), ages.tolist())):
+        values = dict(zip(SCORE_FIELDS, row))
+        yield {
+            "profile": {
+                "name": f"c{i}",
+                "age": age,
+                "language": {k: values[k] for k in LANG_KEYS},
+                "math": {k: values[k] for k in MATH_KEYS},
+                **{k: values[k] for k in OTHER_KEYS},
+            },
+            "class_id": f"class{i % CLASSES}",
+            "term": TERMS[i * len(TERMS) // n],
+            "assessed_at": 1.7e9 + i,
+        }
+
+
+def timed(func, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def raw_percentiles(store: AssessmentStore, scores, age) -> dict:
+    """不用常模：在原始记录上数同年龄段里低于 / 等于孩子分数的人数"""
+    columns = ", ".join(f"SUM({field} < ?), SUM({field} = ?)" for field in SCORE_FIELDS)
+    params = [value for score in scores for value in (score, score)]
+    with store._lock:
+        row = store._conn.execute(
+            f"SELECT COUNT(*), {columns} FROM assessments WHERE age_band(age) = ?", params + [age_band(age)]
+        ).fetchone()
+    n = row[0]
+    return {field: 100.0 * (row[1 + 2 * i] + row[2 + 2 * i] / 2) / n for i, field in enumerate(SCORE_FIELDS)}
+
+
+def dashboard_figures(store: AssessmentStore, norms: CohortNorms, class_id: str):
+    stats = store.class_stats(class_id)
+    return [
+        cohort_charts.mean_radar(stats["dimensions"], norms.distribution(ALL_AGES)),
+        cohort_charts.score_distribution(stats["dimensions"]),
+        cohort_charts.level_bar(stats["levels"]),
+        cohort_charts.progress_lines(store.class_progress(class_id)),
+        cohort_charts.classes_heatmap(store.dimension_means()),
+    ]
+
+
+def raw_figure(store: AssessmentStore):
+    import plotly.graph_objects as go
+
+    with store._lock:
+        totals = [row[0] for row in store._conn.execute("SELECT total FROM assessments")]
+    return go.Figure(go.Histogram(x=totals))
+
+
+def main(n: int) -> None:
+    records = list(make_records(n))
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AssessmentStore(Path(tmp) / "norms.sqlite3")
+        for i in range(0, n, BATCH):
+            store.add_many(records[i:i + BATCH])
+
+        start = time.perf_counter()
+        norms = CohortNorms.from_store(store)
+        print(f"{n} 条记录 | 从汇总表载入常模 {(time.perf_counter() - start) * 1000:.2f}ms")
+
+        scores, age = [3, 4, 2, 5, 3, 3, 1, 4, 5, 2, 3], 5.5
+        fast = norms.percentiles(scores, age)
+        slow = raw_percentiles(store, scores, age)
+        assert all(abs(fast["dimensions"][field] - slow[field]) < 1e-9 for field in SCORE_FIELDS)
+        lookup = timed(lambda: norms.percentiles(scores, age), repeat=2000)
+        raw = timed(lambda: raw_percentiles(store, scores, age), repeat=5)
+        print(f"百分位（{fast['cohort']}，{fast['n']} 人） | 累计人数 {lookup * 1e6:.1f}µs | 原始记录计数 {raw * 1000:.1f}ms"
+              f" ({raw / lookup:.0f}x)")
+        increment = timed(lambda: norms.add(scores, age), repeat=2000)
+        print(f"新评估计入常模 | {increment * 1e6:.1f}µs")
+
+        class_id = f"class{CLASSES // 2}"
+        figures = dashboard_figures(store, norms, class_id)
+        build = timed(lambda: dashboard_figures(store, norms, class_id), repeat=5)
+        size = sum(len(figure.to_json()) for figure in figures)
+        print(f"班级看板（{len(figures)} 张图，含 {CLASSES} 个班级的热力图） | 生成 {build * 1000:.1f}ms | JSON {size / 1024:.0f}KB")
+        raw_build = timed(lambda: raw_figure(store), repeat=3)
+        raw_size = len(raw_figure(store).to_json())
+        print(f"对照：全部记录的总分直方图 | 生成 {raw_build * 1000:.1f}ms | JSON {raw_size / 1024:.0f}KB")
+        store.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,70 @@
+"""
+向量化流水线基准：直接调用 OpenAIEmbeddings vs CachedEmbeddings（冷启动 / 命中缓存）
+全部请求发往本地替身服务（llm_standin），不消耗真实额度
+
+用法：python benchmarks/bench_embeddings.py [分块数]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_openai import OpenAIEmbeddings  # noqa: E402
+
+from embedding_pipeline import CachedEmbeddings, EmbeddingCache  # noqa: E402
+from llm_standin import StandInServer  # noqa: E402
+
+MODEL = "text-embedding-3-small"
+
+
+def make_texts(count: int):
+    return [f"幼小衔接知识库示例分块，内容编号 {i % (count // 2 or 1)}" for i in range(count)]
+
+
+def make_inner(base_url: str, chunk_size: int = 1000) -> OpenAIEmbeddings:
+    return OpenAIEmbeddings(
+        model=MODEL,
+        api_key="sk-bench",
+        base_url=base_url,
+        check_embedding_ctx_length=False,
+        chunk_size=chunk_size,
+        max_retries=0,
+    )
+
+
+def timed(label: str, server: StandInServer, func) -> None:
+    server.reset_stats()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    stats = server.stats()
+    print(
+        f"{label:<28} {elapsed:7.3f}s | 请求 {stats['requests']:4d} | 文本 {stats['items']:5d} "
+        f"| 最大并发 {stats['max_in_flight']}"
+    )
+
+
+def main(count: int) -> None:
+    texts = make_texts(count)
+    print(f"{count} 个分块（其中 {len(set(texts))} 个不重复），替身服务每请求 50ms + 每条 1ms")
+    with StandInServer(latency=0.05, per_item_latency=0.001) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        timed("OpenAIEmbeddings 直接调用", server,
+              lambda: make_inner(server.base_url, chunk_size=64).embed_documents(texts))
+
+        cache = EmbeddingCache(Path(tmp) / "cache.sqlite3")
+        pipeline = CachedEmbeddings(make_inner(server.base_url), MODEL, cache=cache,
+                                    batch_size=64, max_concurrency=8)
+        timed("流水线（冷缓存，并发 8）", server, lambda: pipeline.embed_documents(texts))
+        timed("流水线（热缓存）", server, lambda: pipeline.embed_documents(texts))
+
+        reopened = CachedEmbeddings(make_inner(server.base_url), MODEL,
+                                    cache=EmbeddingCache(Path(tmp) / "cache.sqlite3"))
+        timed("流水线（重启后读磁盘缓存）", server, lambda: reopened.embed_documents(texts))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4000)
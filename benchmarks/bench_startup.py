@@ -0,0 +1,119 @@
+"""
+冷启动基准：模块导入耗时（-X importtime）与首个回答耗时（解释器启动 -> 构建 agent -> 第一次 chat）
+每项在全新子进程中运行多次取中位数，与 benchmarks/startup_budget.json 中的预算对比，超出预算时退出码为 1
+
+用法：python benchmarks/bench_startup.py [运行次数]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from llm_standin import spawn  # noqa: E402
+
+BUDGET_PATH = Path(__file__).with_name("startup_budget.json")
+
+# 子进程内执行：构建 agent 并发出第一个问题，打印各阶段的墙钟时间
+_FIRST_RESPONSE = """
+import json, time
+from kindergarten_agent_full import KindergartenAgent
+imported = time.time()
+agent = KindergartenAgent()
+built = time.time()
+agent.chat("孩子不想去小学怎么办？")
+answered = time.time()
+print(json.dumps({"import": imported, "agent": built, "first_response": answered}))
+"""
+
+
+def import_time(module: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """返回 (模块累计导入秒数, 最慢的若干顶层依赖)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    children: List[Tuple[float, str]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            seconds = int(cumulative) / 1e6
+        except ValueError:
+            continue  # 表头
+        # 子模块先于父模块输出、每层缩进两格；顶层的 site 等属于解释器启动，不计入
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                total = seconds
+                break
+            children = []
+        elif depth == 1:
+            children.append((seconds, name.strip()))
+    return total, sorted(children, reverse=True)[:5]
+
+
+def first_response(env: Dict[str, str]) -> Dict[str, float]:
+    """各阶段距启动子进程的秒数（包含解释器自身启动）"""
+    launched = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", _FIRST_RESPONSE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    stages = json.loads(result.stdout.strip().splitlines()[-1])
+    return {stage: timestamp - launched for stage, timestamp in stages.items()}
+
+
+def main(runs: int) -> int:
+    budget = json.loads(BUDGET_PATH.read_text(encoding="utf-8"))
+    measured: Dict[str, float] = {}
+
+    for module in ("assessment", "kindergarten_agent_full"):
+        samples = [import_time(module) for _ in range(runs)]
+        measured[f"import_{module}"] = statistics.median(total for total, _ in samples)
+        slowest = ", ".join(f"{name} {seconds * 1000:.0f}ms" for seconds, name in samples[-1][1])
+        print(f"import {module:<24} {measured[f'import_{module}'] * 1000:7.1f}ms  （最慢：{slowest}）")
+
+    server, base_url = spawn(latency="fixed:0.05")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                OPENAI_API_KEY="sk-bench",
+                OPENAI_BASE_URL=base_url,
+                OPENAI_USE_EMBEDDINGS="0",
+                RESPONSE_CACHE="0",
+                PLAN_CACHE="off",
+                CHROMA_DIR=str(Path(tmp) / "chroma"),
+                KEYWORD_INDEX_PATH=str(Path(tmp) / "keyword_index.json"),
+            )
+            # 第一次运行会建立关键词索引，之后的运行才是容器重启时的冷启动
+            first_response(env)
+            samples = [first_response(env) for _ in range(runs)]
+    finally:
+        server.terminate()
+        server.wait()
+    for stage in ("import", "agent", "first_response"):
+        measured[stage] = statistics.median(sample[stage] for sample in samples)
+    print(f"导入完成（距启动）            {measured['import'] * 1000:7.1f}ms")
+    print(f"构建 agent（距启动）            {measured['agent'] * 1000:7.1f}ms")
+    print(f"首个回答（距启动，LLM 延迟 50ms）{measured['first_response'] * 1000:7.1f}ms")
+
+    over = {key: value for key, value in measured.items() if value > budget.get(key, float("inf"))}
+    for key, value in over.items():
+        print(f"超出预算：{key} {value * 1000:.1f}ms > {budget[key] * 1000:.0f}ms", file=sys.stderr)
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,101 @@
+"""
+HTTP 服务压测：在独立进程中启动 api_server（LLM 指向本地替身服务），用 aiohttp 客户端并发请求各接口，统计吞吐和尾延迟
+
+用法：python benchmarks/loadtest_api.py [请求数] [并发数] [延迟分布，默认 fixed:0.2]
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector  # noqa: E402
+
+from llm_standin import spawn  # noqa: E402
+from loadtest_async import report, run_async  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(session: ClientSession, base: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{base}/readyz") as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("api_server 未能就绪")
+
+
+async def run_phases(base: str, total: int, concurrency: int) -> None:
+    connector = TCPConnector(limit=concurrency)
+    async with ClientSession(connector=connector, timeout=ClientTimeout(total=300)) as session:
+        await _wait_ready(session, base)
+
+        async def post(path: str, payload: dict) -> None:
+            async with session.post(f"{base}{path}", json=payload) as response:
+                await response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"{path} 返回 {response.status}")
+
+        phases = [
+            ("POST /v1/assess", lambda i: post("/v1/assess", {"profile": {"social": i % 5 + 1}})),
+            ("POST /v1/chat", lambda i: post("/v1/chat", {"message": f"第{i}个问题：孩子不想去小学怎么办？"})),
+            ("POST /v1/chat（SSE）", lambda i: post("/v1/chat", {"message": f"第{i}个问题", "stream": True})),
+            ("POST /v1/plan", lambda i: post("/v1/plan", {"profile": {"interests": ["画画"]}})),
+        ]
+        for label, factory in phases:
+            latencies, elapsed = await run_async(factory, total, concurrency)
+            report(label, latencies, elapsed)
+
+
+def main(total: int, concurrency: int, latency: str = "fixed:0.2") -> None:
+    standin, base_url = spawn(latency=latency)
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY="sk-loadtest",
+            OPENAI_BASE_URL=base_url,
+            OPENAI_USE_EMBEDDINGS="0",
+            RESPONSE_CACHE="0",
+            CHROMA_DIR=str(Path(tmp) / "chroma"),
+            API_MAX_CONCURRENCY=str(concurrency),
+        )
+        server = subprocess.Popen(
+            [sys.executable, str(ROOT / "api_server.py"), "--host", "127.0.0.1", "--port", str(port)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            print(f"LLM 替身延迟 {latency}，每个接口 {total} 个请求，并发 {concurrency}")
+            asyncio.run(run_phases(f"http://127.0.0.1:{port}", total, concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+            standin.terminate()
+            standin.wait()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if args else 1000,
+        int(args[1]) if len(args) > 1 else 200,
+        args[2] if len(args) > 2 else "fixed:0.2",
+    )
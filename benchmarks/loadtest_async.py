@@ -0,0 +1,116 @@
+"""
+异步接口压测：大量并发 achat / agenerate_plan 请求打到本地 LLM 替身服务（llm_standin），统计吞吐和尾延迟
+对照组为同步 chat 跑在线程池里
+
+用法：python benchmarks/loadtest_async.py [请求数] [并发数] [延迟分布，默认 fixed:0.2]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_standin import spawn  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def report(label: str, latencies: List[float], elapsed: float) -> None:
+    print(
+        f"{label:<26} {len(latencies) / elapsed:8.1f} req/s | "
+        f"p50 {percentile(latencies, 50) * 1000:7.1f}ms | p95 {percentile(latencies, 95) * 1000:7.1f}ms | "
+        f"p99 {percentile(latencies, 99) * 1000:7.1f}ms | 平均 {statistics.mean(latencies) * 1000:7.1f}ms"
+    )
+
+
+async def run_async(coro_factory, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await coro_factory(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, time.perf_counter() - start
+
+
+def run_threads(func, total: int, workers: int):
+    latencies: List[float] = []
+
+    def one(i: int) -> None:
+        start = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(total)))
+    return latencies, time.perf_counter() - start
+
+
+def main(total: int, concurrency: int, latency: str = "fixed:0.2") -> None:
+    server, base_url = spawn(latency=latency)
+    try:
+        _run(base_url, total, concurrency, latency)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def run_async_phases(agent, profile, total: int, concurrency: int) -> None:
+    # 两组异步压测放在同一个事件循环里：LLM 客户端的连接池绑定在创建它的事件循环上
+    latencies, elapsed = await run_async(
+        lambda i: agent.achat(f"第{i}个问题：孩子不想去小学怎么办？"), total, concurrency
+    )
+    report("achat", latencies, elapsed)
+
+    latencies, elapsed = await run_async(lambda i: agent.agenerate_plan(profile), total, concurrency)
+    report("agenerate_plan", latencies, elapsed)
+
+
+def _run(base_url: str, total: int, concurrency: int, latency: str) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            OPENAI_API_KEY="sk-loadtest",
+            OPENAI_BASE_URL=base_url,
+            OPENAI_USE_EMBEDDINGS="0",
+            RESPONSE_CACHE="0",
+            CHROMA_DIR=str(Path(tmp) / "chroma"),
+        )
+        from kindergarten_agent_full import KindergartenAgent
+
+        agent = KindergartenAgent()
+        profile = agent.build_profile({"name": "压测", "interests": ["画画"]})
+        print(f"LLM 替身延迟 {latency}，{total} 个请求，并发 {concurrency}")
+
+        asyncio.run(run_async_phases(agent, profile, total, concurrency))
+
+        workers = min(concurrency, 32)
+        latencies, elapsed = run_threads(
+            lambda i: agent.chat(f"第{i}个问题：孩子不想去小学怎么办？"), total, workers
+        )
+        report(f"同步 chat（{workers} 线程）", latencies, elapsed)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if args else 1000,
+        int(args[1]) if len(args) > 1 else 200,
+        args[2] if len(args) > 2 else "fixed:0.2",
+    )
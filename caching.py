@@ -0,0 +1,171 @@
+"""
+通用缓存后端：内存 LRU 与 SQLite 磁盘缓存
+两者接口一致（get / set / delete / clear / items），都支持条目数上限（LRU 淘汰）和 TTL
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterator, Optional, Tuple
+
+
+class LRUCache:
+    """进程内 LRU 缓存；ttl 为秒，<= 0 表示不过期"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0]):
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        with self._lock:
+            snapshot = list(self._data.items())
+        for key, (created_at, value) in snapshot:
+            if not self._expired(created_at):
+                yield key, value
+
+
+class SQLiteCache:
+    """SQLite 磁盘缓存，值以 JSON 存储；同一文件可按 namespace 存放多类缓存"""
+
+    def __init__(self, path: Path, namespace: str = "default", max_entries: int = 10000, ttl: float = 0):
+        self.path = Path(path)
+        self.namespace = namespace
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_access ON cache (namespace, accessed_at)"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return row[0]
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                if self._expired(row[1]):
+                    self._conn.execute(
+                        "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+                    )
+                    return None
+                self._conn.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (time.time(), self.namespace, key),
+                )
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, payload, now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.ttl > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+                (self.namespace, time.time() - self.ttl),
+            )
+        self._conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache WHERE namespace = ?"
+            " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries),
+        )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, created_at FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        for key, value, created_at in rows:
+            if not self._expired(created_at):
+                yield key, json.loads(value)
+
+
+def build_cache_backend(kind: str, path: Path, namespace: str, max_entries: int, ttl: float):
+    """按配置选择缓存后端：memory / sqlite；off、空字符串或未知取值返回 None"""
+    kind = (kind or "").lower()
+    if kind == "memory":
+        return LRUCache(max_entries=max_entries, ttl=ttl)
+    if kind == "sqlite":
+        return SQLiteCache(path, namespace=namespace, max_entries=max_entries, ttl=ttl)
+    return None
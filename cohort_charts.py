@@ -0,0 +1,119 @@
+"""
+评估报告与班级看板的 plotly 图表
+- 图表只用汇总后的数据（百分位、各档人数、均值），数据点个数取决于班级数和能力项数，与评估记录条数无关，
+  几十万条记录时页面依然流畅
+- plotly 在第一次画图时才导入
+"""
+
+from typing import Dict, List, Optional
+
+from assessment import LEVELS, SCORE_FIELDS
+from cohort_norms import DIMENSION_LABELS
+
+LABELS = [DIMENSION_LABELS[field] for field in SCORE_FIELDS]
+SCORE_COLORS = ["#d73027", "#fc8d59", "#fee08b", "#91cf60", "#1a9850"]
+LEVEL_COLORS = {"优秀": "#1a9850", "良好": "#fee08b", "需加强关注": "#d73027"}
+
+
+def _layout(fig, title: str, height: int = 380):
+    fig.update_layout(title=title, height=height, margin=dict(l=40, r=40, t=60, b=40), legend_orientation="h")
+    return fig
+
+
+def _closed(values: List) -> List:
+    # 雷达图首尾相连
+    return values + values[:1]
+
+
+def percentile_radar(percentiles: Dict, name: str = "孩子"):
+    """孩子各能力项在同龄人中的百分位，虚线为同龄中位（50）"""
+    import plotly.graph_objects as go
+
+    values = [percentiles["dimensions"].get(field) for field in SCORE_FIELDS]
+    fig = go.Figure()
+    fig.add_trace(go.Scatterpolar(
+        r=_closed([50] * len(LABELS)), theta=_closed(LABELS), name="同龄中位",
+        mode="lines", line=dict(dash="dash", color="#999999"), hoverinfo="skip",
+    ))
+    fig.add_trace(go.Scatterpolar(
+        r=_closed(values), theta=_closed(LABELS), name=name, fill="toself",
+        hovertemplate="%{theta}：超过 %{r:.0f}% 的同龄孩子<extra></extra>",
+    ))
+    fig.update_layout(polar=dict(radialaxis=dict(range=[0, 100], ticksuffix="%")))
+    return _layout(fig, f"同龄百分位（{percentiles['cohort']}，{percentiles['n']} 人）")
+
+
+def mean_radar(dimensions: Dict, reference: Optional[Dict] = None, name: str = "本班", reference_name: str = "全部"):
+    """各能力项均值（1-5）的雷达图；reference 为对照组（如全部孩子）的同格式数据"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    traces = [(reference_name, reference), (name, dimensions)] if reference else [(name, dimensions)]
+    for trace_name, data in traces:
+        values = [(data.get(field) or {}).get("mean") for field in SCORE_FIELDS]
+        fig.add_trace(go.Scatterpolar(
+            r=_closed(values), theta=_closed(LABELS), name=trace_name, fill="toself",
+            hovertemplate="%{theta}：%{r:.2f}<extra>" + trace_name + "</extra>",
+        ))
+    fig.update_layout(polar=dict(radialaxis=dict(range=[1, 5])))
+    return _layout(fig, "各能力项均值")
+
+
+def score_distribution(dimensions: Dict):
+    """各能力项 1-5 分的人数占比（堆叠条形），悬停显示人数"""
+    import plotly.graph_objects as go
+
+    fields = [field for field in SCORE_FIELDS if field in dimensions]
+    labels = [DIMENSION_LABELS[field] for field in fields]
+    fig = go.Figure()
+    for score, color in enumerate(SCORE_COLORS, start=1):
+        counts = [dimensions[field]["counts"][score - 1] for field in fields]
+        shares = [count / dimensions[field]["n"] * 100 if dimensions[field]["n"] else 0
+                  for count, field in zip(counts, fields)]
+        fig.add_trace(go.Bar(
+            y=labels, x=shares, customdata=counts, name=f"{score} 分", orientation="h",
+            marker_color=color, hovertemplate="%{y} " + f"{score} 分" + "：%{customdata} 人（%{x:.0f}%）<extra></extra>",
+        ))
+    fig.update_layout(barmode="stack", xaxis=dict(range=[0, 100], ticksuffix="%"), yaxis=dict(autorange="reversed"))
+    return _layout(fig, "各能力项得分分布", height=420)
+
+
+def level_bar(levels: Dict[str, int]):
+    """各等级人数"""
+    import plotly.graph_objects as go
+
+    counts = [levels.get(level, 0) for level in LEVELS]
+    fig = go.Figure(go.Bar(
+        x=LEVELS, y=counts, marker_color=[LEVEL_COLORS[level] for level in LEVELS],
+        hovertemplate="%{x}：%{y} 人<extra></extra>",
+    ))
+    return _layout(fig, "整体水平分布", height=320)
+
+
+def progress_lines(progress: List[Dict]):
+    """各学期的能力项均值（class_progress 的结果），点图例可隐藏单项"""
+    import plotly.graph_objects as go
+
+    terms = [entry["term"] for entry in progress]
+    fig = go.Figure()
+    for field, label in zip(SCORE_FIELDS, LABELS):
+        fig.add_trace(go.Scatter(
+            x=terms, y=[entry["means"].get(field) for entry in progress], name=label, mode="lines+markers",
+            hovertemplate="%{x} " + label + "：%{y:.2f}<extra></extra>",
+        ))
+    fig.update_layout(xaxis=dict(type="category"), yaxis=dict(range=[1, 5]))
+    return _layout(fig, "各学期能力项均值", height=420)
+
+
+def classes_heatmap(means: Dict[str, Dict[str, float]]):
+    """所有班级 × 能力项的均值热力图（dimension_means 的结果），一个班级一行"""
+    import plotly.graph_objects as go
+
+    classes = list(means)
+    z = [[means[class_id].get(field) for field in SCORE_FIELDS] for class_id in classes]
+    fig = go.Figure(go.Heatmap(
+        z=z, x=LABELS, y=classes, zmin=1, zmax=5, colorscale="RdYlGn",
+        hovertemplate="%{y} %{x}：%{z:.2f}<extra></extra>",
+    ))
+    fig.update_layout(yaxis=dict(autorange="reversed", type="category"))
+    return _layout(fig, "各班级能力项均值", height=min(max(300, 18 * len(classes) + 120), 900))
@@ -0,0 +1,171 @@
+"""
+同龄常模：按年龄段统计每个能力项的 1-5 分人数和总分分布，给出孩子在同龄人中的百分位
+- 分数只有 1-5 五档，总分乘 4 后是 20-100 的整数；分布就是几个计数，百分位由累计人数直接算出，与样本量无关
+- 新的评估到来时只给对应年龄段（和“全部”）的计数加一，累计人数在下次查询时按需重算
+- 计数的持久化在评估记录库（AssessmentStore 的 age_band_stats / age_band_totals 表），进程启动时用 from_store 载入
+"""
+
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from assessment import SCORE_FIELDS, total_score
+
+# 年龄段的左端点（岁）；年龄 a 属于 bisect_right(AGE_BAND_EDGES, a) 对应的段
+AGE_BAND_EDGES = [5.0, 5.5, 6.0, 6.5]
+AGE_BANDS = ["5岁以下", "5-5.5岁", "5.5-6岁", "6-6.5岁", "6.5岁及以上"]
+UNKNOWN_AGE = "年龄未知"
+ALL_AGES = "全部"
+
+# 同龄样本少于该人数时改用全部样本
+MIN_COHORT = 30
+
+# 总分 × 4 的取值范围：语言、数学各 4 项的和 + 4 × 其他三项的和
+MAX_QUARTER = 5 * 8 + 4 * 5 * 3
+
+DIMENSION_LABELS = {
+    "listening": "倾听",
+    "expression": "表达",
+    "reading": "阅读",
+    "writing_interest": "书写兴趣",
+    "counting": "计数",
+    "operation": "运算",
+    "shapes": "图形",
+    "space": "空间",
+    "social": "社交",
+    "self_care": "自理",
+    "motor": "运动",
+}
+
+
+def age_band(age) -> str:
+    """年龄所在的年龄段；缺失或非法取值为 UNKNOWN_AGE"""
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return UNKNOWN_AGE
+    if age != age:  # NaN
+        return UNKNOWN_AGE
+    return AGE_BANDS[bisect.bisect_right(AGE_BAND_EDGES, age)]
+
+
+def total_quarter(total: float) -> int:
+    """总分 × 4，取整后作为总分分布的下标"""
+    return int(round(total * 4))
+
+
+def _percentile(prefix: Sequence[int], value: int) -> Optional[float]:
+    """中位秩百分位：低于该值的人数加上同分人数的一半，占总人数的百分比"""
+    n = prefix[-1]
+    if n <= 0:
+        return None
+    below, upto = prefix[value], prefix[value + 1]
+    return 100.0 * (below + (upto - below) / 2) / n
+
+
+def _prefix(counts: Sequence[int]) -> List[int]:
+    prefix = [0]
+    for count in counts:
+        prefix.append(prefix[-1] + count)
+    return prefix
+
+
+class CohortNorms:
+    """各年龄段的分数分布；同一实例可在多个线程中使用"""
+
+    def __init__(self, min_count: int = MIN_COHORT):
+        self.min_count = min_count
+        self._lock = threading.Lock()
+        # 年龄段 -> 每个能力项 6 个计数（下标为分数，0 不用）
+        self._counts: Dict[str, List[List[int]]] = {}
+        # 年龄段 -> 总分 × 4 的计数（下标 0..MAX_QUARTER）
+        self._totals: Dict[str, List[int]] = {}
+        # 年龄段 -> (各能力项的累计人数, 总分的累计人数)；计数变化时作废
+        self._prefix: Dict[str, Tuple[List[List[int]], List[int]]] = {}
+
+    @classmethod
+    def from_store(cls, store, min_count: int = MIN_COHORT) -> "CohortNorms":
+        """从评估记录库的年龄段汇总表载入"""
+        norms = cls(min_count)
+        dimension_rows, total_rows = store.norm_counts()
+        norms.load(dimension_rows, total_rows)
+        return norms
+
+    def _band(self, band: str) -> Tuple[List[List[int]], List[int]]:
+        if band not in self._counts:
+            self._counts[band] = [[0] * 6 for _ in SCORE_FIELDS]
+            self._totals[band] = [0] * (MAX_QUARTER + 1)
+        return self._counts[band], self._totals[band]
+
+    # ==================== 更新 ====================
+
+    def load(self, dimension_rows: Iterable[Sequence], total_rows: Iterable[Sequence]) -> None:
+        """累加汇总表的行：(年龄段, 能力项, 1-5 分各档人数...) 与 (年龄段, 总分×4, 人数)"""
+        index = {field: i for i, field in enumerate(SCORE_FIELDS)}
+        with self._lock:
+            for band, dimension, *histogram in dimension_rows:
+                if dimension not in index:
+                    continue
+                for target in (band, ALL_AGES):
+                    counts = self._band(target)[0][index[dimension]]
+                    for score, count in enumerate(histogram, start=1):
+                        counts[score] += count
+            for band, quarter, count in total_rows:
+                for target in (band, ALL_AGES):
+                    self._band(target)[1][quarter] += count
+            self._prefix.clear()
+
+    def add(self, scores: Sequence[int], age=None, sign: int = 1) -> None:
+        """计入一次评估（scores 为 profile_scores 的结果）；sign=-1 时扣除"""
+        quarter = total_quarter(total_score(scores))
+        band = age_band(age)
+        with self._lock:
+            for target in (band, ALL_AGES):
+                counts, totals = self._band(target)
+                for dimension, score in zip(counts, scores):
+                    dimension[score] += sign
+                totals[quarter] += sign
+                self._prefix.pop(target, None)
+
+    # ==================== 查询 ====================
+
+    def _prefixes(self, band: str) -> Tuple[List[List[int]], List[int]]:
+        prefix = self._prefix.get(band)
+        if prefix is None:
+            counts, totals = self._band(band)
+            prefix = ([_prefix(dimension[1:]) for dimension in counts], _prefix(totals))
+            self._prefix[band] = prefix
+        return prefix
+
+    def size(self, band: str = ALL_AGES) -> int:
+        with self._lock:
+            return self._prefixes(band)[1][-1] if band in self._totals else 0
+
+    def cohort(self, age=None) -> str:
+        """用于比较的年龄段：该年龄段人数不足 min_count 时为 ALL_AGES"""
+        band = age_band(age)
+        return band if band != UNKNOWN_AGE and self.size(band) >= self.min_count else ALL_AGES
+
+    def percentiles(self, scores: Sequence[int], age=None) -> Dict:
+        """孩子各能力项和总分在同龄人中的百分位（0-100）；没有任何样本时百分位为 None"""
+        band = self.cohort(age)
+        with self._lock:
+            dimension_prefix, total_prefix = self._prefixes(band)
+            dimensions = {
+                field: _percentile(prefix, score - 1)
+                for field, prefix, score in zip(SCORE_FIELDS, dimension_prefix, scores)
+            }
+            total = _percentile(total_prefix, total_quarter(total_score(scores)))
+            n = total_prefix[-1]
+        return {"cohort": band, "n": n, "dimensions": dimensions, "total": total}
+
+    def distribution(self, band: str = ALL_AGES) -> Dict:
+        """某个年龄段各能力项的人数、均值和 1-5 分各档人数（格式同 AssessmentStore.class_stats 的 dimensions）"""
+        with self._lock:
+            counts = [list(dimension[1:]) for dimension in self._band(band)[0]]
+        dimensions = {}
+        for field, histogram in zip(SCORE_FIELDS, counts):
+            n = sum(histogram)
+            mean = sum(score * count for score, count in enumerate(histogram, start=1)) / n if n else None
+            dimensions[field] = {"n": n, "mean": mean, "counts": histogram}
+        return dimensions
@@ -0,0 +1,87 @@
+"""
+检索结果打包：检索与提示词之间的一步
+- 重叠或相邻的分块按原文位置合并回一段连续原文（同一小节超长时切出的相邻分块会拼回完整小节）
+- 位置未知的分块与已选内容高度相似时丢弃
+- 按相关度依次放入，直到用完 token 预算；最后按原文顺序输出
+"""
+
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Sequence, Tuple
+
+from keyword_index import tokenize
+from token_budget import count_tokens, truncate_to_tokens
+
+SEPARATOR = "\n\n"
+NEAR_DUPLICATE = 0.85  # 词元集合 Jaccard 相似度阈值
+MIN_PARTIAL_TOKENS = 48  # 剩余预算不足这么多时不再截断放入半段
+
+
+# 知识库内容固定，同一分块会被反复检索到：切词和计数结果按文本缓存
+@lru_cache(maxsize=2048)
+def _token_set(text: str) -> FrozenSet[str]:
+    return frozenset(tokenize(text))
+
+
+@lru_cache(maxsize=2048)
+def _count(text: str, model: Optional[str]) -> int:
+    return count_tokens(text, model)
+
+
+def _similar(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= NEAR_DUPLICATE
+
+
+def merge_spans(source: str, chunks: Sequence[Tuple[int, str]], max_gap: int = 2) -> List[Tuple[int, int, str]]:
+    """(原文起始位置, 分块文本) 按相关度排列 -> [(相关度名次, 起始位置, 文本)]
+
+    起始位置为 -1 表示不在原文中，原样保留；重叠或间隔不超过 max_gap 个字符（换行等）的分块合并，
+    合并后的名次取其中最靠前的一个
+    """
+    located = sorted(
+        (start, start + len(text), rank)
+        for rank, (start, text) in enumerate(chunks)
+        if start >= 0
+    )
+    merged: List[List[int]] = []
+    for start, end, rank in located:
+        if merged and start <= merged[-1][1] + max_gap:
+            merged[-1][1] = max(merged[-1][1], end)
+            merged[-1][2] = min(merged[-1][2], rank)
+        else:
+            merged.append([start, end, rank])
+    spans = [(rank, start, source[start:end]) for start, end, rank in merged]
+    spans.extend((rank, -1, text) for rank, (start, text) in enumerate(chunks) if start < 0)
+    return sorted(spans)
+
+
+def pack_context(
+    chunks: Sequence[Tuple[int, str]],
+    source: str = "",
+    max_tokens: int = 1500,
+    model: Optional[str] = None,
+) -> str:
+    """把按相关度排列的 (原文起始位置, 分块文本) 打包成不超过 max_tokens 的上下文"""
+    selected: List[Tuple[int, int, str]] = []  # (起始位置, 名次, 文本)
+    selected_tokens: List[FrozenSet[str]] = []
+    remaining = max_tokens
+    for rank, start, text in merge_spans(source, chunks):
+        tokens = _token_set(text)
+        if any(_similar(tokens, other) for other in selected_tokens):
+            continue
+        cost = _count(text, model) + (_count(SEPARATOR, model) if selected else 0)
+        if cost > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                break
+            text = truncate_to_tokens(text, remaining - (cost - _count(text, model)), model)
+            cost = remaining
+        selected.append((start, rank, text))
+        selected_tokens.append(tokens)
+        remaining -= cost
+        if remaining <= 0:
+            break
+
+    # 原文中的段落按原文顺序，位置未知的排在后面
+    selected.sort(key=lambda item: (item[0] < 0, item[0], item[1]))
+    return SEPARATOR.join(text for _, _, text in selected)
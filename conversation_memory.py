@@ -0,0 +1,119 @@
+"""
+按 token 预算管理的多轮对话记忆
+- 最近几轮原文保留，总量不超过 history_tokens
+- 挤出预算的旧对话交给后台线程并入滚动摘要（不超过 summary_tokens），不占用请求路径
+因此无论对话进行多久，注入提示词的历史长度都有上限
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+from token_budget import count_tokens, truncate_to_tokens
+
+Turn = Tuple[str, str]  # (家长提问, 小桥回答)
+Summarizer = Callable[[str, List[Turn]], str]  # (旧摘要, 被挤出的对话) -> 新摘要
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _summary_executor() -> ThreadPoolExecutor:
+    """所有会话共用的摘要线程池"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+    return _executor
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        summarize: Optional[Summarizer] = None,
+        history_tokens: int = 1200,
+        summary_tokens: int = 300,
+        model: Optional[str] = None,
+    ):
+        self.summarize = summarize
+        self.history_tokens = max(1, history_tokens)
+        self.summary_tokens = summary_tokens
+        self.model = model
+        self.context = ""  # 会话固定信息（如孩子档案），每轮都注入
+        self.summary = ""
+        self._turns: Deque[Tuple[str, str, int]] = deque()
+        self._turn_tokens = 0
+        self._pending: List[Turn] = []
+        self._future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return not self._turns and not self.summary and not self._pending
+
+    def add_turn(self, human: str, ai: str) -> None:
+        human_tokens = count_tokens(human, self.model)
+        if human_tokens >= self.history_tokens:
+            human = truncate_to_tokens(human, self.history_tokens // 2, self.model)
+            human_tokens = count_tokens(human, self.model)
+        ai_tokens = count_tokens(ai, self.model)
+        if human_tokens + ai_tokens > self.history_tokens:
+            # 单轮就超出预算时只保留回答开头
+            ai = truncate_to_tokens(ai, self.history_tokens - human_tokens, self.model)
+            ai_tokens = count_tokens(ai, self.model)
+
+        with self._lock:
+            self._turns.append((human, ai, human_tokens + ai_tokens))
+            self._turn_tokens += human_tokens + ai_tokens
+            while self._turn_tokens > self.history_tokens and len(self._turns) > 1:
+                old_human, old_ai, tokens = self._turns.popleft()
+                self._turn_tokens -= tokens
+                self._pending.append((old_human, old_ai))
+            if self._pending and self.summarize is None:
+                self._pending.clear()
+            elif self._pending and self._future is None:
+                self._future = _summary_executor().submit(self._fold_pending)
+
+    def _fold_pending(self) -> None:
+        """后台合并摘要；运行期间新挤出的对话会在同一任务里继续处理"""
+        while True:
+            with self._lock:
+                turns, self._pending = self._pending, []
+                summary = self.summary
+                if not turns:
+                    self._future = None
+                    return
+            try:
+                summary = truncate_to_tokens(self.summarize(summary, turns), self.summary_tokens, self.model)
+            except Exception:
+                continue  # 摘要失败只丢掉这几轮旧对话，不影响后续问答
+            with self._lock:
+                self.summary = summary
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """等待后台摘要完成（脚本和基准测试使用）"""
+        while True:
+            with self._lock:
+                future = self._future
+            if future is None:
+                return
+            future.result(timeout)
+
+    def messages(self) -> List[Tuple[str, str]]:
+        """最近几轮原文，格式为 ChatPromptTemplate 可直接使用的 (角色, 内容)"""
+        with self._lock:
+            turns = list(self._turns)
+        messages: List[Tuple[str, str]] = []
+        for human, ai, _ in turns:
+            messages.append(("human", human))
+            messages.append(("ai", ai))
+        return messages
+
+    def clear(self) -> None:
+        with self._lock:
+            self._turns.clear()
+            self._turn_tokens = 0
+            self._pending.clear()
+            self.summary = ""
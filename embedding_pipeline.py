@@ -0,0 +1,208 @@
+"""
+向量化流水线：分批、限并发、限速、失败重试，并把结果缓存到本地 SQLite
+缓存键为 (模型名, 文本 sha256)，重建索引或多个知识库共用同一分块时不会重复付费
+查询向量按规范化后的文本缓存（内存 LRU + 同一 SQLite 文件），重复或只差空白、大小写的问题不再请求向量接口
+"""
+
+import asyncio
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:  # fallback for older langchain
+    from langchain.embeddings.base import Embeddings
+
+from caching import LRUCache
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """全角转半角、合并空白、转小写，作为查询向量的缓存键"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).lower()
+
+
+class EmbeddingCache:
+    """(model, text_hash) -> float32 向量，存放在 SQLite 文件中"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        # SQLite 默认最多 999 个绑定参数
+        for start in range(0, len(unique), 500):
+            part = unique[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part],
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model: str, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+        rows = [(model, key, array("f", vector).tobytes()) for key, vector in items]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _RateLimiter:
+    """按固定间隔放行请求；max_rps <= 0 表示不限速"""
+
+    def __init__(self, max_rps: float):
+        self.interval = 1.0 / max_rps if max_rps > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CachedEmbeddings(Embeddings):
+    """包装任意 LangChain Embeddings，提供分批并发、限速、退避重试和磁盘缓存"""
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        model: str,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        max_rps: float = 0,
+        query_cache_size: int = 4096,
+    ):
+        self.inner = inner
+        self.model = model
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self._limiter = _RateLimiter(max_rps)
+        self._queries = LRUCache(max_entries=query_cache_size) if query_cache_size > 0 else None
+
+    @property
+    def query_model(self) -> str:
+        # 查询向量与分块向量分开存放，互不覆盖
+        return f"{self.model}#query"
+
+    def _with_retry(self, func, *args):
+        for attempt in range(self.max_retries + 1):
+            self._limiter.wait()
+            try:
+                return func(*args)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                # 指数退避加随机抖动，避免并发请求同时重试
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        vectors: Dict[str, List[float]] = (
+            self.cache.get_many(self.model, hashes) if self.cache is not None else {}
+        )
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            keys = list(missing)
+            batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+
+            def run(batch_keys: List[str]) -> None:
+                embedded = self._with_retry(self.inner.embed_documents, [missing[k] for k in batch_keys])
+                # 统一按 float32 精度返回，首次计算与命中缓存的结果完全一致
+                pairs = [(key, array("f", vector).tolist()) for key, vector in zip(batch_keys, embedded)]
+                # 每批完成即落盘，中途失败时已完成的批次不会白付费
+                if self.cache is not None:
+                    self.cache.put_many(self.model, pairs)
+                vectors.update(pairs)
+
+            if len(batches) == 1 or self.max_concurrency == 1:
+                for batch in batches:
+                    run(batch)
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                    for future in [pool.submit(run, batch) for batch in batches]:
+                        future.result()
+
+        return [vectors[key] for key in hashes]
+
+    def _cached_query(self, key: str) -> Optional[List[float]]:
+        if self._queries is None:
+            return None
+        vector = self._queries.get(key)
+        if vector is None and self.cache is not None:
+            vector = self.cache.get_many(self.query_model, [key]).get(key)
+            if vector is not None:
+                self._queries.set(key, vector)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        if self._queries is None:
+            return self._with_retry(self.inner.embed_query, text)
+        normalized = normalize_query(text)
+        key = text_hash(normalized)
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = array("f", self._with_retry(self.inner.embed_query, normalized)).tolist()
+            self._queries.set(key, vector)
+            if self.cache is not None:
+                self.cache.put_many(self.query_model, [(key, vector)])
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """命中内存缓存时直接返回；否则在线程中查磁盘缓存或请求接口，不阻塞事件循环"""
+        if self._queries is not None:
+            vector = self._queries.get(text_hash(normalize_query(text)))
+            if vector is not None:
+                return vector
+        return await asyncio.to_thread(self.embed_query, text)
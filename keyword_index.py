@@ -0,0 +1,135 @@
+"""
+知识库关键词检索：BM25 倒排索引
+中文按字的二元组切分，英文/数字按单词切分；索引可持久化为 JSON，知识库内容变化时自动重建
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Container, Dict, List, Optional, Tuple
+
+
+INDEX_VERSION = 1
+
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文连续片段切成字二元组（单字片段保留单字），其余按字母数字单词切分"""
+    text = text.lower()
+    tokens: List[str] = []
+    last = 0
+    for match in _CJK_RUN.finditer(text):
+        tokens.extend(_WORD.findall(text[last:match.start()]))
+        run = match.group()
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        last = match.end()
+    tokens.extend(_WORD.findall(text[last:]))
+    return tokens
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """内存中的 BM25 倒排索引：term -> [(chunk_id, 词频), ...]"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.source_hash = ""
+        self.chunks: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+
+    @classmethod
+    def build(cls, chunks: List[str], source_hash: str = "", **params) -> "BM25Index":
+        index = cls(**params)
+        index.source_hash = source_hash
+        index.chunks = list(chunks)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_id, chunk in enumerate(index.chunks):
+            counts = Counter(tokenize(chunk))
+            index.doc_lengths.append(sum(counts.values()))
+            for term, freq in counts.items():
+                postings.setdefault(term, []).append((doc_id, freq))
+        index.postings = postings
+        index._finalize()
+        return index
+
+    def _finalize(self) -> None:
+        n = len(self.chunks)
+        self._avg_length = (sum(self.doc_lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 3, allowed: Optional[Container[int]] = None) -> List[Tuple[float, int]]:
+        """返回得分最高的 k 个 (score, chunk_id)，没有命中时返回空列表；allowed 限定只在这些分块中检索"""
+        if not self.chunks:
+            return []
+        scores: Dict[int, float] = {}
+        k1, b, avg = self.k1, self.b, self._avg_length or 1.0
+        lengths = self.doc_lengths
+        for term, query_freq in Counter(tokenize(query)).items():
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term] * query_freq
+            for doc_id, freq in docs:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = k1 * (1 - b + b * lengths[doc_id] / avg)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (k1 + 1) / (freq + norm)
+        # 并列时按原文顺序，结果稳定
+        return heapq.nlargest(k, ((score, doc_id) for doc_id, score in scores.items()),
+                              key=lambda item: (item[0], -item[1]))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": INDEX_VERSION,
+            "source_hash": self.source_hash,
+            "k1": self.k1,
+            "b": self.b,
+            "chunks": self.chunks,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, source_hash: Optional[str] = None) -> Optional["BM25Index"]:
+        """读取持久化索引；文件缺失、格式不符或 source_hash 不一致时返回 None"""
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != INDEX_VERSION:
+            return None
+        if source_hash is not None and payload.get("source_hash") != source_hash:
+            return None
+        index = cls(k1=payload["k1"], b=payload["b"])
+        index.source_hash = payload["source_hash"]
+        index.chunks = payload["chunks"]
+        index.doc_lengths = payload["doc_lengths"]
+        index.postings = {
+            term: [tuple(posting) for posting in docs]
+            for term, docs in payload["postings"].items()
+        }
+        index._finalize()
+        return index
@@ -2,31 +2,26 @@
 幼小衔接规划 Agent - 基于 LangChain + OpenAI
 """
 
+import json
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_functions_agent
-from langchain.tools import Tool
-from langchain.memory import ConversationBufferMemory
 from pydantic import BaseModel
-from typing import List, Optional
-import json
 
 load_dotenv()
 
-try:
-    from langchain_core.prompts import (
-        ChatPromptTemplate,
-        SystemMessagePromptTemplate,
-        HumanMessagePromptTemplate,
-    )
-except ImportError:  # fallback for older langchain
-    from langchain.prompts import (
-        ChatPromptTemplate,
-        SystemMessagePromptTemplate,
-        HumanMessagePromptTemplate,
-    )
+# ==================== 配置 ====================
+
+class Config:
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+    MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o")
+    AGENT_MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "256"))
+    AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "0").lower() in ("1", "true", "yes")
 
 # ==================== 数据模型 ====================
 
@@ -112,24 +107,82 @@ def answer_question(question: str, profile: Optional[ChildProfile] = None) -> st
     return "这个问题建议咨询专业教育人士或查看当地教育部门官方指南。"
 
 # ==================== 工具注册 ====================
+# 三个工具都是确定性的：按规范化后的输入记忆结果，直接返回序列化好的字符串。
+# 参数由 StructuredTool 按 args_schema 校验成模型，不再手工 json.loads / json.dumps
 
-tools = [
-    Tool(
-        name="assess_level",
-        func=lambda x: json.dumps(assess_child_level(ChildAbility(**json.loads(x)))),
-        description="评估儿童发展水平，输入JSON格式的能力数据"
-    ),
-    Tool(
-        name="generate_plan",
-        func=lambda x: json.dumps(generate_plan(ChildProfile(**json.loads(x))).model_dump(), ensure_ascii=False),
-        description="生成幼小衔接计划，输入儿童档案JSON"
-    ),
-    Tool(
-        name="answer_qa",
-        func=answer_question,
-        description="回答幼小衔接相关问题"
-    )
-]
+class PlanRequest(BaseModel):
+    profile: ChildProfile
+    duration: str = "3个月"
+
+class QuestionRequest(BaseModel):
+    question: str
+
+
+@lru_cache(maxsize=1024)
+def _assess_level_cached(language: int, math: int, social: int, self_care: int, motor: int) -> str:
+    abilities = ChildAbility(language=language, math=math, social=social, self_care=self_care, motor=motor)
+    return json.dumps(assess_child_level(abilities), ensure_ascii=False)
+
+
+@lru_cache(maxsize=1024)
+def _generate_plan_cached(profile_json: str, duration: str) -> str:
+    profile = ChildProfile.model_validate_json(profile_json)
+    return generate_plan(profile, duration).model_dump_json()
+
+
+@lru_cache(maxsize=1024)
+def _answer_question_cached(question: str) -> str:
+    return answer_question(question)
+
+
+def _canonical_profile(profile: ChildProfile) -> str:
+    """列表字段按集合处理，顺序不同的同一档案命中同一条缓存"""
+    data = profile.model_dump()
+    for field in ("interests", "strengths", "areas_for_improvement"):
+        data[field] = sorted(set(data[field]))
+    return json.dumps(data, ensure_ascii=False, sort_keys=True)
+
+
+def _assess_level_tool(language: int, math: int, social: int, self_care: int, motor: int) -> str:
+    return _assess_level_cached(language, math, social, self_care, motor)
+
+
+def _generate_plan_tool(profile: ChildProfile, duration: str = "3个月") -> str:
+    if not isinstance(profile, ChildProfile):
+        profile = ChildProfile.model_validate(profile)
+    return _generate_plan_cached(_canonical_profile(profile), duration)
+
+
+def _answer_qa_tool(question: str) -> str:
+    return _answer_question_cached(question.strip())
+
+
+def build_tools() -> list:
+    try:
+        from langchain_core.tools import StructuredTool
+    except ImportError:  # fallback for older langchain
+        from langchain.tools import StructuredTool
+
+    return [
+        StructuredTool.from_function(
+            func=_assess_level_tool,
+            name="assess_level",
+            description="评估儿童发展水平，参数为语言、数学、社交、自理、运动五项能力评分（1-5）",
+            args_schema=ChildAbility,
+        ),
+        StructuredTool.from_function(
+            func=_generate_plan_tool,
+            name="generate_plan",
+            description="生成幼小衔接计划，参数为儿童档案和计划周期",
+            args_schema=PlanRequest,
+        ),
+        StructuredTool.from_function(
+            func=_answer_qa_tool,
+            name="answer_qa",
+            description="回答幼小衔接相关问题",
+            args_schema=QuestionRequest,
+        ),
+    ]
 
 # ==================== Prompt 模板 ====================
 
@@ -156,33 +209,144 @@ system_prompt = """你是"小桥"——幼小衔接规划专家，专为5-6岁
 - 如果信息不足，先询问必要信息
 - 遇到不确定的问题，建议咨询专业人士"""
 
-human_prompt = """{input}
-
-{agent_scratchpad}"""
+human_prompt = "{input}"
 
 # ==================== Agent 构建 ====================
+# 导入本模块不会创建任何客户端，也不要求 OPENAI_API_KEY；LLM 与 Agent 在第一次使用时构建，
+# 所有会话共用同一个 LLM 客户端（连接池）和同一个 Agent，每个会话只有自己的 AgentExecutor 和对话记忆
+
+def _agent_classes():
+    try:
+        from langchain_classic.agents import AgentExecutor, create_openai_tools_agent
+        from langchain_classic.memory import ConversationBufferMemory
+    except ImportError:  # fallback for older langchain
+        from langchain.agents import AgentExecutor, create_openai_tools_agent
+        from langchain.memory import ConversationBufferMemory
+    return AgentExecutor, create_openai_tools_agent, ConversationBufferMemory
+
+
+def _build_prompt():
+    try:
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    except ImportError:  # fallback for older langchain
+        from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+    return ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        MessagesPlaceholder("chat_history", optional=True),
+        ("human", human_prompt),
+        MessagesPlaceholder("agent_scratchpad"),
+    ])
+
+
+class AgentFactory:
+    """按会话提供 AgentExecutor；会话数超过上限时淘汰最久未使用的会话"""
+
+    def __init__(self, llm=None, max_sessions: int = Config.AGENT_MAX_SESSIONS, verbose: bool = Config.AGENT_VERBOSE):
+        self._llm = llm
+        self._agent = None
+        self._tools = None
+        self.max_sessions = max(1, max_sessions)
+        self.verbose = verbose
+        self._executors: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._build_llm()
+        return self._llm
+
+    @staticmethod
+    def _build_llm():
+        if not Config.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY 未设置")
+
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            model=Config.MODEL_NAME,
+            temperature=0.7,
+            api_key=Config.OPENAI_API_KEY,
+            base_url=Config.OPENAI_BASE_URL.split(",")[0].strip() or None,  # 配置了多个网关时用第一个
+        )
+
+    @property
+    def tools(self) -> list:
+        if self._tools is None:
+            self._tools = build_tools()
+        return self._tools
+
+    @property
+    def agent(self):
+        # tools agent 允许模型一次返回多个工具调用，ainvoke 时 AgentExecutor 会并发执行它们
+        if self._agent is None:
+            _, create_openai_tools_agent, _ = _agent_classes()
+            llm = self.llm
+            with self._lock:
+                if self._agent is None:
+                    self._agent = create_openai_tools_agent(llm, self.tools, _build_prompt())
+        return self._agent
+
+    def executor(self, session_id: str = "default"):
+        with self._lock:
+            executor = self._executors.get(session_id)
+            if executor is not None:
+                self._executors.move_to_end(session_id)
+                return executor
+        AgentExecutor, _, ConversationBufferMemory = _agent_classes()
+        executor = AgentExecutor(
+            agent=self.agent,
+            tools=self.tools,
+            verbose=self.verbose,
+            memory=ConversationBufferMemory(
+                memory_key="chat_history", input_key="input", output_key="output", return_messages=True
+            ),
+        )
+        with self._lock:
+            executor = self._executors.setdefault(session_id, executor)
+            self._executors.move_to_end(session_id)
+            while len(self._executors) > self.max_sessions:
+                self._executors.popitem(last=False)
+        return executor
+
+    def end_session(self, session_id: str) -> None:
+        with self._lock:
+            self._executors.pop(session_id, None)
+
+    def chat(self, message: str, session_id: str = "default") -> str:
+        return self.executor(session_id).invoke({"input": message})["output"]
+
+    async def achat(self, message: str, session_id: str = "default") -> str:
+        result = await self.executor(session_id).ainvoke({"input": message})
+        return result["output"]
+
+
+_default_factory: Optional[AgentFactory] = None
+_default_lock = threading.Lock()
+
+
+def get_factory() -> AgentFactory:
+    """进程内共享的默认工厂"""
+    global _default_factory
+    if _default_factory is None:
+        with _default_lock:
+            if _default_factory is None:
+                _default_factory = AgentFactory()
+    return _default_factory
 
-openai_api_key = os.getenv("OPENAI_API_KEY", "")
-openai_base_url = os.getenv("OPENAI_BASE_URL", "")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY 未设置")
-
-llm = ChatOpenAI(
-    model=os.getenv("OPENAI_MODEL", "gpt-4o"),
-    temperature=0.7,
-    api_key=openai_api_key,
-    base_url=openai_base_url or None,
-)
-
-prompt = ChatPromptTemplate(
-    messages=[
-        SystemMessagePromptTemplate.from_template(system_prompt),
-        HumanMessagePromptTemplate.from_template(human_prompt)
-    ]
-)
 
-agent = create_openai_functions_agent(llm, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, memory=ConversationBufferMemory())
+def __getattr__(name: str):
+    # 兼容旧代码中的 from kindergarten_agent import llm / tools / agent_executor
+    if name == "llm":
+        return get_factory().llm
+    if name == "tools":
+        return get_factory().tools
+    if name == "agent_executor":
+        return get_factory().executor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ==================== 使用示例 ====================
 
@@ -193,7 +357,7 @@ if __name__ == "__main__":
         "孩子语言能力较好，但自理能力一般，有什么建议？"
     ]
     
+    factory = get_factory()
     for q in questions:
         print(f"\n用户: {q}")
-        result = agent_executor.invoke({"input": q})
-        print(f"小桥: {result['output']}")
+        print(f"小桥: {factory.chat(q)}")
@@ -3,33 +3,61 @@
 包含 RAG 知识库检索功能
 """
 
+import asyncio
+import hashlib
 import json
 import os
 import re
+import threading
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
-from langchain_community.document_loaders import TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-try:
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.output_parsers import StrOutputParser
-except ImportError:  # fallback for older langchain
-    from langchain.prompts import ChatPromptTemplate
-    from langchain.schema import StrOutputParser
+import metrics
+from assessment import WEAKNESS_THRESHOLD, calculate_assessment
+from caching import LRUCache, SQLiteCache, build_cache_backend
+from context_packer import pack_context
+from conversation_memory import ConversationMemory, Turn
+from keyword_index import BM25Index, content_hash
+from markdown_chunker import GENERAL, PROFILE_DIMENSIONS, detect_dimensions, load_chunks
+from response_cache import ResponseCache
+from structured_output import IncrementalModelParser
+from tenant_registry import TenantRegistry
 
-try:
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-except ImportError:  # fallback for older langchain
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
+load_dotenv()
 
-from assessment import calculate_assessment
+# ==================== 按需导入 ====================
+# LangChain 各集成包导入较慢：Chroma / 向量模型只在启用向量检索时导入，
+# LLM 客户端只在构建 Agent 时导入，只做评估或关键词检索时都不会加载
+
+def _document_class():
+    try:
+        from langchain_core.documents import Document
+    except ImportError:  # fallback for older langchain
+        from langchain.schema import Document
+    return Document
+
+
+def _chat_prompt_classes():
+    try:
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        from langchain_core.output_parsers import StrOutputParser
+    except ImportError:  # fallback for older langchain
+        from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+        from langchain.schema import StrOutputParser
+    return ChatPromptTemplate, MessagesPlaceholder, StrOutputParser
 
-load_dotenv()
+
+def _base_urls(value: str) -> List[Optional[str]]:
+    """逗号分隔的多个网关地址；未配置时为 [None]，即提供方默认地址"""
+    return [url.strip() for url in value.split(",") if url.strip()] or [None]
+
+
+def _host(base_url: Optional[str]) -> str:
+    return urlsplit(base_url).netloc if base_url else "default"
 
 # ==================== 配置 ====================
 
@@ -41,10 +69,54 @@ class Config:
     OPENAI_USE_EMBEDDINGS = os.getenv("OPENAI_USE_EMBEDDINGS", "1").lower() not in ("0", "false", "no")
     KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", "knowledge_base.md")
     CHROMA_DIR = os.getenv("CHROMA_DIR", ".chroma/kindergarten_transition")
+    KEYWORD_INDEX_PATH = os.getenv(
+        "KEYWORD_INDEX_PATH", str(Path(CHROMA_DIR).parent / "keyword_index.json")
+    )
+    EMBEDDING_CACHE_PATH = os.getenv(
+        "EMBEDDING_CACHE_PATH", str(Path(CHROMA_DIR).parent / "embedding_cache.sqlite3")
+    )
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+    EMBEDDING_MAX_RPS = float(os.getenv("EMBEDDING_MAX_RPS", "0"))
+    CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "500"))
+    CHUNK_CACHE_PATH = os.getenv("CHUNK_CACHE_PATH", str(Path(CHROMA_DIR).parent / "chunks.json"))
+    KNOWLEDGE_BASE_DIR = os.getenv("KNOWLEDGE_BASE_DIR", "")  # 多地区知识库目录：<地区>.md
+    TENANT_DATA_DIR = os.getenv("TENANT_DATA_DIR", str(Path(CHROMA_DIR).parent / "tenants"))
+    KNOWLEDGE_BASE_MEMORY_MB = float(os.getenv("KNOWLEDGE_BASE_MEMORY_MB", "256"))  # 已加载的地区知识库内存上限
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()  # chroma / numpy
+    VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", str(Path(CHROMA_DIR).parent / "vector_index"))
+    VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")  # float32 / float16
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+    RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "1").lower() not in ("0", "false", "no")
+    RESPONSE_CACHE_PATH = os.getenv(
+        "RESPONSE_CACHE_PATH", str(Path(CHROMA_DIR).parent / "response_cache.sqlite3")
+    )
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+    PLAN_CACHE = os.getenv("PLAN_CACHE", "sqlite")  # sqlite / memory / off
+    PLAN_CACHE_PATH = os.getenv(
+        "PLAN_CACHE_PATH", str(Path(CHROMA_DIR).parent / "plan_cache.sqlite3")
+    )
+    PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", str(30 * 24 * 3600)))
+    PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "5000"))
+    PLAN_OUTPUT_METHOD = os.getenv("PLAN_OUTPUT_METHOD", "function_calling")  # function_calling / json_schema / json_mode / off
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+    CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1200"))
+    CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+    CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+    CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", str(2 * 3600)))
     ANTHROPIC_AUTH_TOKEN = os.getenv("ANTHROPIC_AUTH_TOKEN", "")
     ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
     ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "")
     ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "")
+    LLM_HEDGE = os.getenv("LLM_HEDGE", "0").lower() not in ("0", "false", "no")
+    LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "5"))
+    LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_FAILURE_THRESHOLD = int(os.getenv("LLM_FAILURE_THRESHOLD", "3"))
+    LLM_COOLDOWN = float(os.getenv("LLM_COOLDOWN", "30"))
 
 # ==================== 数据模型 ====================
 
@@ -79,103 +151,410 @@ class ChildProfile(BaseModel):
         return (self.math.counting + self.math.operation + 
                 self.math.shapes + self.math.space) / 4
 
+    def weak_dimensions(self) -> List[str]:
+        """得分不高于评估"需加强"阈值的能力维度（language / math / social / self_care / motor）"""
+        scores = {
+            **self.language.model_dump(),
+            **self.math.model_dump(),
+            "social": self.social_level,
+            "self_care": self.self_care_level,
+            "motor": self.motor_level,
+        }
+        return list(dict.fromkeys(
+            PROFILE_DIMENSIONS[field] for field, score in scores.items() if score <= WEAKNESS_THRESHOLD
+        ))
+
+    def compact(self) -> str:
+        """一行式档案，供多轮对话每轮注入"""
+        line = (
+            f"{self.name or '孩子'}，{self.age}岁；"
+            f"语言 倾听{self.language.listening} 表达{self.language.expression} "
+            f"阅读{self.language.reading} 书写兴趣{self.language.writing_interest}；"
+            f"数学 计数{self.math.counting} 运算{self.math.operation} "
+            f"图形{self.math.shapes} 空间{self.math.space}；"
+            f"社交{self.social_level} 自理{self.self_care_level} 运动{self.motor_level}（满分5）"
+        )
+        if self.interests:
+            line += f"；兴趣：{'、'.join(self.interests)}"
+        if self.concerns:
+            line += f"；家长担忧：{'、'.join(self.concerns)}"
+        return line
+
 class AssessmentResult(BaseModel):
     overall_level: str
     strengths: List[str]
     areas_to_improve: List[str]
     recommendations: List[str]
 
+class DailyActivity(BaseModel):
+    time: str = Field(description="时间段，如早晨、放学后、睡前")
+    activity: str = Field(description="具体活动")
+    goal: str = Field(description="培养目标")
+
+class TransitionPlan(BaseModel):
+    """幼小衔接计划；字段说明会随结构定义一起发给模型"""
+    duration: str = Field(description="计划周期")
+    weekly_goals: List[str] = Field(description="每周重点目标，按周排列")
+    daily_activities: List[DailyActivity] = Field(description="每日推荐活动")
+    resources: List[str] = Field(description="推荐资源（绘本、游戏、工具等）")
+    parent_tips: List[str] = Field(description="家长注意事项")
+    evaluation_criteria: List[str] = Field(description="评估标准")
+
 # ==================== RAG 知识库 ====================
 
+TENANT_NAME = re.compile(r"[\w-]{1,64}")  # 地区名：字母、数字、汉字、下划线、连字符
+
+# memory_bytes 的估算系数（字节）：倒排表每条 (分块, 词频)、每个词条、Chroma 每个分块（1536 维 float32 加 HNSW 图）
+POSTING_BYTES = 72
+TERM_BYTES = 120
+CHROMA_ROW_BYTES = 1536 * 4 + 512
+
+
 class KnowledgeBase:
-    def __init__(self):
+    def __init__(
+        self,
+        knowledge_path: Optional[Path] = None,
+        data_dir: Optional[Path] = None,
+        embeddings=None,
+    ):
+        """knowledge_path 默认为 KNOWLEDGE_BASE_PATH；data_dir 指定时各类索引都放在该目录下（多地区各用一个目录），
+        否则沿用 CHROMA_DIR 等全局配置；embeddings 传入时共用同一个向量客户端（及其查询缓存）"""
         self.use_embeddings = bool(
             Config.OPENAI_API_KEY and Config.EMBEDDING_MODEL and Config.OPENAI_USE_EMBEDDINGS
         )
-        self.embeddings = None
+        self.embeddings = embeddings
         self.vectorstore = None
+        self.vector_index = None  # VECTOR_BACKEND=numpy 时为 vector_index.VectorIndex
+        self.chunks: List[Dict] = []  # markdown_chunker 的切分结果：text / offset / section / dimension
+        self.chunks_hash = ""
         self.raw_chunks: List[str] = []
-        self.knowledge_path = Path(Config.KNOWLEDGE_BASE_PATH)
-        self.persist_dir = Path(Config.CHROMA_DIR)
+        self.keyword_index: Optional[BM25Index] = None
+        self.knowledge_path = Path(knowledge_path or Config.KNOWLEDGE_BASE_PATH)
+        if data_dir is None:
+            self.persist_dir = Path(Config.CHROMA_DIR)
+            self.keyword_index_path = Path(Config.KEYWORD_INDEX_PATH)
+            self.vector_index_dir = Path(Config.VECTOR_INDEX_DIR)
+            self.chunk_cache_path = Path(Config.CHUNK_CACHE_PATH)
+        else:
+            data_dir = Path(data_dir)
+            self.persist_dir = data_dir / "chroma"
+            self.keyword_index_path = data_dir / "keyword_index.json"
+            self.vector_index_dir = data_dir / "vector_index"
+            self.chunk_cache_path = data_dir / "chunks.json"
+        self.version = ""
+        self.source_text = ""
+        self._chunk_ids: List[str] = []
+        self._chunk_offsets: Dict[str, int] = {}
         self._init_knowledge_base()
     
     def _init_knowledge_base(self):
         if not self.knowledge_path.exists():
             raise FileNotFoundError(f"知识库文件不存在: {self.knowledge_path}")
 
+        # 知识库内容版本，内容变化后回答缓存自动失效
+        self.source_text = self.knowledge_path.read_text(encoding="utf-8")
+        self.version = content_hash(self.source_text)[:16]
+        self._load_chunks()
+
         if not self.use_embeddings:
-            self.raw_chunks = self._load_raw_chunks()
+            self._init_keyword_index()
             return
 
         try:
-            self.embeddings = OpenAIEmbeddings(
+            if self.embeddings is None:
+                self.embeddings = self._build_embeddings()
+            if Config.VECTOR_BACKEND == "numpy":
+                self._init_vector_index()
+            else:
+                self._init_chroma()
+        except Exception:
+            self.use_embeddings = False
+            self.vectorstore = None
+            self.vector_index = None
+            self._init_keyword_index()
+
+    def _build_embeddings(self):
+        from langchain_openai import OpenAIEmbeddings
+
+        from embedding_pipeline import CachedEmbeddings, EmbeddingCache
+
+        return CachedEmbeddings(
+            OpenAIEmbeddings(
                 model=Config.EMBEDDING_MODEL,
                 api_key=Config.OPENAI_API_KEY,
-                base_url=Config.OPENAI_BASE_URL or None,
-            )
-            self.persist_dir.mkdir(parents=True, exist_ok=True)
+                base_url=_base_urls(Config.OPENAI_BASE_URL)[0],
+                max_retries=0,  # 重试由 CachedEmbeddings 统一处理
+            ),
+            model=Config.EMBEDDING_MODEL,
+            cache=EmbeddingCache(Path(Config.EMBEDDING_CACHE_PATH)),
+            batch_size=Config.EMBEDDING_BATCH_SIZE,
+            max_concurrency=Config.EMBEDDING_CONCURRENCY,
+            max_retries=Config.EMBEDDING_MAX_RETRIES,
+            max_rps=Config.EMBEDDING_MAX_RPS,
+            query_cache_size=Config.QUERY_EMBEDDING_CACHE_SIZE,
+        )
 
-            self.vectorstore = Chroma(
-                collection_name="kindergarten_transition",
-                embedding_function=self.embeddings,
-                persist_directory=str(self.persist_dir),
-            )
+    def _init_chroma(self):
+        from langchain_community.vectorstores import Chroma
 
-            if self._is_empty():
-                docs = self._load_documents()
-                self.vectorstore.add_documents(docs)
-                self.vectorstore.persist()
-        except Exception:
-            self.use_embeddings = False
-            self.vectorstore = None
-            self.raw_chunks = self._load_raw_chunks()
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self.vectorstore = Chroma(
+            collection_name="kindergarten_transition",
+            embedding_function=self.embeddings,
+            persist_directory=str(self.persist_dir),
+        )
+        self._sync_vectorstore()
 
-    def _load_documents(self):
-        loader = TextLoader(str(self.knowledge_path), encoding="utf-8")
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
+    def _init_vector_index(self):
+        """加载内存映射的向量索引；知识库内容、切分参数、向量模型或存储精度变化时重建
+        分块向量走磁盘缓存，重建时只有新增或变化的分块需要请求接口"""
+        from vector_index import VectorIndex
+
+        index = VectorIndex.load(
+            self.vector_index_dir, self.chunks_hash, model=Config.EMBEDDING_MODEL, dtype=Config.VECTOR_DTYPE
         )
-        return text_splitter.split_documents(documents)
-
-    def _load_raw_chunks(self) -> List[str]:
-        loader = TextLoader(str(self.knowledge_path), encoding="utf-8")
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=80,
+        if index is None:
+            index = VectorIndex.build(
+                self.raw_chunks,
+                self.embeddings.embed_documents(self.raw_chunks),
+                dtype=Config.VECTOR_DTYPE,
+                source_hash=self.chunks_hash,
+                model=Config.EMBEDDING_MODEL,
+            )
+            try:
+                index.save(self.vector_index_dir)
+            except OSError:
+                pass  # 只读环境下仍可使用内存中的索引
+        self.vector_index = index
+
+    def _init_keyword_index(self):
+        """加载持久化的 BM25 索引；知识库内容或切分参数变化时重建"""
+        index = BM25Index.load(self.keyword_index_path, self.chunks_hash)
+        if index is None:
+            index = BM25Index.build(self.raw_chunks, source_hash=self.chunks_hash)
+            try:
+                index.save(self.keyword_index_path)
+            except OSError:
+                pass  # 只读环境下仍可使用内存中的索引
+        self.keyword_index = index
+
+    def _load_chunks(self):
+        """按标题结构切分知识库（结果按文件 mtime 和内容哈希缓存）；三种检索后端共用同一份分块，分块序号一致"""
+        chunks, self.chunks_hash = load_chunks(
+            self.knowledge_path, self.chunk_cache_path, max_chars=Config.CHUNK_MAX_CHARS
         )
-        chunks = text_splitter.split_documents(documents)
-        return [doc.page_content for doc in chunks]
+        unique = {}
+        for chunk in chunks:
+            unique.setdefault(chunk["text"], chunk)
+        self.chunks = list(unique.values())
+        self.raw_chunks = [chunk["text"] for chunk in self.chunks]
+        self._chunk_ids = [content_hash(f"{chunk['section']}\n{chunk['text']}") for chunk in self.chunks]
+        # 缓存的位置与刚读入的原文不一致（两次读取之间文件被改）时留给 _chunk_offset 重新查找
+        self._chunk_offsets = {
+            chunk["text"]: chunk["offset"] for chunk in self.chunks
+            if self.source_text.startswith(chunk["text"], chunk["offset"])
+        }
+
+    def _load_documents(self):
+        Document = _document_class()
+        return [
+            Document(
+                page_content=chunk["text"],
+                metadata={
+                    "source": str(self.knowledge_path),
+                    "section": chunk["section"],
+                    "dimension": chunk["dimension"],
+                    "chunk_id": chunk_id,
+                },
+            )
+            for chunk, chunk_id in zip(self.chunks, self._chunk_ids)
+        ]
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.persist_dir.parent / f"{self.persist_dir.name}.manifest.json"
 
-    def _is_empty(self) -> bool:
+    def _read_manifest(self) -> dict:
         try:
-            return self.vectorstore._collection.count() == 0
-        except Exception:
-            return True
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest: dict) -> None:
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(self.manifest_path)
+
+    def _stored_ids(self) -> List[str]:
+        return self.vectorstore.get(include=[])["ids"]
+
+    def _sync_vectorstore(self):
+        """按分块内容哈希增量同步 Chroma：只嵌入新增或变化的分块，删除已移除的分块
+
+        分块 id 为标题路径加内容的 sha256，清单（manifest）记录切分结果哈希、向量模型和分块 id 列表，
+        知识库未变化时启动不需要读取向量库中的 id。
+        """
+        source_hash = self.chunks_hash
+        manifest = self._read_manifest()
+        same_model = manifest.get("embedding_model") == Config.EMBEDDING_MODEL
+        if same_model and manifest.get("source_hash") == source_hash:
+            return
+
+        wanted = dict(zip(self._chunk_ids, self._load_documents()))
+
+        stored = set(self._stored_ids())
+        if not same_model:
+            # 换了向量模型，旧向量不可复用
+            to_delete = list(stored)
+            to_add = list(wanted)
+        else:
+            to_delete = [chunk_id for chunk_id in stored if chunk_id not in wanted]
+            to_add = [chunk_id for chunk_id in wanted if chunk_id not in stored]
+
+        if to_delete:
+            self.vectorstore.delete(ids=to_delete)
+        if to_add:
+            self.vectorstore.add_documents([wanted[chunk_id] for chunk_id in to_add], ids=to_add)
+        if to_delete or to_add:
+            self.vectorstore.persist()
+
+        self._write_manifest({
+            "source_hash": source_hash,
+            "embedding_model": Config.EMBEDDING_MODEL,
+            "chunk_ids": sorted(wanted),
+        })
     
-    def retrieve(self, query: str, k: int = 3) -> str:
+    def _candidates(
+        self, dimensions: Optional[Sequence[str]] = None, sections: Optional[Sequence[str]] = None
+    ) -> Optional[List[int]]:
+        """符合过滤条件的分块序号；不过滤或没有分块符合时返回 None（即检索全部）
+
+        dimensions 为能力维度（language / math / social / ... / general），sections 为标题路径中包含的文字，两者同时给出时取交集。
+        """
+        if not dimensions and not sections:
+            return None
+        wanted = set(dimensions or ())
+        rows = [
+            i for i, chunk in enumerate(self.chunks)
+            if (not wanted or chunk["dimension"] in wanted)
+            and (not sections or any(part in chunk["section"] for part in sections))
+        ]
+        return rows or None
+
+    def retrieve_chunks(
+        self,
+        query: str,
+        k: int = 3,
+        dimensions: Optional[Sequence[str]] = None,
+        sections: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """按相关度排列的原始分块；dimensions / sections 缩小检索范围"""
+        rows = self._candidates(dimensions, sections)
+        if self.use_embeddings and self.vector_index is not None:
+            with metrics.span("embed_query"):
+                vector = self.embeddings.embed_query(query)
+            return self._search_vector_index(vector, k, rows)
+
         if self.use_embeddings and self.vectorstore is not None:
-            docs = self.vectorstore.similarity_search(query, k=k)
-            return "\n".join([doc.page_content for doc in docs])
+            with metrics.span("retrieve", backend="vector"):
+                docs = self.vectorstore.similarity_search(query, k=k, filter=self._chroma_filter(rows))
+            return [doc.page_content for doc in docs]
 
         if not self.raw_chunks:
-            return ""
+            return []
+
+        with metrics.span("retrieve", backend="keyword"):
+            hits = (
+                self.keyword_index.search(query, k=k, allowed=None if rows is None else set(rows))
+                if self.keyword_index else []
+            )
+        if not hits:
+            return [self.raw_chunks[i] for i in (rows or range(len(self.raw_chunks)))[:k]]
+
+        return [self.raw_chunks[doc_id] for _, doc_id in hits]
+
+    def _chroma_filter(self, rows: Optional[List[int]]) -> Optional[dict]:
+        if rows is None:
+            return None
+        return {"chunk_id": {"$in": [self._chunk_ids[i] for i in rows]}}
+
+    def _search_vector_index(self, vector: List[float], k: int, rows: Optional[List[int]] = None) -> List[str]:
+        with metrics.span("retrieve", backend="numpy"):
+            hits = self.vector_index.search(vector, k=k, rows=rows)
+        return [self.vector_index.chunks[doc_id] for _, doc_id in hits]
+
+    def memory_bytes(self) -> int:
+        """常驻内存的粗略估计：原文与分块、关键词倒排表、向量矩阵；多地区按此预算淘汰"""
+        size = len(self.source_text.encode("utf-8")) * 2 + sum(len(chunk.encode("utf-8")) for chunk in self.raw_chunks)
+        if self.keyword_index is not None:
+            postings = sum(len(docs) for docs in self.keyword_index.postings.values())
+            size += postings * POSTING_BYTES + len(self.keyword_index.postings) * TERM_BYTES
+        if self.vector_index is not None:
+            size += self.vector_index.matrix.nbytes
+        if self.vectorstore is not None:
+            size += len(self.chunks) * CHROMA_ROW_BYTES
+        return size
+
+    def close(self):
+        """卸载时释放 Chroma：chromadb 按持久化目录把 System（SQLite 连接、HNSW 索引）缓存在类属性里，
+        不停止它的话知识库对象被回收后这部分内存仍然常驻"""
+        vectorstore, self.vectorstore = self.vectorstore, None
+        if vectorstore is None:
+            return
+        client = vectorstore._client
+        if hasattr(client, "close"):
+            client.close()  # 引用计数归零时停止 System 并移出缓存
+            return
+        # 旧版 chromadb 没有 close：直接按目录取出并停止（每个地区的目录只有这一个客户端）
+        system = type(client)._identifier_to_system.pop(client._identifier, None)
+        if system is not None:
+            system.stop()
 
-        terms = set(re.findall(r"\w+", query.lower()))
-        scored = []
-        for chunk in self.raw_chunks:
-            text = chunk.lower()
-            score = sum(1 for t in terms if t in text)
-            if score > 0:
-                scored.append((score, chunk))
+    def _chunk_offset(self, chunk: str) -> int:
+        # 分块是原文的连续片段，按内容定位起始位置；找不到（如向量库内容早于当前知识库）时为 -1
+        offset = self._chunk_offsets.get(chunk)
+        if offset is None:
+            offset = self.source_text.find(chunk)
+            self._chunk_offsets[chunk] = offset
+        return offset
 
-        if not scored:
-            return "\n".join(self.raw_chunks[:k])
+    def pack(self, chunks: List[str]) -> str:
+        """合并重叠分块、去掉近似重复，按原文顺序拼接并截断到 CONTEXT_MAX_TOKENS"""
+        with metrics.span("pack_context"):
+            return pack_context(
+                [(self._chunk_offset(chunk), chunk) for chunk in chunks],
+                source=self.source_text,
+                max_tokens=Config.CONTEXT_MAX_TOKENS,
+                model=Config.MODEL_NAME,
+            )
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 3,
+        dimensions: Optional[Sequence[str]] = None,
+        sections: Optional[Sequence[str]] = None,
+    ) -> str:
+        return self.pack(self.retrieve_chunks(query, k=k, dimensions=dimensions, sections=sections))
 
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return "\n".join([chunk for _, chunk in scored[:k]])
+    async def aretrieve(
+        self,
+        query: str,
+        k: int = 3,
+        dimensions: Optional[Sequence[str]] = None,
+        sections: Optional[Sequence[str]] = None,
+    ) -> str:
+        """异步检索；关键词检索和本地向量索引在内存中完成，直接同步执行"""
+        if self.use_embeddings and self.vector_index is not None:
+            with metrics.span("embed_query"):
+                vector = await self.embeddings.aembed_query(query)
+            return self.pack(self._search_vector_index(vector, k, self._candidates(dimensions, sections)))
+        if self.use_embeddings and self.vectorstore is not None:
+            rows = self._candidates(dimensions, sections)
+            with metrics.span("retrieve", backend="vector"):
+                docs = await self.vectorstore.asimilarity_search(query, k=k, filter=self._chroma_filter(rows))
+            return self.pack([doc.page_content for doc in docs])
+        return self.retrieve(query, k=k, dimensions=dimensions, sections=sections)
 
 # ==================== Agent 核心 ====================
 
@@ -183,43 +562,189 @@ class KindergartenAgent:
     def __init__(self):
         self.llm = self._build_llm()
         self.knowledge_base = KnowledgeBase()
+        self.knowledge_bases = TenantRegistry(
+            loader=self._load_tenant_knowledge_base,
+            size_of=lambda knowledge_base: knowledge_base.memory_bytes(),
+            max_bytes=int(Config.KNOWLEDGE_BASE_MEMORY_MB * 1024 * 1024),
+            on_evict=lambda knowledge_base: knowledge_base.close(),
+        )
         self.profile: Optional[ChildProfile] = None
+        self.response_cache = self._build_response_cache()
+        self.plan_cache = self._build_plan_cache()
+        self.sessions = LRUCache(max_entries=Config.CHAT_MAX_SESSIONS, ttl=Config.CHAT_SESSION_TTL)
+        self._sessions_lock = threading.Lock()
+        self._chain = None
+        self._plan_llm = None
+
+    # ==================== 多地区知识库 ====================
+
+    def tenants(self) -> List[str]:
+        """KNOWLEDGE_BASE_DIR 下可用的地区（<地区>.md 的文件名）"""
+        if not Config.KNOWLEDGE_BASE_DIR:
+            return []
+        return sorted(
+            path.stem for path in Path(Config.KNOWLEDGE_BASE_DIR).glob("*.md") if TENANT_NAME.fullmatch(path.stem)
+        )
+
+    def _load_tenant_knowledge_base(self, tenant: str) -> KnowledgeBase:
+        if not TENANT_NAME.fullmatch(tenant):
+            raise ValueError(f"地区名不合法: {tenant}")
+        if not Config.KNOWLEDGE_BASE_DIR:
+            raise FileNotFoundError("未配置 KNOWLEDGE_BASE_DIR，无法按地区加载知识库")
+        path = Path(Config.KNOWLEDGE_BASE_DIR) / f"{tenant}.md"
+        if not path.exists():
+            raise FileNotFoundError(f"地区知识库不存在: {path}")
+        # 所有地区共用默认知识库的向量客户端：一个连接池、一份查询向量缓存
+        return KnowledgeBase(path, data_dir=Path(Config.TENANT_DATA_DIR) / tenant, embeddings=self.knowledge_base.embeddings)
+
+    def knowledge_base_for(self, tenant: Optional[str] = None) -> KnowledgeBase:
+        """tenant 为空时用默认知识库；否则首次使用时加载该地区的知识库和索引"""
+        if not tenant:
+            return self.knowledge_base
+        return self.knowledge_bases.get(tenant)
+
+    async def aknowledge_base_for(self, tenant: Optional[str] = None) -> KnowledgeBase:
+        """已加载时直接返回；首次加载（可能要向量化）放到线程中，不阻塞事件循环"""
+        if not tenant:
+            return self.knowledge_base
+        knowledge_base = self.knowledge_bases.peek(tenant)
+        if knowledge_base is None:
+            knowledge_base = await asyncio.to_thread(self.knowledge_bases.get, tenant)
+        return knowledge_base
 
     def _build_llm(self):
-        if not Config.OPENAI_API_KEY:
-            if Config.ANTHROPIC_AUTH_TOKEN or Config.ANTHROPIC_API_KEY:
-                try:
-                    from langchain_anthropic import ChatAnthropic
-                except ImportError as exc:
-                    raise ImportError("缺少依赖：langchain-anthropic") from exc
+        """按配置的网关构建 LLM；配置了多个网关（两个提供方，或一个提供方的多个地址）时用路由在其间切换"""
+        openai_urls = _base_urls(Config.OPENAI_BASE_URL) if Config.OPENAI_API_KEY else []
+        anthropic_urls = []
+        if Config.ANTHROPIC_AUTH_TOKEN or Config.ANTHROPIC_API_KEY:
+            # 同时配置了 OpenAI 时，未设置 ANTHROPIC_MODEL 即视为不启用 Anthropic
+            if Config.ANTHROPIC_MODEL or not openai_urls:
+                anthropic_urls = _base_urls(Config.ANTHROPIC_BASE_URL)
+        routed = len(openai_urls) + len(anthropic_urls) > 1
+        # 有路由时单个网关只做一次快速重试，失败后尽快换下一个网关
+        retries = {"max_retries": 1} if routed else {}
+
+        endpoints = []
+        if openai_urls:
+            from langchain_openai import ChatOpenAI
+
+            for base_url in openai_urls:
+                endpoints.append((f"openai@{_host(base_url)}", ChatOpenAI(
+                    model=Config.MODEL_NAME,
+                    temperature=0.7,
+                    api_key=Config.OPENAI_API_KEY,
+                    base_url=base_url,
+                    stream_usage=True,  # 流式输出最后一块带上 token 用量，供指标统计
+                    callbacks=metrics.llm_callbacks("openai"),
+                    **retries,
+                )))
+
+        if anthropic_urls:
+            try:
+                from langchain_anthropic import ChatAnthropic
+            except ImportError as exc:
+                raise ImportError("缺少依赖：langchain-anthropic") from exc
 
-                model = Config.ANTHROPIC_MODEL
-                if not model:
-                    raise ValueError("ANTHROPIC_MODEL 未设置")
+            model = Config.ANTHROPIC_MODEL
+            if not model:
+                raise ValueError("ANTHROPIC_MODEL 未设置")
 
-                api_key = Config.ANTHROPIC_API_KEY or Config.ANTHROPIC_AUTH_TOKEN
-                default_headers = None
-                if Config.ANTHROPIC_AUTH_TOKEN and not Config.ANTHROPIC_API_KEY:
-                    default_headers = {"Authorization": f"Bearer {Config.ANTHROPIC_AUTH_TOKEN}"}
+            api_key = Config.ANTHROPIC_API_KEY or Config.ANTHROPIC_AUTH_TOKEN
+            default_headers = None
+            if Config.ANTHROPIC_AUTH_TOKEN and not Config.ANTHROPIC_API_KEY:
+                default_headers = {"Authorization": f"Bearer {Config.ANTHROPIC_AUTH_TOKEN}"}
 
-                return ChatAnthropic(
+            for base_url in anthropic_urls:
+                endpoints.append((f"anthropic@{_host(base_url)}", ChatAnthropic(
                     model=model,
                     temperature=0.7,
                     max_tokens=1024,
                     api_key=api_key,
-                    base_url=Config.ANTHROPIC_BASE_URL or None,
+                    base_url=base_url,
                     default_headers=default_headers,
-                )
+                    callbacks=metrics.llm_callbacks("anthropic"),
+                    **retries,
+                )))
 
+        if not endpoints:
             raise ValueError("未检测到可用的 LLM Key（OPENAI_API_KEY/ANTHROPIC_AUTH_TOKEN）")
+        if not routed:
+            return endpoints[0][1]
+
+        from llm_router import Endpoint, LLMRouter
 
-        return ChatOpenAI(
-            model=Config.MODEL_NAME,
-            temperature=0.7,
-            api_key=Config.OPENAI_API_KEY,
-            base_url=Config.OPENAI_BASE_URL or None,
+        return LLMRouter(
+            endpoints=[
+                Endpoint(name, llm, failure_threshold=Config.LLM_FAILURE_THRESHOLD, cooldown=Config.LLM_COOLDOWN)
+                for name, llm in endpoints
+            ],
+            hedge=Config.LLM_HEDGE,
+            hedge_delay=Config.LLM_HEDGE_DELAY,
+            hedge_min_delay=Config.LLM_HEDGE_MIN_DELAY,
+            hedge_percentile=Config.LLM_HEDGE_PERCENTILE,
         )
     
+    def _build_response_cache(self) -> Optional[ResponseCache]:
+        if not Config.RESPONSE_CACHE:
+            return None
+        try:
+            store = SQLiteCache(
+                Path(Config.RESPONSE_CACHE_PATH),
+                namespace="chat",
+                max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+                ttl=Config.RESPONSE_CACHE_TTL,
+            )
+        except Exception:
+            store = None  # 磁盘不可写时退化为纯内存缓存
+        return ResponseCache(
+            store=store,
+            embeddings=self.knowledge_base.embeddings,
+            similarity_threshold=Config.RESPONSE_CACHE_SIMILARITY,
+            max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=Config.RESPONSE_CACHE_TTL,
+        )
+
+    def _build_plan_cache(self):
+        try:
+            return build_cache_backend(
+                Config.PLAN_CACHE,
+                Path(Config.PLAN_CACHE_PATH),
+                namespace="plan",
+                max_entries=Config.PLAN_CACHE_MAX_ENTRIES,
+                ttl=Config.PLAN_CACHE_TTL,
+            )
+        except Exception:
+            # 磁盘不可写时退化为内存缓存
+            return LRUCache(max_entries=Config.PLAN_CACHE_MAX_ENTRIES, ttl=Config.PLAN_CACHE_TTL)
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", "") or ""
+
+    @property
+    def cache_version(self) -> str:
+        """回答缓存版本：知识库内容 + 模型，任一变化都不会命中旧回答"""
+        return self._cache_version(self.knowledge_base)
+
+    def _cache_version(self, knowledge_base: KnowledgeBase) -> str:
+        # 各地区知识库内容不同，版本不同，回答缓存天然互不串用
+        return f"{knowledge_base.version}:{self.model_name}"
+
+    def _plan_cache_key(self, profile: ChildProfile, duration: str) -> str:
+        return f"{self.model_name}:{self.plan_signature(profile, duration)}"
+
+    def _cached_plan(self, key: str, force_refresh: bool) -> Optional[dict]:
+        if self.plan_cache is None or force_refresh:
+            return None
+        plan = self.plan_cache.get(key)
+        metrics.cache_event("plan", "miss" if plan is None else "hit")
+        return plan
+
+    def _store_plan(self, key: str, plan: dict) -> None:
+        # 解析失败的原始文本、修复后仍缺字段的计划都不缓存，下次仍会重新生成
+        if self.plan_cache is not None and isinstance(plan, dict) and set(TransitionPlan.model_fields) <= set(plan):
+            self.plan_cache.set(key, plan)
+
     def _build_system_prompt(self) -> str:
         return """你是"小桥"——幼小衔接规划专家，专为5-6岁儿童家庭和教育工作者服务。
 
@@ -263,11 +788,30 @@ class KindergartenAgent:
         result = calculate_assessment(profile_dict)
         return AssessmentResult(**result)
     
-    def generate_plan(self, profile: ChildProfile, duration: str = "3个月") -> dict:
-        """生成个性化计划"""
+    def plan_signature(self, profile: ChildProfile, duration: str = "3个月") -> str:
+        """计划提示词输入的规范化哈希：不含姓名，兴趣与担忧按集合处理
+
+        两个孩子签名相同即会得到等价的提示词，可以共用同一份计划。
+        """
+        fields = profile.model_dump(exclude={"name"})
+        fields["interests"] = sorted(set(profile.interests))
+        fields["concerns"] = sorted(set(profile.concerns))
+        payload = {
+            "profile": fields,
+            "duration": duration,
+            "assessment": self.assess_child(profile).model_dump(),
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _build_plan_prompt(self, profile: ChildProfile, duration: str) -> str:
+        with metrics.span("prompt", kind="plan"):
+            return self._plan_prompt_text(profile, duration)
+
+    def _plan_prompt_text(self, profile: ChildProfile, duration: str) -> str:
         assessment = self.assess_child(profile)
         
-        prompt = f"""请为以下孩子生成一个{duration}的幼小衔接计划：
+        return f"""请为以下孩子生成一个{duration}的幼小衔接计划：
 
 孩子信息：
 - 年龄：{profile.age}岁
@@ -300,9 +844,13 @@ class KindergartenAgent:
   "evaluation_criteria": ["..."]
 }}
 """
-        response = self.llm.invoke(prompt)
-        raw_content = response.content
-        if isinstance(raw_content, dict):
+
+    @staticmethod
+    def _content_text(raw_content, separator: str = "\n") -> Optional[str]:
+        """把 LLM 返回的 content 转成文本；兼容 content blocks，无法识别时返回 None"""
+        if isinstance(raw_content, (bytes, bytearray)):
+            return raw_content.decode("utf-8", errors="replace")
+        if isinstance(raw_content, str):
             return raw_content
         if isinstance(raw_content, list):
             # 兼容 content blocks：优先取 type=text 的段落
@@ -314,38 +862,426 @@ class KindergartenAgent:
                 elif isinstance(item, str):
                     text_chunks.append(item)
             if text_chunks:
-                raw_content = "\n".join(text_chunks)
-            else:
-                return {"raw": str(raw_content)}
-        if not isinstance(raw_content, (str, bytes, bytearray)):
-            return {"raw": str(raw_content)}
+                return separator.join(text_chunks)
+        return None
 
-        try:
-            return json.loads(raw_content)
-        except json.JSONDecodeError:
-            # 尝试提取JSON片段
-            match = re.search(r"(\{.*\}|\[.*\])", raw_content, re.S)
-            if match:
+    # ---------- 计划结构化输出 ----------
+
+    def _structured_plan_llm(self):
+        """用提供方的工具调用 / JSON 模式约束计划结构；关闭或模型不支持时返回 None"""
+        if self._plan_llm is None:
+            method = Config.PLAN_OUTPUT_METHOD.lower()
+            self._plan_llm = False
+            if method not in ("", "off", "0", "none"):
                 try:
-                    return json.loads(match.group(1))
-                except json.JSONDecodeError:
+                    if method == "function_calling":
+                        # 结构定义只转换一次；with_structured_output 每次调用都会重新生成一遍 schema 供追踪使用
+                        from langchain_core.utils.function_calling import convert_to_openai_tool
+
+                        tool = convert_to_openai_tool(TransitionPlan)
+                        self._plan_llm = self.llm.bind_tools([tool], tool_choice=tool["function"]["name"])
+                    else:
+                        self._plan_llm = self.llm.with_structured_output(
+                            TransitionPlan, method=method, include_raw=True
+                        )
+                except (NotImplementedError, ValueError, TypeError):
                     pass
-            return {"raw": raw_content}
+        return self._plan_llm or None
+
+    def _read_plan_text(self, raw_content, fields: Optional[List[str]] = None) -> IncrementalModelParser:
+        parser = IncrementalModelParser(TransitionPlan, fields)
+        if isinstance(raw_content, dict):
+            parser.feed_object(raw_content)
+            return parser
+        text = self._content_text(raw_content)
+        parser.feed(text if text is not None else str(raw_content))
+        parser.finish()
+        return parser
+
+    def _read_structured_plan(self, output) -> IncrementalModelParser:
+        if not isinstance(output, dict):
+            output = {"raw": output, "parsed": None}  # bind_tools 直接返回消息
+        if output.get("parsed") is not None:
+            parser = IncrementalModelParser(TransitionPlan)
+            parser.feed_object(output["parsed"])
+            return parser
+        # 整体校验失败：取出原始输出逐字段校验，合格的字段保留
+        raw = output.get("raw")
+        tool_calls = getattr(raw, "tool_calls", None)
+        if tool_calls:
+            return self._read_plan_text(tool_calls[0].get("args") or {})
+        return self._read_plan_text(getattr(raw, "content", ""))
+
+    def _needs_repair(self, parser: IncrementalModelParser) -> bool:
+        # 完全没有解析出内容时修复无从谈起，按原始文本返回
+        return bool(parser.valid and parser.broken_fields)
+
+    def _build_repair_prompt(self, plan_prompt: str, parser: IncrementalModelParser) -> str:
+        broken = parser.broken_fields
+        problems = "\n".join(f"- {name}：{parser.errors.get(name, '缺失')}" for name in broken)
+        schema = TransitionPlan.model_json_schema()
+        schema["properties"] = {name: schema["properties"][name] for name in broken}
+        schema["required"] = broken
+        return f"""{plan_prompt}
+
+上面的要求已经生成过一次，其中以下字段缺失或格式不正确：
+{problems}
+
+已生成的其他字段（供参考，不要重复输出）：
+{json.dumps(parser.result(), ensure_ascii=False)}
+
+请严格只返回一个 JSON 对象，只包含上述字段，符合以下 JSON Schema：
+{json.dumps(schema, ensure_ascii=False)}
+"""
+
+    def _plan_result(self, parser: IncrementalModelParser) -> dict:
+        plan = parser.result()
+        return plan if plan else {"raw": parser.text}
+
+    def _request_plan(self, prompt: str) -> IncrementalModelParser:
+        structured = self._structured_plan_llm()
+        if structured is not None:
+            try:
+                with metrics.span("llm", kind="plan"):
+                    output = structured.invoke(prompt)
+                with metrics.span("parse_plan"):
+                    return self._read_structured_plan(output)
+            except Exception:
+                pass  # 网关不支持工具调用 / JSON 模式时退回普通文本输出
+        with metrics.span("llm", kind="plan"):
+            content = self.llm.invoke(prompt).content
+        with metrics.span("parse_plan"):
+            return self._read_plan_text(content)
+
+    async def _arequest_plan(self, prompt: str) -> IncrementalModelParser:
+        structured = self._structured_plan_llm()
+        if structured is not None:
+            try:
+                with metrics.span("llm", kind="plan"):
+                    output = await structured.ainvoke(prompt)
+                with metrics.span("parse_plan"):
+                    return self._read_structured_plan(output)
+            except Exception:
+                pass  # 网关不支持工具调用 / JSON 模式时退回普通文本输出
+        with metrics.span("llm", kind="plan"):
+            content = (await self.llm.ainvoke(prompt)).content
+        with metrics.span("parse_plan"):
+            return self._read_plan_text(content)
+
+    def _repair_plan(self, prompt: str, parser: IncrementalModelParser) -> None:
+        """只让模型重写不合格的字段，合并回原计划"""
+        with metrics.span("llm", kind="repair"):
+            response = self.llm.invoke(self._build_repair_prompt(prompt, parser))
+        with metrics.span("parse_plan"):
+            parser.merge(self._read_plan_text(response.content, parser.broken_fields))
+
+    async def _arepair_plan(self, prompt: str, parser: IncrementalModelParser) -> None:
+        with metrics.span("llm", kind="repair"):
+            response = await self.llm.ainvoke(self._build_repair_prompt(prompt, parser))
+        with metrics.span("parse_plan"):
+            parser.merge(self._read_plan_text(response.content, parser.broken_fields))
+
+    def generate_plan(
+        self, profile: ChildProfile, duration: str = "3个月", force_refresh: bool = False
+    ) -> dict:
+        """生成个性化计划；相同输入命中计划缓存，force_refresh=True 时强制重新生成"""
+        key = self._plan_cache_key(profile, duration)
+        cached = self._cached_plan(key, force_refresh)
+        if cached is not None:
+            return cached
+        prompt = self._build_plan_prompt(profile, duration)
+        parser = self._request_plan(prompt)
+        if self._needs_repair(parser):
+            self._repair_plan(prompt, parser)
+        plan = self._plan_result(parser)
+        self._store_plan(key, plan)
+        return plan
+
+    async def agenerate_plan(
+        self, profile: ChildProfile, duration: str = "3个月", force_refresh: bool = False
+    ) -> dict:
+        """异步生成个性化计划"""
+        key = self._plan_cache_key(profile, duration)
+        cached = await asyncio.to_thread(self._cached_plan, key, force_refresh)
+        if cached is not None:
+            return cached
+        prompt = self._build_plan_prompt(profile, duration)
+        parser = await self._arequest_plan(prompt)
+        if self._needs_repair(parser):
+            await self._arepair_plan(prompt, parser)
+        plan = self._plan_result(parser)
+        await asyncio.to_thread(self._store_plan, key, plan)
+        return plan
+
+    def generate_plan_stream(
+        self, profile: ChildProfile, duration: str = "3个月", force_refresh: bool = False
+    ) -> Iterator[dict]:
+        """流式生成计划：每解析出新内容就产出一次当前的部分计划，最后一次为校验（必要时修复）后的完整结果
+
+        每个字段写完即校验；流结束后只对缺失或不合格的字段发起一次修复请求。
+        """
+        key = self._plan_cache_key(profile, duration)
+        cached = self._cached_plan(key, force_refresh)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt = self._build_plan_prompt(profile, duration)
+        parser = IncrementalModelParser(TransitionPlan)
+        # 流式时模型输出与逐字段解析交替进行，整体计入 llm 阶段
+        with metrics.span("llm", kind="plan_stream"):
+            for chunk in self.llm.stream(prompt):
+                piece = self._content_text(chunk.content, separator="")
+                if piece:
+                    partial = parser.feed(piece)
+                    if partial is not None:
+                        yield partial
+        with metrics.span("parse_plan"):
+            parser.finish()
+        if self._needs_repair(parser):
+            self._repair_plan(prompt, parser)
+        final = self._plan_result(parser)
+        self._store_plan(key, final)
+        if final != parser.partial:
+            yield final
     
-    def chat(self, message: str) -> str:
-        """对话问答"""
+    # ---------- 多轮对话 ----------
+
+    def session(self, session_id: str) -> ConversationMemory:
+        """取出（不存在则创建）会话记忆；每次访问都会顺延会话有效期"""
+        with self._sessions_lock:
+            memory = self.sessions.get(session_id)
+            if memory is None:
+                memory = ConversationMemory(
+                    summarize=self._summarize_turns,
+                    history_tokens=Config.CHAT_HISTORY_TOKENS,
+                    summary_tokens=Config.CHAT_SUMMARY_TOKENS,
+                    model=self.model_name or None,
+                )
+            self.sessions.set(session_id, memory)
+        return memory
+
+    def end_session(self, session_id: str) -> None:
+        self.sessions.delete(session_id)
+
+    def _open_session(
+        self, session_id: Optional[str], profile: Optional[ChildProfile]
+    ) -> Optional[ConversationMemory]:
+        if session_id is None:
+            return None
+        memory = self.session(session_id)
+        if profile is not None:
+            assessment = self.assess_child(profile)
+            memory.context = (
+                f"{profile.compact()}\n评估：{assessment.overall_level}；"
+                f"优势：{'、'.join(assessment.strengths) or '无'}；"
+                f"需加强：{'、'.join(assessment.areas_to_improve) or '无'}"
+            )
+        return memory
+
+    @staticmethod
+    def _cacheable(memory: Optional[ConversationMemory]) -> bool:
+        """回答缓存只用于没有上下文的提问：有对话历史或孩子档案时回答因人而异"""
+        return memory is None or (memory.is_empty() and not memory.context)
+
+    def _summarize_turns(self, summary: str, turns: List[Turn]) -> str:
+        """在后台线程中调用：把挤出预算的旧对话并入摘要"""
+        dialogue = "\n".join(f"家长：{human}\n小桥：{ai}" for human, ai in turns)
+        prompt = f"""请更新家长与幼小衔接顾问“小桥”的对话摘要。
+保留孩子的情况、家长关心的问题和已经给出的主要建议，省略寒暄；用中文，不超过{Config.CHAT_SUMMARY_TOKENS}字，只输出摘要。
+
+已有摘要：
+{summary or "（无）"}
+
+新增对话：
+{dialogue}"""
+        with metrics.span("llm", kind="summary"):
+            response = self.llm.invoke(prompt)
+        return (self._content_text(response.content) or "").strip()
+
+    def _chat_chain(self):
+        # 提示词的变化部分都通过变量传入，链只需构建一次
+        if self._chain is None:
+            ChatPromptTemplate, MessagesPlaceholder, StrOutputParser = _chat_prompt_classes()
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", "{system}"),
+                MessagesPlaceholder("history", optional=True),
+                ("human", "{input}"),
+            ])
+            self._chain = prompt | self.llm | StrOutputParser()
+        return self._chain
+
+    @staticmethod
+    def _retrieval_dimensions(message: str, profile: Optional[ChildProfile]) -> Optional[List[str]]:
+        """检索范围：问题里提到的能力维度优先，否则取孩子的薄弱项；家长问答、资源推荐等通用内容始终在范围内"""
+        dimensions = detect_dimensions(message) or (profile.weak_dimensions() if profile is not None else [])
+        return dimensions + [GENERAL] if dimensions else None
+
+    def _chat_inputs(
+        self,
+        message: str,
+        memory: Optional[ConversationMemory],
+        relevant_knowledge: Optional[str] = None,
+        dimensions: Optional[List[str]] = None,
+        knowledge_base: Optional[KnowledgeBase] = None,
+    ) -> dict:
         # 检索知识库
-        relevant_knowledge = self.knowledge_base.retrieve(message)
-        
-        # 构建提示
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self._build_system_prompt().format(knowledge_base=relevant_knowledge)),
-            ("human", "{input}")
-        ])
-        
+        if relevant_knowledge is None:
+            relevant_knowledge = (knowledge_base or self.knowledge_base).retrieve(message, dimensions=dimensions)
+
+        with metrics.span("prompt", kind="chat"):
+            system = self._build_system_prompt().format(knowledge_base=relevant_knowledge)
+            inputs = {"system": system, "input": message}
+            if memory is None:
+                return inputs
+            if memory.context:
+                system += f"\n\n## 孩子档案\n{memory.context}"
+            if memory.summary:
+                system += f"\n\n## 之前的对话摘要\n{memory.summary}"
+            inputs["system"] = system
+            inputs["history"] = memory.messages()
+            return inputs
+
+    def _cached_answer(self, message: str, version: str) -> Optional[str]:
+        answer = self.response_cache.get(message, version)
+        metrics.cache_event("response", "miss" if answer is None else "hit")
+        return answer
+
+    async def _acached_answer(self, message: str, version: str) -> Optional[str]:
+        # 内存层命中直接返回；读 SQLite、语义命中要请求向量接口，都放到线程池里，不阻塞事件循环
+        answer = self.response_cache.get_memory(message, version)
+        if answer is not None:
+            metrics.cache_event("response", "hit")
+            return answer
+        return await asyncio.to_thread(self._cached_answer, message, version)
+
+    def chat(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        profile: Optional[ChildProfile] = None,
+        tenant: Optional[str] = None,
+    ) -> str:
+        """对话问答；传入 session_id 时记住本会话的对话，传入 profile 时按孩子档案回答，传入 tenant 时用该地区的知识库"""
+        knowledge_base = self.knowledge_base_for(tenant)
+        version = self._cache_version(knowledge_base)
+        memory = self._open_session(session_id, profile)
+        use_cache = self.response_cache is not None and self._cacheable(memory)
+        answer = self._cached_answer(message, version) if use_cache else None
+
         # 生成回答
-        chain = prompt | self.llm | StrOutputParser()
-        return chain.invoke({"input": message})
+        if answer is None:
+            inputs = self._chat_inputs(
+                message, memory,
+                dimensions=self._retrieval_dimensions(message, profile),
+                knowledge_base=knowledge_base,
+            )
+            with metrics.span("llm", kind="chat"):
+                answer = self._chat_chain().invoke(inputs)
+            if use_cache and answer:
+                self.response_cache.put(message, version, answer)
+        if memory is not None and answer:
+            memory.add_turn(message, answer)
+        return answer
+
+    async def achat(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        profile: Optional[ChildProfile] = None,
+        tenant: Optional[str] = None,
+    ) -> str:
+        """异步对话问答：检索与缓存查询并发进行，命中缓存时取消检索"""
+        knowledge_base = await self.aknowledge_base_for(tenant)
+        version = self._cache_version(knowledge_base)
+        memory = self._open_session(session_id, profile)
+        use_cache = self.response_cache is not None and self._cacheable(memory)
+        retrieval = asyncio.ensure_future(
+            knowledge_base.aretrieve(message, dimensions=self._retrieval_dimensions(message, profile))
+        )
+        cached = await self._acached_answer(message, version) if use_cache else None
+
+        if cached is not None:
+            retrieval.cancel()
+            answer = cached
+        else:
+            relevant_knowledge = await retrieval
+            inputs = self._chat_inputs(message, memory, relevant_knowledge)
+            with metrics.span("llm", kind="chat"):
+                answer = await self._chat_chain().ainvoke(inputs)
+            if use_cache and answer:
+                # 写磁盘、语义向量化都放到线程池，不阻塞其他请求
+                await asyncio.to_thread(self.response_cache.put, message, version, answer)
+        if memory is not None and answer:
+            memory.add_turn(message, answer)
+        return answer
+
+    def chat_stream(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        profile: Optional[ChildProfile] = None,
+        tenant: Optional[str] = None,
+    ) -> Iterator[str]:
+        """流式对话问答，逐段产出回答文本；完整结束后才写入回答缓存和会话记忆"""
+        knowledge_base = self.knowledge_base_for(tenant)
+        version = self._cache_version(knowledge_base)
+        memory = self._open_session(session_id, profile)
+        use_cache = self.response_cache is not None and self._cacheable(memory)
+        cached = self._cached_answer(message, version) if use_cache else None
+        if cached is not None:
+            yield cached
+            answer = cached
+        else:
+            parts = []
+            inputs = self._chat_inputs(
+                message, memory,
+                dimensions=self._retrieval_dimensions(message, profile),
+                knowledge_base=knowledge_base,
+            )
+            with metrics.span("llm", kind="chat_stream"):
+                for piece in self._chat_chain().stream(inputs):
+                    if piece:
+                        parts.append(piece)
+                        yield piece
+            answer = "".join(parts)
+            if use_cache and answer:
+                self.response_cache.put(message, version, answer)
+        if memory is not None and answer:
+            memory.add_turn(message, answer)
+
+    async def achat_stream(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        profile: Optional[ChildProfile] = None,
+        tenant: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """异步流式对话问答；调用方中途停止读取时不写入回答缓存和会话记忆"""
+        knowledge_base = await self.aknowledge_base_for(tenant)
+        version = self._cache_version(knowledge_base)
+        memory = self._open_session(session_id, profile)
+        use_cache = self.response_cache is not None and self._cacheable(memory)
+        cached = await self._acached_answer(message, version) if use_cache else None
+        if cached is not None:
+            yield cached
+            answer = cached
+        else:
+            relevant_knowledge = await knowledge_base.aretrieve(
+                message, dimensions=self._retrieval_dimensions(message, profile)
+            )
+            inputs = self._chat_inputs(message, memory, relevant_knowledge)
+            parts = []
+            with metrics.span("llm", kind="chat_stream"):
+                async for piece in self._chat_chain().astream(inputs):
+                    if piece:
+                        parts.append(piece)
+                        yield piece
+            answer = "".join(parts)
+            if use_cache and answer:
+                await asyncio.to_thread(self.response_cache.put, message, version, answer)
+        if memory is not None and answer:
+            memory.add_turn(message, answer)
 
 # ==================== 主程序 ====================
 
@@ -0,0 +1,476 @@
+"""
+多提供方 LLM 路由：同时持有多个网关（OpenAI / Anthropic，每个提供方可配多个地址）
+- 每个网关记录最近的调用耗时和成功 / 失败，按健康度排序：错误率高、耗时长的排在后面
+- 连续失败达到阈值的网关暂时摘除，冷却后放一个请求试探，成功即恢复
+- 调用失败时按顺序换下一个网关重试（流式调用只在产出第一段之前切换）
+- 可选对冲请求：第一个网关超过其近期 p95 耗时仍未返回时，向次优网关再发一次，谁先返回用谁
+对外是一个普通的 LangChain 聊天模型，提示词链、流式输出、bind_tools / with_structured_output 用法不变
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ConfigDict, Field
+
+try:
+    from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import BaseMessage
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+    from langchain_core.runnables import Runnable
+except ImportError:  # fallback for older langchain
+    from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+    from langchain.chat_models.base import BaseChatModel
+    from langchain.schema import BaseMessage, ChatGeneration, ChatResult
+    from langchain.schema.output import ChatGenerationChunk
+    from langchain.schema.runnable import Runnable
+
+import metrics
+from metrics import percentile
+
+WINDOW = 100  # 每个网关保留最近多少次调用用于统计
+MIN_SAMPLES = 20  # 样本少于这么多时对冲等待时间用默认值
+# 排序得分 = 典型耗时 × (1 + ERROR_PENALTY × 错误率)（秒）
+# 只失败过、没有耗时样本的网关按各网关中最慢的典型耗时计，保证排在健康网关之后
+ERROR_PENALTY = 4.0
+
+_TOOLS_KEY = "router_tools"  # bind_tools 绑定的参数，调用时再交给各网关自己的 bind_tools 转换
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    # 同步对冲请求需要在线程里等待超时；线程池进程内共享
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+    return _pool
+
+
+class Endpoint:
+    """一个网关：聊天模型 + 最近的调用统计"""
+
+    def __init__(self, name: str, model: Any, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        # 带工具的调用（结构化计划）和普通文本调用耗时差别很大，分开统计
+        self.latencies: Dict[str, Deque[float]] = {"text": deque(maxlen=WINDOW), "tools": deque(maxlen=WINDOW)}
+        self.first_chunk: Deque[float] = deque(maxlen=WINDOW)  # 流式调用的首段耗时
+        self.outcomes: Deque[bool] = deque(maxlen=WINDOW)
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # 摘除到这个时间点
+        self._probe_until = 0.0  # 试探请求发出后，这段时间内不再放行第二个
+        self._bound: List[Tuple[Any, Any]] = []  # (工具 / 结构化输出参数, 绑定后的模型)
+        self._lock = threading.Lock()
+
+    # ---------- 健康度 ----------
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def typical_latency(self, kind: str = "text") -> Optional[float]:
+        samples = self.latencies[kind] or self.latencies["text"] or self.first_chunk
+        return percentile(sorted(samples), 50) if samples else None
+
+    def hedge_delay(self, kind: str, default: float, floor: float, q: float) -> float:
+        samples = self.latencies[kind]
+        if len(samples) < MIN_SAMPLES:
+            return default
+        return max(floor, percentile(sorted(samples), q))
+
+    def available(self, now: float) -> bool:
+        """是否会被放行；只查看，不占用试探名额"""
+        with self._lock:
+            return self.consecutive_failures < self.failure_threshold or (
+                now >= self.open_until and now >= self._probe_until
+            )
+
+    def acquire(self, now: float) -> bool:
+        """未被摘除时放行；冷却结束后每个冷却周期只放行一个试探请求"""
+        with self._lock:
+            if self.consecutive_failures < self.failure_threshold:
+                return True
+            if now < self.open_until or now < self._probe_until:
+                return False
+            self._probe_until = now + self.cooldown
+            return True
+
+    def record_success(self, kind: str, latency: Optional[float] = None, first_chunk: Optional[float] = None) -> None:
+        with self._lock:
+            if latency is not None:
+                self.latencies[kind].append(latency)
+            if first_chunk is not None:
+                self.first_chunk.append(first_chunk)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+
+    def record_latency(self, kind: str, latency: float) -> None:
+        """被取消的请求：至少耗时这么久，记为一个样本，避免慢网关因为总被取消而一直没有耗时数据"""
+        with self._lock:
+            self.latencies[kind].append(latency)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown
+
+    def snapshot(self) -> Dict[str, Any]:
+        latency = self.typical_latency()
+        return {
+            "endpoint": self.name,
+            "calls": len(self.outcomes),
+            "error_rate": round(self.error_rate, 3),
+            "p50_ms": round(latency * 1000, 1) if latency is not None else None,
+            "open": time.monotonic() < self.open_until,
+        }
+
+    # ---------- 调用 ----------
+
+    def runnable(self, tools: Optional[Tuple[list, dict]]):
+        if tools is None:
+            return self.model
+        return self._bind(tools, lambda: self.model.bind_tools(tools[0], **tools[1]))
+
+    def structured(self, spec: Tuple[Any, dict]):
+        return self._bind(spec, lambda: self.model.with_structured_output(spec[0], **spec[1]))
+
+    def _bind(self, spec: Tuple[Any, dict], build):
+        # 同一份参数在每个网关上只转换一次
+        with self._lock:
+            for known, bound in self._bound:
+                if known is spec:
+                    return bound
+            bound = build()
+            self._bound.append((spec, bound))
+            return bound
+
+
+class RoutedStructuredOutput(Runnable):
+    """LLMRouter.with_structured_output 的返回值：按健康度选网关，用该网关自己的 with_structured_output 调用
+
+    method（function_calling / json_schema / json_mode）、include_raw 等参数原样交给各网关，
+    输出格式由提供方自己的实现决定；不支持对冲和流式，失败时按顺序换下一个网关重试。
+    """
+
+    def __init__(self, router: "LLMRouter", schema: Any, kwargs: dict):
+        self.router = router
+        self.spec = (schema, kwargs)
+
+    def invoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        router = self.router
+        candidates = router.ranked("tools")
+        last_error: Optional[Exception] = None
+        while (endpoint := router._take(candidates)) is not None:
+            start = time.perf_counter()
+            try:
+                output = endpoint.structured(self.spec).invoke(input, config, **kwargs)
+            except Exception as exc:
+                endpoint.record_failure()
+                metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="error")
+                last_error = exc
+                continue
+            endpoint.record_success("tools", time.perf_counter() - start)
+            metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="ok")
+            return output
+        raise router._exhausted(last_error)
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        router = self.router
+        candidates = router.ranked("tools")
+        last_error: Optional[Exception] = None
+        while (endpoint := router._take(candidates)) is not None:
+            start = time.perf_counter()
+            try:
+                output = await endpoint.structured(self.spec).ainvoke(input, config, **kwargs)
+            except Exception as exc:
+                endpoint.record_failure()
+                metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="error")
+                last_error = exc
+                continue
+            endpoint.record_success("tools", time.perf_counter() - start)
+            metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="ok")
+            return output
+        raise router._exhausted(last_error)
+
+
+class LLMRouter(BaseChatModel):
+    """按健康度在多个网关间路由的聊天模型"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    endpoints: List[Any] = Field(default_factory=list)
+    hedge: bool = False
+    hedge_delay: float = 5.0  # 样本不足时的对冲等待秒数
+    hedge_min_delay: float = 0.5
+    hedge_percentile: float = 95.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "llm_router"
+
+    @property
+    def model_name(self) -> str:
+        # 缓存键等按主网关的模型名区分
+        primary = self.endpoints[0].model
+        return getattr(primary, "model_name", None) or getattr(primary, "model", "") or ""
+
+    def bind_tools(self, tools, **kwargs):
+        # 工具格式各提供方不同，原样记下，调用时由选中的网关各自转换
+        return self.bind(**{_TOOLS_KEY: (list(tools), kwargs)})
+
+    def with_structured_output(self, schema, **kwargs):
+        # 基类的实现只会走 bind_tools，丢掉 method；改为记下参数，调用时由选中的网关各自实现
+        return RoutedStructuredOutput(self, schema, kwargs)
+
+    def health(self) -> List[Dict[str, Any]]:
+        return [endpoint.snapshot() for endpoint in self.endpoints]
+
+    def ranked(self, kind: str = "text") -> List[Endpoint]:
+        """可用网关按得分排序；全部被摘除时仍按得分返回全部，总比直接报错好
+
+        这里只查看是否可用，半开网关的试探名额在 _take 真正调用时才占用。
+        """
+        now = time.monotonic()
+        latencies = {endpoint.name: endpoint.typical_latency(kind) for endpoint in self.endpoints}
+        worst = max((latency for latency in latencies.values() if latency is not None), default=0.0)
+
+        def score(item: Tuple[int, Endpoint]) -> Tuple[float, float, int]:
+            order, endpoint = item
+            latency = latencies[endpoint.name]
+            error_rate = endpoint.error_rate
+            if latency is None:
+                # 从未调用过的网关按 0 计，先试一次拿到数据；只失败过的按最慢的网关计
+                latency = worst if endpoint.outcomes else 0.0
+            # 各网关都没有耗时样本时，错误率低的在前
+            return latency * (1 + ERROR_PENALTY * error_rate), error_rate, order
+
+        ordered = [endpoint for _, endpoint in sorted(enumerate(self.endpoints), key=score)]
+        usable = [endpoint for endpoint in ordered if endpoint.available(now)]
+        return usable or ordered
+
+    def _take(self, candidates: List[Endpoint]) -> Optional[Endpoint]:
+        """从 candidates 中取出下一个要调用的网关并占用放行名额
+
+        半开网关的试探名额已被并发请求占用时跳过它；全部网关都被摘除时照常返回（见 ranked）。
+        """
+        now = time.monotonic()
+        while candidates:
+            endpoint = candidates.pop(0)
+            if endpoint.acquire(now) or not any(other.available(now) for other in self.endpoints):
+                return endpoint
+        return None
+
+    @staticmethod
+    def _exhausted(error: Optional[Exception]) -> Exception:
+        return error or RuntimeError("没有可用的 LLM 网关")
+
+    @staticmethod
+    def _kind(kwargs: dict) -> str:
+        return "tools" if _TOOLS_KEY in kwargs else "text"
+
+    @staticmethod
+    def _result(message: BaseMessage) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _call(self, endpoint: Endpoint, messages, stop, config, kwargs) -> BaseMessage:
+        kind = self._kind(kwargs)
+        tools = kwargs.pop(_TOOLS_KEY, None)
+        start = time.perf_counter()
+        try:
+            message = endpoint.runnable(tools).invoke(messages, config, stop=stop, **kwargs)
+        except Exception:
+            endpoint.record_failure()
+            metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="error")
+            raise
+        endpoint.record_success(kind, time.perf_counter() - start)
+        metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="ok")
+        return message
+
+    async def _acall(self, endpoint: Endpoint, messages, stop, config, kwargs) -> BaseMessage:
+        kind = self._kind(kwargs)
+        tools = kwargs.pop(_TOOLS_KEY, None)
+        start = time.perf_counter()
+        try:
+            message = await endpoint.runnable(tools).ainvoke(messages, config, stop=stop, **kwargs)
+        except Exception:
+            endpoint.record_failure()
+            metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="error")
+            raise
+        endpoint.record_success(kind, time.perf_counter() - start)
+        metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="ok")
+        return message
+
+    def _deadline(self, endpoint: Endpoint, kind: str) -> float:
+        return endpoint.hedge_delay(kind, self.hedge_delay, self.hedge_min_delay, self.hedge_percentile)
+
+    # ---------- 同步 ----------
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        config = None  # 各网关模型带着自己的回调（按提供方统计指标）
+        candidates = self.ranked(self._kind(kwargs))
+        last_error: Optional[Exception] = None
+        while (endpoint := self._take(candidates)) is not None:
+            try:
+                if self.hedge and candidates:
+                    return self._result(self._hedged(endpoint, candidates, messages, stop, config, kwargs))
+                return self._result(self._call(endpoint, messages, stop, config, dict(kwargs)))
+            except Exception as exc:
+                last_error = exc
+        raise self._exhausted(last_error)
+
+    def _hedged(self, primary: Endpoint, candidates: List[Endpoint], messages, stop, config, kwargs) -> BaseMessage:
+        """主网关超过 p95 仍未返回时向次优网关再发一次；用到的次优网关从 candidates 中移除"""
+        pool = _executor()
+        futures = {pool.submit(self._call, primary, messages, stop, config, dict(kwargs)): primary}
+        done, _ = wait(futures, timeout=self._deadline(primary, self._kind(kwargs)))
+        backup = self._take(candidates) if not done else None
+        if backup is not None:
+            metrics.inc("kg_llm_hedge_total", endpoint=backup.name, result="fired")
+            futures[pool.submit(self._call, backup, messages, stop, config, dict(kwargs))] = backup
+        pending = set(futures)
+        error: Optional[Exception] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # 落后的请求无法中断，结果丢弃
+                    if len(futures) > 1:
+                        metrics.inc("kg_llm_hedge_total", endpoint=futures[future].name, result="won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        config = None  # 各网关模型带着自己的回调（按提供方统计指标）
+        kind = self._kind(kwargs)
+        tools = kwargs.pop(_TOOLS_KEY, None)
+        last_error: Optional[Exception] = None
+        candidates = self.ranked(kind)
+        while (endpoint := self._take(candidates)) is not None:
+            start = time.perf_counter()
+            first_chunk = None
+            try:
+                for chunk in endpoint.runnable(tools).stream(messages, config, stop=stop, **kwargs):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    if run_manager and isinstance(chunk.content, str):
+                        run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as exc:
+                endpoint.record_failure()
+                metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="error")
+                if first_chunk is not None:
+                    raise  # 已经产出内容，不能再换网关从头生成
+                last_error = exc
+                continue
+            endpoint.record_success(kind, first_chunk=first_chunk)
+            metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="ok")
+            return
+        raise self._exhausted(last_error)
+
+    # ---------- 异步 ----------
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        config = None  # 各网关模型带着自己的回调（按提供方统计指标）
+        candidates = self.ranked(self._kind(kwargs))
+        last_error: Optional[Exception] = None
+        while (endpoint := self._take(candidates)) is not None:
+            try:
+                if self.hedge and candidates:
+                    return self._result(await self._ahedged(endpoint, candidates, messages, stop, config, kwargs))
+                return self._result(await self._acall(endpoint, messages, stop, config, dict(kwargs)))
+            except Exception as exc:
+                last_error = exc
+        raise self._exhausted(last_error)
+
+    async def _ahedged(
+        self, primary: Endpoint, candidates: List[Endpoint], messages, stop, config, kwargs
+    ) -> BaseMessage:
+        kind = self._kind(kwargs)
+        start = time.perf_counter()
+        tasks = {asyncio.ensure_future(self._acall(primary, messages, stop, config, dict(kwargs))): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self._deadline(primary, kind))
+        backup = self._take(candidates) if not done else None
+        if backup is not None:
+            metrics.inc("kg_llm_hedge_total", endpoint=backup.name, result="fired")
+            tasks[asyncio.ensure_future(self._acall(backup, messages, stop, config, dict(kwargs)))] = backup
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            metrics.inc("kg_llm_hedge_total", endpoint=tasks[task].name, result="won")
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()  # 落后的请求直接取消，释放连接
+                tasks[task].record_latency(kind, time.perf_counter() - start)
+        raise error
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        config = None  # 各网关模型带着自己的回调（按提供方统计指标）
+        kind = self._kind(kwargs)
+        tools = kwargs.pop(_TOOLS_KEY, None)
+        last_error: Optional[Exception] = None
+        candidates = self.ranked(kind)
+        while (endpoint := self._take(candidates)) is not None:
+            start = time.perf_counter()
+            first_chunk = None
+            try:
+                async for chunk in endpoint.runnable(tools).astream(messages, config, stop=stop, **kwargs):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    if run_manager and isinstance(chunk.content, str):
+                        await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as exc:
+                endpoint.record_failure()
+                metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="error")
+                if first_chunk is not None:
+                    raise
+                last_error = exc
+                continue
+            endpoint.record_success(kind, first_chunk=first_chunk)
+            metrics.inc("kg_llm_route_total", endpoint=endpoint.name, result="ok")
+            return
+        raise self._exhausted(last_error)
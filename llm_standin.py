@@ -0,0 +1,607 @@
+"""
+本地 LLM / 向量服务替身：兼容 OpenAI（/v1/chat/completions、/v1/embeddings，含流式）和 Anthropic（/v1/messages）
+把 OPENAI_BASE_URL 指向 http://127.0.0.1:端口/v1、ANTHROPIC_BASE_URL 指向 http://127.0.0.1:端口 即可离线运行
+
+三种模式：
+- synthetic：向量由文本哈希确定，对话返回固定回答（默认）
+- record：请求转发到真实服务，响应写入录制文件（cassette，JSONL），同时返回给客户端
+- replay：按请求内容从录制文件中取响应，同一请求多次出现时按录制顺序依次返回
+
+延迟、生成速度、错误率可配置，随机数带种子，同样的配置得到同样的结果。
+
+用法：
+    python llm_standin.py --profile realistic
+    python llm_standin.py --mode record --cassette cassettes/chat.jsonl --upstream-openai https://api.openai.com/v1
+    python llm_standin.py --mode replay --cassette cassettes/chat.jsonl --latency lognormal:0.8,0.4 --tokens-per-second 60
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from token_budget import count_tokens
+
+DEFAULT_REPLY = "这是本地替身服务返回的示例回答。"
+
+# 预设的延迟画像：首包延迟分布、每秒生成 token 数、错误率
+PROFILES: Dict[str, Dict] = {
+    "instant": {"latency": "fixed:0", "tokens_per_second": 0, "error_rate": 0.0},
+    "fast": {"latency": "fixed:0.05", "tokens_per_second": 0, "error_rate": 0.0},
+    "realistic": {"latency": "lognormal:0.6,0.35", "tokens_per_second": 60, "error_rate": 0.0},
+    "slow": {"latency": "lognormal:2.0,0.5", "tokens_per_second": 20, "error_rate": 0.0},
+    "flaky": {"latency": "lognormal:0.6,0.35", "tokens_per_second": 60, "error_rate": 0.05},
+}
+
+# 参与录制键计算时忽略的字段：不影响回答内容
+_IGNORED_KEYS = {"stream", "stream_options", "user", "metadata"}
+
+_STREAM_PIECE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]|[^\s\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]+\s*|\s+")
+
+
+def fake_vector(text: str, dim: int) -> List[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(dim)]
+
+
+def request_key(endpoint: str, body: dict) -> str:
+    canonical = {k: v for k, v in body.items() if k not in _IGNORED_KEYS}
+    raw = json.dumps({"endpoint": endpoint, "body": canonical}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LatencyModel:
+    """延迟分布：fixed:秒 / uniform:最小,最大 / normal:均值,标准差 / lognormal:中位数,sigma"""
+
+    def __init__(self, spec: Union[str, float], rng: random.Random):
+        if isinstance(spec, (int, float)):
+            spec = f"fixed:{spec}"
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()] or [0.0]
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"未知的延迟分布：{spec}")
+        self._rng = rng
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = self._rng.uniform(p[0], p[1] if len(p) > 1 else p[0])
+        elif self.kind == "normal":
+            value = self._rng.gauss(p[0], p[1] if len(p) > 1 else 0.0)
+        else:
+            value = p[0] * self._rng.lognormvariate(0.0, p[1] if len(p) > 1 else 0.0) if p[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+class Cassette:
+    """录制文件：每行 {key, endpoint, request, response}"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: Dict[str, List[dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._entries.setdefault(record["key"], []).append(record["response"])
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self._entries.values())
+
+    def next(self, key: str) -> Optional[dict]:
+        with self._lock:
+            responses = self._entries.get(key)
+            if not responses:
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return responses[index % len(responses)]
+
+    def append(self, key: str, endpoint: str, request: dict, response: dict) -> None:
+        record = {"key": key, "endpoint": endpoint, "request": request, "response": response}
+        with self._lock:
+            self._entries.setdefault(key, []).append(response)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class _UpstreamError(Exception):
+    def __init__(self, status: int, body: bytes):
+        super().__init__(status)
+        self.status = status
+        self.body = body
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # 压测时上百个并发连接
+
+
+class StandInServer:
+    def __init__(
+        self,
+        mode: str = "synthetic",
+        cassette: Optional[Path] = None,
+        on_miss: str = "error",
+        latency: Union[str, float] = 0.05,
+        per_item_latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        error_codes: Tuple[int, ...] = (429, 500, 503),
+        seed: int = 0,
+        dim: int = 64,
+        reply: str = DEFAULT_REPLY,
+        upstream_openai: str = "https://api.openai.com/v1",
+        upstream_anthropic: str = "https://api.anthropic.com",
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        if mode not in ("synthetic", "record", "replay"):
+            raise ValueError(f"未知模式：{mode}")
+        if mode != "synthetic" and cassette is None:
+            raise ValueError(f"{mode} 模式需要指定录制文件")
+        self.mode = mode
+        self.cassette = Cassette(cassette) if cassette is not None else None
+        self.on_miss = on_miss
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.latency = LatencyModel(latency, self._rng)
+        self.per_item_latency = per_item_latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.dim = dim
+        self.reply = reply
+        self.upstream_openai = upstream_openai.rstrip("/")
+        self.upstream_anthropic = upstream_anthropic.rstrip("/")
+        self.requests = 0
+        self.items = 0
+        self.errors = 0
+        self.replay_misses = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    # ---------- 生命周期 ----------
+
+    @property
+    def root_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """OPENAI_BASE_URL 使用的地址"""
+        return f"{self.root_url}/v1"
+
+    @property
+    def anthropic_base_url(self) -> str:
+        """ANTHROPIC_BASE_URL 使用的地址（Anthropic 客户端自己拼 /v1/messages）"""
+        return self.root_url
+
+    def start(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.requests = self.items = self.errors = self.replay_misses = self.max_in_flight = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "items": self.items,
+                "errors": self.errors,
+                "replay_misses": self.replay_misses,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+            }
+
+    # ---------- 随机量 ----------
+
+    def _sample_latency(self) -> float:
+        with self._rng_lock:
+            return self.latency.sample()
+
+    def _sample_error(self) -> Optional[int]:
+        if self.error_rate <= 0 or not self.error_codes:
+            return None
+        with self._rng_lock:
+            if self._rng.random() >= self.error_rate:
+                return None
+            return self._rng.choice(self.error_codes)
+
+    def _token_delay(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    # ---------- 响应生成 ----------
+
+    @staticmethod
+    def _prompt_tokens(body: dict) -> int:
+        """按消息文本估算输入 token 数，供调用方统计用量"""
+        texts = [body["system"]] if isinstance(body.get("system"), str) else []
+        for message in body.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, list):
+                texts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+            elif isinstance(content, str):
+                texts.append(content)
+        return sum(count_tokens(text) for text in texts)
+
+    def _synthetic(self, endpoint: str, body: dict) -> dict:
+        model = body.get("model", "")
+        if endpoint == "embeddings":
+            inputs = body.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            return {
+                "object": "list",
+                "model": model,
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_vector(str(text), self.dim)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        completion_tokens = count_tokens(self.reply)
+        prompt_tokens = self._prompt_tokens(body)
+        if endpoint == "messages":
+            return {
+                "id": "msg_standin",
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "text", "text": self.reply}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+            }
+        return {
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _forward(self, endpoint: str, path: str, body: dict, headers) -> dict:
+        """录制模式：转发到真实服务；流式请求也按非流式转发，回放时再按 token 速率切片"""
+        base = self.upstream_anthropic if endpoint == "messages" else self.upstream_openai
+        url = base + (path if endpoint == "messages" else path[len("/v1"):])
+        forward_headers = {"Content-Type": "application/json"}
+        for name in ("Authorization", "x-api-key", "anthropic-version", "anthropic-beta", "OpenAI-Organization"):
+            if headers.get(name):
+                forward_headers[name] = headers[name]
+        payload = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        request = urllib.request.Request(
+            url, data=json.dumps(payload).encode("utf-8"), headers=forward_headers, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as exc:
+            raise _UpstreamError(exc.code, exc.read()) from exc
+
+    def respond(self, endpoint: str, path: str, body: dict, headers) -> Optional[dict]:
+        """返回完整（非流式）响应；回放未命中且 on_miss=error 时返回 None"""
+        if self.mode == "synthetic":
+            return self._synthetic(endpoint, body)
+        key = request_key(endpoint, body)
+        if self.mode == "replay":
+            response = self.cassette.next(key)
+            if response is None:
+                with self._lock:
+                    self.replay_misses += 1
+                return self._synthetic(endpoint, body) if self.on_miss == "synthetic" else None
+            return response
+        response = self._forward(endpoint, path, body, headers)
+        self.cassette.append(key, endpoint, body, response)
+        return response
+
+    # ---------- HTTP ----------
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: dict, status: int = 200, extra_headers: Optional[dict] = None) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self._send_bytes(body, status, extra_headers)
+
+            def _send_bytes(self, body: bytes, status: int, extra_headers: Optional[dict] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (extra_headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self, endpoint: str, status: int, message: str) -> None:
+                if endpoint == "messages":
+                    kind = {429: "rate_limit_error", 529: "overloaded_error"}.get(status, "api_error")
+                    payload = {"type": "error", "error": {"type": kind, "message": message}}
+                else:
+                    payload = {"error": {"message": message, "type": "standin_error", "code": status}}
+                self._send_json(payload, status, {"Retry-After": "1"} if status == 429 else None)
+
+            def do_GET(self):
+                if self.path in ("/health", "/v1/health"):
+                    self._send_json({"status": "ok", "mode": server.mode})
+                elif self.path in ("/stats", "/v1/stats"):
+                    self._send_json(server.stats())
+                elif self.path == "/v1/models":
+                    self._send_json({"object": "list", "data": [{"id": "standin", "object": "model"}]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.split("?", 1)[0]
+                if path.endswith("/embeddings"):
+                    endpoint = "embeddings"
+                elif path.endswith("/chat/completions"):
+                    endpoint = "chat"
+                elif path.endswith("/messages"):
+                    endpoint = "messages"
+                else:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    self._serve(endpoint, path, body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _serve(self, endpoint: str, path: str, body: dict) -> None:
+                if endpoint == "embeddings":
+                    inputs = body.get("input", [])
+                    count = 1 if isinstance(inputs, str) else len(inputs)
+                else:
+                    count = 1
+                with server._lock:
+                    server.items += count
+
+                time.sleep(server._sample_latency() + server.per_item_latency * count)
+                status = server._sample_error()
+                if status is not None:
+                    with server._lock:
+                        server.errors += 1
+                    self._send_error(endpoint, status, "替身服务注入的错误")
+                    return
+
+                try:
+                    response = server.respond(endpoint, path, body, self.headers)
+                except _UpstreamError as exc:
+                    self._send_bytes(exc.body, exc.status)
+                    return
+                if response is None:
+                    self._send_error(endpoint, 404, "录制文件中没有这个请求")
+                    return
+
+                if not body.get("stream") or endpoint == "embeddings":
+                    if endpoint != "embeddings":
+                        time.sleep(server._token_delay(_completion_tokens(endpoint, response)))
+                    self._send_json(response)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                events = _anthropic_events(response) if endpoint == "messages" else _openai_chunks(response)
+                for event, tokens in events:
+                    self.wfile.write(event.encode("utf-8"))
+                    self.wfile.flush()
+                    if tokens:
+                        time.sleep(server._token_delay(tokens))
+
+        return Handler
+
+
+# ==================== 流式切片 ====================
+
+def _pieces(text: str) -> List[str]:
+    return _STREAM_PIECE.findall(text or "")
+
+
+def _completion_tokens(endpoint: str, response: dict) -> int:
+    if endpoint == "messages":
+        text = "".join(block.get("text", "") for block in response.get("content", []) if isinstance(block, dict))
+    else:
+        message = (response.get("choices") or [{}])[0].get("message") or {}
+        text = message.get("content") or ""
+        text += "".join(json.dumps(call) for call in message.get("tool_calls") or [])
+    return count_tokens(text)
+
+
+def _sse(payload: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _openai_chunks(response: dict) -> Iterator[Tuple[str, int]]:
+    """把完整的 chat.completion 切成 chat.completion.chunk 事件，产出 (事件文本, 本段 token 数)"""
+    base = {
+        "id": response.get("id", "chatcmpl-standin"),
+        "object": "chat.completion.chunk",
+        "created": response.get("created", int(time.time())),
+        "model": response.get("model", ""),
+    }
+    choice = (response.get("choices") or [{}])[0]
+    message = choice.get("message") or {}
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        return _sse({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]})
+
+    yield chunk({"role": "assistant", "content": ""}), 0
+    for piece in _pieces(message.get("content") or ""):
+        yield chunk({"content": piece}), 1
+    for index, call in enumerate(message.get("tool_calls") or []):
+        function = call.get("function", {})
+        arguments = function.get("arguments", "")
+        yield chunk({"tool_calls": [{
+            "index": index,
+            "id": call.get("id"),
+            "type": "function",
+            "function": {"name": function.get("name"), "arguments": arguments},
+        }]}), count_tokens(arguments)
+    yield chunk({}, choice.get("finish_reason") or "stop"), 0
+    if response.get("usage"):
+        yield _sse({**base, "choices": [], "usage": response["usage"]}), 0
+    yield "data: [DONE]\n\n", 0
+
+
+def _anthropic_events(response: dict) -> Iterator[Tuple[str, int]]:
+    """把完整的 Anthropic message 切成 messages 流式事件"""
+    usage = response.get("usage") or {}
+    start = {**response, "content": [], "stop_reason": None, "stop_sequence": None,
+             "usage": {"input_tokens": usage.get("input_tokens", 0), "output_tokens": 0}}
+    yield _sse({"type": "message_start", "message": start}, "message_start"), 0
+    for index, block in enumerate(response.get("content") or []):
+        if block.get("type") == "tool_use":
+            yield _sse({"type": "content_block_start", "index": index,
+                        "content_block": {**block, "input": {}}}, "content_block_start"), 0
+            partial = json.dumps(block.get("input", {}), ensure_ascii=False)
+            yield _sse({"type": "content_block_delta", "index": index,
+                        "delta": {"type": "input_json_delta", "partial_json": partial}},
+                       "content_block_delta"), count_tokens(partial)
+        else:
+            yield _sse({"type": "content_block_start", "index": index,
+                        "content_block": {"type": "text", "text": ""}}, "content_block_start"), 0
+            for piece in _pieces(block.get("text", "")):
+                yield _sse({"type": "content_block_delta", "index": index,
+                            "delta": {"type": "text_delta", "text": piece}}, "content_block_delta"), 1
+        yield _sse({"type": "content_block_stop", "index": index}, "content_block_stop"), 0
+    yield _sse({"type": "message_delta",
+                "delta": {"stop_reason": response.get("stop_reason", "end_turn"), "stop_sequence": None},
+                "usage": {"output_tokens": usage.get("output_tokens", 0)}}, "message_delta"), 0
+    yield _sse({"type": "message_stop"}, "message_stop"), 0
+
+
+# ==================== 命令行 / 子进程 ====================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="本地 OpenAI / Anthropic 兼容替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 表示随机端口")
+    parser.add_argument("--mode", choices=["synthetic", "record", "replay"], default="synthetic")
+    parser.add_argument("--cassette", type=Path, help="录制文件（JSONL）")
+    parser.add_argument("--on-miss", choices=["error", "synthetic"], default="error",
+                        help="回放未命中时返回 404 还是合成响应")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="预设的延迟画像，单独指定的参数优先")
+    parser.add_argument("--latency", help="首包延迟分布，如 fixed:0.2、uniform:0.1,0.5、lognormal:0.6,0.35")
+    parser.add_argument("--per-item-latency", type=float, default=0.0, help="向量接口每条文本的附加延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, help="生成速度；0 表示不限")
+    parser.add_argument("--error-rate", type=float, help="注入错误的概率")
+    parser.add_argument("--error-codes", default="429,500,503", help="注入错误时随机选用的状态码")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=64, help="合成向量维度")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="合成模式下的对话回答")
+    parser.add_argument("--upstream-openai", default="https://api.openai.com/v1")
+    parser.add_argument("--upstream-anthropic", default="https://api.anthropic.com")
+    return parser
+
+
+def server_from_args(args: argparse.Namespace) -> StandInServer:
+    profile = PROFILES.get(args.profile or "fast")
+    return StandInServer(
+        mode=args.mode,
+        cassette=args.cassette,
+        on_miss=args.on_miss,
+        latency=args.latency if args.latency is not None else profile["latency"],
+        per_item_latency=args.per_item_latency,
+        tokens_per_second=(
+            args.tokens_per_second if args.tokens_per_second is not None else profile["tokens_per_second"]
+        ),
+        error_rate=args.error_rate if args.error_rate is not None else profile["error_rate"],
+        error_codes=tuple(int(code) for code in args.error_codes.split(",") if code.strip()),
+        seed=args.seed,
+        dim=args.dim,
+        reply=args.reply,
+        upstream_openai=args.upstream_openai,
+        upstream_anthropic=args.upstream_anthropic,
+        host=args.host,
+        port=args.port,
+    )
+
+
+def spawn(*cli_args: str, **options):
+    """在独立进程中启动替身服务，避免与被测进程争抢 GIL；返回 (进程, OpenAI base_url)
+
+    options 按命令行参数名传入，如 spawn(latency="fixed:0.2", tokens_per_second=60)
+    """
+    import subprocess
+    import sys
+
+    args = [sys.executable, str(Path(__file__).resolve()), "--port", "0", *cli_args]
+    for name, value in options.items():
+        args += [f"--{name.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    with server_from_args(args) as server:
+        # 第一行输出 OpenAI base_url，供 spawn 读取
+        print(server.base_url, flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
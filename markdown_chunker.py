@@ -0,0 +1,173 @@
+"""
+按 Markdown 标题结构切分知识库
+- 以 #/##/### 标题为边界，一个分块不会跨越两个目标小节；小节超长时按段落、再按行拼到 max_chars
+- 每个分块是原文的连续片段，附带起始位置、标题路径（section）和能力维度（dimension）
+- 维度按标题关键词判断，与评估的能力项对应；家长问答、资源推荐等不属于具体能力的归为 general
+- load_chunks 把切分结果缓存到 JSON：文件 mtime 和大小未变时直接读缓存，变化时再按内容哈希确认
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+CHUNKER_VERSION = 1
+SECTION_SEPARATOR = " > "
+GENERAL = "general"
+
+# 维度 -> 标题或问题中出现即归入该维度的关键词；按顺序匹配，先命中的优先
+DIMENSION_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "language": ("语言", "倾听", "表达", "阅读", "书写", "写字", "识字", "绘本", "讲故事"),
+    "math": ("数学", "数数", "计数", "点数", "运算", "加减", "形状", "图形", "空间", "方位"),
+    "social": ("社交", "交朋友", "同伴", "合作", "分享"),
+    "self_care": ("自理", "穿衣", "整理", "书包"),
+    "motor": ("运动", "动作", "握笔"),
+    "learning_habits": ("学习习惯", "注意力", "专注", "时间观念", "作业"),
+}
+
+# 评估档案字段 -> 维度，用于按孩子的薄弱项过滤检索范围
+PROFILE_DIMENSIONS = {
+    "listening": "language",
+    "expression": "language",
+    "reading": "language",
+    "writing_interest": "language",
+    "counting": "math",
+    "operation": "math",
+    "shapes": "math",
+    "space": "math",
+    "social": "social",
+    "self_care": "self_care",
+    "motor": "motor",
+}
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_BLANK_LINES = re.compile(r"\n[ \t]*\n")
+
+
+def detect_dimensions(text: str) -> List[str]:
+    """文本中提到的能力维度，按 DIMENSION_KEYWORDS 的顺序"""
+    return [dim for dim, words in DIMENSION_KEYWORDS.items() if any(word in text for word in words)]
+
+
+def _section_dimension(headings: Sequence[str]) -> str:
+    # 从最深的标题往上找，"Q: 孩子写字姿势不正确怎么办？" 归语言而不是其上级的"家长常见问题"
+    for heading in reversed(headings):
+        found = detect_dimensions(heading)
+        if found:
+            return found[0]
+    return GENERAL
+
+
+def _sections(text: str) -> Iterable[Tuple[int, int, List[str]]]:
+    """(起始位置, 结束位置, 标题路径)；每段从标题行开始，到下一个标题之前结束"""
+    headings: List[Tuple[int, str]] = []
+    start, path = 0, []
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        match = _HEADING.match(line.rstrip("\r\n"))
+        if match:
+            if offset > start:
+                yield start, offset, path
+            level = len(match.group(1))
+            headings = [(lvl, title) for lvl, title in headings if lvl < level] + [(level, match.group(2))]
+            start, path = offset, [title for _, title in headings]
+        offset += len(line)
+    if offset > start:
+        yield start, offset, path
+
+
+def _pieces(text: str, start: int, end: int, max_chars: int) -> Iterable[Tuple[int, int]]:
+    """把 [start, end) 切成不超过 max_chars 的片段：先按空行分段，段落超长再按行，单行超长按字数"""
+    if end - start <= max_chars:
+        yield start, end
+        return
+    cuts = [m.end() for m in _BLANK_LINES.finditer(text, start, end) if m.end() < end]
+    if not cuts:
+        cuts = [i + 1 for i in range(start, end - 1) if text[i] == "\n"]
+    if not cuts:
+        for pos in range(start, end, max_chars):
+            yield pos, min(pos + max_chars, end)
+        return
+    bounds = [start] + cuts + [end]
+    for left, right in zip(bounds, bounds[1:]):
+        if right > left:
+            yield from _pieces(text, left, right, max_chars)
+
+
+def chunk_markdown(text: str, max_chars: int = 500) -> List[Dict]:
+    """返回 [{"text", "offset", "section", "dimension"}]；相邻的小段落在同一小节内合并到 max_chars"""
+    chunks: List[Dict] = []
+    for sec_start, sec_end, path in _sections(text):
+        section = SECTION_SEPARATOR.join(path)
+        dimension = _section_dimension(path)
+        pending: Optional[List[int]] = None
+        spans: List[List[int]] = []
+        for left, right in _pieces(text, sec_start, sec_end, max_chars):
+            if pending is not None and right - pending[0] <= max_chars:
+                pending[1] = right
+            else:
+                pending = [left, right]
+                spans.append(pending)
+        for left, right in spans:
+            raw = text[left:right]
+            body = raw.strip()
+            if not body or _HEADING.match(body):
+                continue  # 只有标题、没有正文的小节由其下级小节的标题路径体现
+            chunks.append({
+                "text": body,
+                "offset": left + (len(raw) - len(raw.lstrip())),
+                "section": section,
+                "dimension": dimension,
+            })
+    return chunks
+
+
+def load_chunks(path: Path, cache_path: Optional[Path] = None, max_chars: int = 500) -> Tuple[List[Dict], str]:
+    """读取（或生成并缓存）切分结果，返回 (分块列表, 切分结果哈希)
+
+    缓存以 (文件 mtime, 大小) 为快速键，命中时不读原文；mtime 变了但内容哈希不变（如 touch、重新检出）时只更新缓存中的 mtime。
+    切分结果哈希包含切分器版本和参数，可作为下游索引的 source_hash。
+    """
+    path = Path(path)
+    stat = path.stat()
+    params = {"version": CHUNKER_VERSION, "max_chars": max_chars}
+    cached: Dict = {}
+    if cache_path is not None:
+        try:
+            cached = json.loads(Path(cache_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            cached = {}
+        if cached.get("params") != params:
+            cached = {}
+        if cached and cached.get("mtime_ns") == stat.st_mtime_ns and cached.get("size") == stat.st_size:
+            return cached["chunks"], cached["chunks_hash"]
+
+    text = path.read_text(encoding="utf-8")
+    source_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if cached and cached.get("source_hash") == source_hash:
+        chunks, chunks_hash = cached["chunks"], cached["chunks_hash"]
+    else:
+        chunks = chunk_markdown(text, max_chars=max_chars)
+        chunks_hash = hashlib.sha256(
+            json.dumps([params, chunks], ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    if cache_path is not None:
+        payload = {
+            "params": params,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "source_hash": source_hash,
+            "chunks_hash": chunks_hash,
+            "chunks": chunks,
+        }
+        cache_path = Path(cache_path)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+            tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            tmp_path.replace(cache_path)
+        except OSError:
+            pass  # 只读环境下每次重新切分
+    return chunks, chunks_hash
@@ -0,0 +1,309 @@
+"""
+运行指标：各阶段耗时、LLM token 数、缓存命中、错误计数
+- span("retrieve") 计时一个阶段，异常时记一次错误
+- llm_callbacks(provider) 挂到 LLM 上，记录每次调用的耗时、token 数和错误
+- render_prometheus() 输出 Prometheus 文本格式；start_http_server(port) 在后台线程提供 /metrics
+- stage_summary() 给 Streamlit 指标页使用：最近一段时间各阶段的 p50/p95/p99
+只依赖标准库，进程内全局共享一份
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# 秒；覆盖从内存检索（毫秒以下）到长计划生成（一分钟以上）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+WINDOW = 2048  # 每个序列保留最近多少个样本用于计算分位数
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_HELP = {
+    "kg_stage_seconds": "各处理阶段耗时（秒）",
+    "kg_stage_errors_total": "各处理阶段抛出的异常数",
+    "kg_llm_seconds": "单次 LLM 调用耗时（秒）",
+    "kg_llm_requests_total": "LLM 调用次数",
+    "kg_llm_errors_total": "LLM 调用失败次数",
+    "kg_llm_tokens_total": "LLM token 用量",
+    "kg_cache_requests_total": "缓存查询次数",
+    "kg_llm_route_total": "路由到各网关的调用次数",
+    "kg_llm_hedge_total": "对冲请求发出 / 胜出次数",
+    "kg_http_requests_total": "HTTP 接口请求数",
+    "kg_http_seconds": "HTTP 接口处理耗时（秒）",
+    "kg_http_rejected_total": "因排队超时被拒绝的请求数",
+    "kg_tenant_loads_total": "地区知识库加载次数",
+    "kg_tenant_evictions_total": "地区知识库因内存预算被卸载的次数",
+}
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (
+        f'{key}="{value.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), "")}"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count", "recent")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.recent: Deque[float] = deque(maxlen=WINDOW)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[None]:
+        """计时一个阶段；异常照常抛出，同时按异常类型计数（取消、生成器提前关闭不算错误）"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as exc:
+            self.inc("kg_stage_errors_total", stage=stage, error=type(exc).__name__, **labels)
+            raise
+        finally:
+            self.observe("kg_stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def counters(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"name": name, **dict(labels), "value": value}
+                for name, series in sorted(self._counters.items())
+                for labels, value in sorted(series.items())
+            ]
+
+    def histogram_summary(self, name: str) -> List[Dict]:
+        """每个序列最近 WINDOW 个样本的分位数（毫秒）与累计次数"""
+        with self._lock:
+            snapshot = [
+                (labels, sorted(histogram.recent), histogram.count, histogram.total)
+                for labels, histogram in sorted(self._histograms.get(name, {}).items())
+            ]
+        rows = []
+        for labels, ordered, count, total in snapshot:
+            rows.append({
+                **dict(labels),
+                "count": count,
+                "p50_ms": percentile(ordered, 50) * 1000,
+                "p95_ms": percentile(ordered, 95) * 1000,
+                "p99_ms": percentile(ordered, 99) * 1000,
+                "mean_ms": total / count * 1000 if count else 0.0,
+            })
+        return rows
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+span = REGISTRY.span
+render_prometheus = REGISTRY.render_prometheus
+
+
+def stage_summary() -> List[Dict]:
+    return REGISTRY.histogram_summary("kg_stage_seconds")
+
+
+def llm_summary() -> List[Dict]:
+    return REGISTRY.histogram_summary("kg_llm_seconds")
+
+
+def cache_event(cache: str, result: str) -> None:
+    """result 为 hit / semantic_hit / miss"""
+    REGISTRY.inc("kg_cache_requests_total", cache=cache, result=result)
+
+
+# ==================== LLM 回调 ====================
+
+_callback_class = None
+
+
+def _usage(response) -> Tuple[int, int]:
+    """从 LLMResult 中取提供方返回的 (prompt, completion) token 数；没有返回用量时为 (0, 0)"""
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+    if not (prompt or completion):
+        token_usage = (response.llm_output or {}).get("token_usage") or (response.llm_output or {}).get("usage") or {}
+        prompt = token_usage.get("prompt_tokens", token_usage.get("input_tokens", 0)) or 0
+        completion = token_usage.get("completion_tokens", token_usage.get("output_tokens", 0)) or 0
+    return prompt, completion
+
+
+def _estimate_usage(prompts: List[str], response) -> Tuple[int, int]:
+    from token_budget import count_tokens
+
+    completion = "".join(generation.text for generations in response.generations for generation in generations)
+    return sum(count_tokens(text) for text in prompts), count_tokens(completion)
+
+
+def _message_text(messages) -> List[str]:
+    return [
+        message.content if isinstance(message.content, str) else str(message.content)
+        for batch in messages
+        for message in batch
+    ]
+
+
+def llm_callbacks(provider: str) -> list:
+    """返回挂到 LLM 上的回调列表（LangChain 按需导入）"""
+    global _callback_class
+    if _callback_class is None:
+        try:
+            from langchain_core.callbacks import BaseCallbackHandler
+        except ImportError:  # fallback for older langchain
+            from langchain.callbacks.base import BaseCallbackHandler
+
+        class MetricsCallbackHandler(BaseCallbackHandler):
+            def __init__(self, provider: str):
+                self.provider = provider
+                self._starts: Dict[object, Tuple[float, object]] = {}
+
+            def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+                self._starts[run_id] = (time.perf_counter(), prompts)
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+                self._starts[run_id] = (time.perf_counter(), messages)
+
+            def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+                start, inputs = self._starts.pop(run_id, (None, None))
+                if start is not None:
+                    REGISTRY.observe("kg_llm_seconds", time.perf_counter() - start, provider=self.provider)
+                REGISTRY.inc("kg_llm_requests_total", provider=self.provider, status="ok")
+                prompt, completion = _usage(response)
+                source = "usage"
+                if not (prompt or completion) and inputs is not None:
+                    # 网关不返回用量时按本地分词估算
+                    texts = inputs if inputs and isinstance(inputs[0], str) else _message_text(inputs)
+                    prompt, completion = _estimate_usage(texts, response)
+                    source = "estimate"
+                if prompt:
+                    REGISTRY.inc("kg_llm_tokens_total", prompt, provider=self.provider, type="prompt", source=source)
+                if completion:
+                    REGISTRY.inc(
+                        "kg_llm_tokens_total", completion, provider=self.provider, type="completion", source=source
+                    )
+
+            def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+                self._starts.pop(run_id, None)
+                REGISTRY.inc("kg_llm_requests_total", provider=self.provider, status="error")
+                REGISTRY.inc("kg_llm_errors_total", provider=self.provider, error=type(error).__name__)
+
+        _callback_class = MetricsCallbackHandler
+    return [_callback_class(provider)]
+
+
+# ==================== /metrics 服务 ====================
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """在后台线程提供 /metrics；同一进程只启动一次，端口被占用时返回 None"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
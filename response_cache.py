@@ -0,0 +1,219 @@
+"""
+问答回答缓存：放在 KindergartenAgent.chat 之前
+- 精确命中：归一化后的问题 + 知识库版本
+- 语义命中（可选）：问题向量余弦相似度超过阈值
+内存 LRU 做前置层，SQLite 做持久层，Streamlit 重启后缓存仍然有效
+语义命中用的问题向量同样最多保留 max_entries 条（最近使用的），按知识库版本分组，
+某个版本第一次查询时才从 SQLite 载入；每个版本的向量矩阵在条目变化后才重建
+"""
+
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from caching import LRUCache, SQLiteCache
+
+_PUNCTUATION = re.compile(r"[\s\?？!！。．.,，、~～…]+")
+
+
+def normalize_question(question: str) -> str:
+    """全角转半角、小写、去掉空白和标点，让“需要提前学拼音吗？”与“需要提前学拼音吗”命中同一条"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _PUNCTUATION.sub("", text)
+
+
+def _normalize_vector(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        store: Optional[SQLiteCache] = None,
+        embeddings: Any = None,
+        similarity_threshold: float = 0.0,
+        max_entries: int = 1000,
+        ttl: float = 0,
+    ):
+        self.store = store
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.embeddings = embeddings if similarity_threshold > 0 else None
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # key -> (版本, 写入时间, 向量)；按最近使用排序，与内存层、SQLite 层同样的条目上限
+        self._vectors: "OrderedDict[str, Tuple[str, float, List[float]]]" = OrderedDict()
+        self._matrices: Dict[str, Tuple[List[str], Any]] = {}  # 版本 -> (keys, 向量矩阵)
+        self._loaded_versions: Set[str] = set()
+        self._query_vectors = LRUCache(max_entries=256)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(question: str, version: str) -> str:
+        raw = f"{version}\n{normalize_question(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _embed(self, question: str) -> List[float]:
+        """未命中时 get 与 put 会先后向量化同一问题，这里只请求一次"""
+        vector = self._query_vectors.get(question)
+        if vector is None:
+            vector = _normalize_vector(self.embeddings.embed_query(question))
+            self._query_vectors.set(question, vector)
+        return vector
+
+    # ---------- 语义命中用的向量 ----------
+
+    def _remember(self, key: str, version: str, created_at: float, vector: List[float]) -> None:
+        """调用方持有 self._lock"""
+        self._vectors[key] = (version, created_at, vector)
+        self._vectors.move_to_end(key)
+        self._matrices.pop(version, None)
+        while len(self._vectors) > self.max_entries:
+            _, (evicted_version, _, _) = self._vectors.popitem(last=False)
+            self._matrices.pop(evicted_version, None)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            entry = self._vectors.pop(key, None)
+            if entry is not None:
+                self._matrices.pop(entry[0], None)
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            if key in self._vectors:
+                self._vectors.move_to_end(key)
+
+    def _load_version(self, version: str) -> None:
+        """某个版本第一次做语义匹配时，从 SQLite 载入该版本最近的向量；旧版本的条目不载入"""
+        with self._lock:
+            if version in self._loaded_versions:
+                return
+            self._loaded_versions.add(version)
+        if self.store is None:
+            return
+        stored = [
+            (entry.get("created_at", 0.0), key, entry["vector"])
+            for key, entry in self.store.items()
+            if entry.get("version") == version and entry.get("vector")
+        ]
+        with self._lock:
+            # 从新到旧插到最前面：载入的条目比本进程新写入的先淘汰，已满时更旧的不再载入
+            for created_at, key, vector in sorted(stored, key=lambda item: item[0], reverse=True):
+                if len(self._vectors) >= self.max_entries:
+                    break
+                if key not in self._vectors:
+                    self._vectors[key] = (version, created_at, vector)
+                    self._vectors.move_to_end(key, last=False)
+            self._matrices.pop(version, None)
+
+    def _matrix(self, version: str) -> Tuple[List[str], Any]:
+        """该版本未过期的向量矩阵；条目不变时复用，调用方持有 self._lock"""
+        import numpy as np
+
+        cached = self._matrices.get(version)
+        if cached is not None:
+            return cached
+        expired_before = time.time() - self.ttl if self.ttl > 0 else None
+        keys, vectors = [], []
+        for key, (entry_version, created_at, vector) in list(self._vectors.items()):
+            if expired_before is not None and created_at and created_at < expired_before:
+                del self._vectors[key]  # 内存层和 SQLite 层的这一条也已过期
+                if entry_version != version:
+                    self._matrices.pop(entry_version, None)
+            elif entry_version == version:
+                keys.append(key)
+                vectors.append(vector)
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else None
+        self._matrices[version] = (keys, matrix)
+        return keys, matrix
+
+    # ---------- 读写 ----------
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        entry = self.memory.get(key)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def get_memory(self, question: str, version: str) -> Optional[str]:
+        """只查内存层，不读 SQLite、不做语义匹配，可在事件循环里直接调用；未命中时不计入 misses，再调用 get"""
+        entry = self.memory.get(self.make_key(question, version))
+        if entry is None:
+            return None
+        self.hits += 1
+        return entry["answer"]
+
+    def get(self, question: str, version: str) -> Optional[str]:
+        key = self.make_key(question, version)
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            if self.embeddings is not None:
+                self._touch(key)
+            return entry["answer"]
+
+        if self.embeddings is not None:
+            self._load_version(version)
+            try:
+                match = self._nearest(question, version)
+            except Exception:
+                match = None  # 向量服务不可用时只用精确命中
+            if match is not None:
+                entry = self._lookup(match)
+                if entry is not None:
+                    self.semantic_hits += 1
+                    self._touch(match)
+                    return entry["answer"]
+                self._forget(match)  # 已过期或被淘汰
+
+        self.misses += 1
+        return None
+
+    def _nearest(self, question: str, version: str) -> Optional[str]:
+        import numpy as np
+
+        with self._lock:
+            keys, matrix = self._matrix(version)
+        if not keys:
+            return None
+        query = np.asarray(self._embed(question), dtype=np.float32)
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return keys[best]
+
+    def put(self, question: str, version: str, answer: str) -> None:
+        key = self.make_key(question, version)
+        entry: Dict[str, Any] = {"version": version, "question": question, "answer": answer}
+        if self.embeddings is not None:
+            try:
+                entry["vector"] = self._embed(question)
+            except Exception:
+                pass  # 向量化失败只影响语义命中，不影响精确命中
+            else:
+                entry["created_at"] = time.time()
+                with self._lock:
+                    self._remember(key, version, entry["created_at"], entry["vector"])
+        self.memory.set(key, entry)
+        if self.store is not None:
+            self.store.set(key, entry)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+        with self._lock:
+            self._vectors.clear()
+            self._matrices.clear()
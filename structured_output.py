@@ -0,0 +1,121 @@
+"""
+按 pydantic 模型逐字段校验 LLM 的 JSON 输出
+- 流式输出时，每个顶层字段一结束（下一个键出现）就立即校验，格式错误尽早发现
+- 输出结束后只把缺失或不合格的字段列出来，调用方只需让模型重写这几个字段，不必重新生成全部内容
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+
+def _parse_partial_json(text: str):
+    try:
+        from langchain_core.utils.json import parse_partial_json
+    except ImportError:  # fallback for older langchain
+        from langchain.output_parsers.json import parse_partial_json
+    return parse_partial_json(text)
+
+
+def extract_json_object(text: str) -> Tuple[Optional[dict], bool]:
+    """取出文本中第一个 JSON 对象，返回 (对象, 是否完整)
+
+    完整对象用 raw_decode 取出（忽略前后的说明文字、代码块标记），被截断的对象按部分 JSON 解析
+    """
+    start = text.find("{")
+    while start >= 0:
+        complete = True
+        try:
+            value, _ = json.JSONDecoder().raw_decode(text, start)
+        except ValueError:
+            value, complete = _parse_partial_json(text[start:]), False
+        if isinstance(value, dict):
+            return value, complete
+        start = text.find("{", start + 1)
+    return None, False
+
+
+def _error_summary(exc: ValidationError) -> str:
+    error = exc.errors()[0]
+    location = ".".join(str(part) for part in error.get("loc", ()))
+    return f"{location}: {error.get('msg')}" if location else str(error.get("msg"))
+
+
+class IncrementalModelParser:
+    """把 JSON 文本或字典逐字段校验成 model 的字段；只关心 fields 中的字段（默认全部）"""
+
+    def __init__(self, model: Type[BaseModel], fields: Optional[Iterable[str]] = None):
+        self.model = model
+        names = list(fields) if fields is not None else list(model.model_fields)
+        self._adapters = {name: TypeAdapter(model.model_fields[name].annotation) for name in names}
+        self.text = ""
+        self.partial: dict = {}
+        self.valid: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+
+    def _check(self, name: str, value: Any) -> None:
+        adapter = self._adapters.get(name)
+        if adapter is None or name in self.valid:
+            return
+        try:
+            self.valid[name] = adapter.validate_python(value)
+        except ValidationError as exc:
+            self.errors[name] = _error_summary(exc)
+        else:
+            self.errors.pop(name, None)
+
+    def feed(self, piece: str) -> Optional[dict]:
+        """追加一段流式文本；解析出的部分对象有变化时返回它，否则返回 None"""
+        self.text += piece
+        start = self.text.find("{")
+        if start < 0:
+            return None
+        partial = _parse_partial_json(self.text[start:])
+        if not isinstance(partial, dict) or not partial or partial == self.partial:
+            return None
+        # 最后一个键可能还没写完，其余字段已经完整，可以立即校验
+        for name in list(partial)[:-1]:
+            self._check(name, partial[name])
+        self.partial = partial
+        return partial
+
+    def feed_object(self, data: Any) -> None:
+        """直接校验一个已解析好的对象（如工具调用的参数）"""
+        if isinstance(data, BaseModel):
+            data = data.model_dump()
+        if isinstance(data, dict):
+            self.partial = data
+            for name, value in data.items():
+                self._check(name, value)
+
+    def finish(self) -> None:
+        """输出结束：用完整文本重新取对象，校验剩余字段；输出被截断时最后一个字段视为不完整"""
+        names = list(self.partial)
+        if self.text:
+            data, complete = extract_json_object(self.text)
+            if data is not None:
+                self.partial = data
+                names = list(data) if complete else list(data)[:-1]
+        for name in names:
+            self._check(name, self.partial[name])
+
+    @property
+    def broken_fields(self) -> List[str]:
+        """缺失或校验失败的字段，按模型字段顺序"""
+        return [name for name in self._adapters if name not in self.valid]
+
+    def merge(self, other: "IncrementalModelParser") -> None:
+        """用修复结果补上本对象中不合格的字段"""
+        for name, value in other.valid.items():
+            if name in self._adapters and name not in self.valid:
+                self.valid[name] = value
+                self.errors.pop(name, None)
+
+    def result(self) -> dict:
+        """已通过校验的字段，按模型字段顺序转成可 JSON 序列化的字典"""
+        return {
+            name: self._adapters[name].dump_python(self.valid[name], mode="json")
+            for name in self._adapters
+            if name in self.valid
+        }
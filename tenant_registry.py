@@ -0,0 +1,130 @@
+"""
+多租户（地区）资源注册表：按租户名懒加载，总内存超出预算时按最近最少使用淘汰
+- 首次用到某个租户时才调用 loader 构建；同一租户并发的首次请求只构建一次，不同租户可以并行构建
+- size_of 估算每个对象的常驻内存；超出 max_bytes 时淘汰最久未用的租户（刚加载的和 pinned 的不淘汰）
+- 被淘汰的对象从注册表移除后交给 on_evict 释放外部资源（如 Chroma 按目录常驻的 System，
+  只靠垃圾回收释放不了）；on_evict 在注册表的锁外调用，释放时仍在使用该对象的请求可能失败
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TenantRegistry:
+    def __init__(
+        self,
+        loader: Callable[[str], Any],
+        size_of: Callable[[Any], int],
+        max_bytes: int,
+        pinned: Optional[Dict[str, Any]] = None,
+        on_evict: Optional[Callable[[Any], None]] = None,
+    ):
+        self.loader = loader
+        self.size_of = size_of
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._pinned: Dict[str, Any] = dict(pinned or {})
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def peek(self, tenant: str) -> Optional[Any]:
+        """已加载时返回对象（并记为最近使用），否则返回 None，不触发加载"""
+        with self._lock:
+            return self._touch(tenant)
+
+    def _touch(self, tenant: str) -> Optional[Any]:
+        if tenant in self._pinned:
+            return self._pinned[tenant]
+        item = self._entries.get(tenant)
+        if item is not None:
+            self._entries.move_to_end(tenant)
+            self._last_used[tenant] = time.time()
+        return item
+
+    def get(self, tenant: str) -> Any:
+        """返回租户的对象，未加载时构建；loader 抛出的异常原样抛出，不缓存失败结果"""
+        with self._lock:
+            item = self._touch(tenant)
+            if item is not None:
+                return item
+            loading = self._loading.setdefault(tenant, threading.Lock())
+
+        try:
+            with loading:
+                with self._lock:
+                    item = self._touch(tenant)
+                    if item is not None:
+                        return item
+                with metrics.span("load_tenant"):
+                    item = self.loader(tenant)
+                size = self.size_of(item)
+                metrics.inc("kg_tenant_loads_total")
+                with self._lock:
+                    self._entries[tenant] = item
+                    self._sizes[tenant] = size
+                    self._last_used[tenant] = time.time()
+                    evicted = self._evict(keep=tenant)
+                self._release(evicted)
+            return item
+        finally:
+            # 加载失败时也要移除：租户名来自请求，不存在的名字不能一直占着条目
+            with self._lock:
+                if self._loading.get(tenant) is loading:
+                    del self._loading[tenant]
+
+    def _evict(self, keep: str) -> List[Any]:
+        evicted = []
+        while self.total_bytes > self.max_bytes:
+            victim = next((tenant for tenant in self._entries if tenant != keep), None)
+            if victim is None:
+                break  # 只剩刚加载的租户，即使超出预算也保留
+            evicted.append(self._drop(victim))
+            metrics.inc("kg_tenant_evictions_total")
+        return evicted
+
+    def _drop(self, tenant: str) -> Any:
+        # 调用方持有 self._lock；返回的对象在锁外交给 _release
+        self._sizes.pop(tenant, None)
+        self._last_used.pop(tenant, None)
+        return self._entries.pop(tenant, None)
+
+    def _release(self, items: List[Any]) -> None:
+        if self.on_evict is None:
+            return
+        for item in items:
+            try:
+                self.on_evict(item)
+            except Exception:
+                # 释放失败不影响本次请求，最多是这部分内存暂时收不回来
+                logger.exception("释放被卸载的租户对象失败")
+
+    def evict(self, tenant: str) -> bool:
+        """手动卸载（如知识库文件更新后）；下次使用时重新加载"""
+        with self._lock:
+            if tenant not in self._entries:
+                return False
+            item = self._drop(tenant)
+        self._release([item])
+        return True
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def loaded(self) -> List[Dict]:
+        """已加载的租户（不含 pinned），最近使用的在前"""
+        with self._lock:
+            return [
+                {"tenant": tenant, "bytes": self._sizes[tenant], "last_used": self._last_used[tenant]}
+                for tenant in reversed(self._entries)
+            ]
@@ -0,0 +1,76 @@
+"""
+Token 计数与截断
+优先使用 tiktoken；离线等无法加载编码表的环境下退化为估算：中日韩字符每字 1 个 token，其余字符约 4 个算 1 个 token
+"""
+
+import math
+import re
+import threading
+from typing import Any, Dict, Optional
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_DEFAULT_ENCODING = "cl100k_base"
+
+
+_encodings: Dict[Optional[str], Any] = {}
+_encodings_lock = threading.RLock()  # 未知模型名时会在持锁状态下加载默认编码
+
+
+def _load_encoding(model: Optional[str]):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(_DEFAULT_ENCODING)
+    except KeyError:  # 未知模型名
+        return _encoding(None) if model else None
+    except Exception:
+        return None
+
+
+def _encoding(model: Optional[str]):
+    """每个模型只加载一次；加载失败也记为 None，避免并发请求各自重新尝试下载编码表"""
+    try:
+        return _encodings[model]
+    except KeyError:
+        pass
+    with _encodings_lock:
+        if model not in _encodings:
+            _encodings[model] = _load_encoding(model)
+        return _encodings[model]
+
+
+def _estimate(text: str) -> int:
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return _estimate(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """保留开头不超过 max_tokens 个 token 的部分"""
+    if max_tokens <= 0 or not text:
+        return ""
+    encoding = _encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    if _estimate(text) <= max_tokens:
+        return text
+    # 估算值随长度单调不减，二分找最长的前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if _estimate(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
@@ -0,0 +1,128 @@
+"""
+进程内向量索引：Chroma 的轻量替代
+- 分块向量按行归一化后存成 .npy 矩阵（float32 或 float16），加载时以内存映射方式打开，不整体读入内存
+- 查询为归一化点积，argpartition 取前 k，只对这 k 个排序
+- 分块文本与元数据存在同目录的 JSON 中；知识库内容、向量模型或存储精度变化时 load 返回 None，由调用方重建
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_VERSION = 1
+BLOCK_ROWS = 8192  # float16 矩阵分块转成 float32 计算，临时内存有上限
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "index.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # 零向量保持为零，得分恒为 0
+    return matrix / norms
+
+
+class VectorIndex:
+    def __init__(self, matrix: np.ndarray, chunks: List[str], source_hash: str = "", model: str = ""):
+        self.matrix = matrix
+        self.chunks = chunks
+        self.source_hash = source_hash
+        self.model = model
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def dtype(self) -> str:
+        return self.matrix.dtype.name
+
+    @classmethod
+    def build(
+        cls,
+        chunks: List[str],
+        vectors: Sequence[Sequence[float]],
+        dtype: str = "float32",
+        source_hash: str = "",
+        model: str = "",
+    ) -> "VectorIndex":
+        if len(chunks) != len(vectors):
+            raise ValueError(f"分块数 {len(chunks)} 与向量数 {len(vectors)} 不一致")
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(chunks), -1)
+        return cls(_normalize_rows(matrix).astype(dtype), list(chunks), source_hash=source_hash, model=model)
+
+    def search(
+        self, query_vector: Sequence[float], k: int = 3, rows: Optional[Sequence[int]] = None
+    ) -> List[Tuple[float, int]]:
+        """返回 [(余弦相似度, 分块序号)]，按相似度从高到低；rows 限定只在这些行中检索（只读取这些行）"""
+        ids = None if rows is None else np.asarray(rows, dtype=np.int64)
+        n = len(self.chunks) if ids is None else len(ids)
+        if n == 0 or k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        matrix = self.matrix if ids is None else self.matrix[ids]
+        if matrix.dtype == np.float32:
+            scores = matrix @ query
+        else:
+            scores = np.empty(n, dtype=np.float32)
+            for start in range(0, n, BLOCK_ROWS):
+                block = matrix[start:start + BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ query
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if ids is not None:
+            return [(float(scores[i]), int(ids[i])) for i in top]
+        return [(float(scores[i]), int(i)) for i in top]
+
+    def save(self, directory: Path) -> None:
+        """先写向量再写元数据，都经临时文件替换；中途失败时 load 会因行数不符而重建"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp_vectors = directory / (VECTORS_FILE + ".tmp")
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.matrix))
+        tmp_vectors.replace(directory / VECTORS_FILE)
+
+        payload = {
+            "version": INDEX_VERSION,
+            "source_hash": self.source_hash,
+            "model": self.model,
+            "dtype": self.dtype,
+            "shape": list(self.matrix.shape),
+            "chunks": self.chunks,
+        }
+        tmp_meta = directory / (META_FILE + ".tmp")
+        tmp_meta.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        tmp_meta.replace(directory / META_FILE)
+
+    @classmethod
+    def load(
+        cls,
+        directory: Path,
+        source_hash: Optional[str] = None,
+        model: Optional[str] = None,
+        dtype: Optional[str] = None,
+    ) -> Optional["VectorIndex"]:
+        """以内存映射方式打开索引；文件缺失、格式不符或与期望的 source_hash / model / dtype 不一致时返回 None"""
+        directory = Path(directory)
+        try:
+            payload = json.loads((directory / META_FILE).read_text(encoding="utf-8"))
+            matrix = np.load(directory / VECTORS_FILE, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != INDEX_VERSION:
+            return None
+        expected = {"source_hash": source_hash, "model": model, "dtype": dtype}
+        if any(value is not None and payload.get(key) != value for key, value in expected.items()):
+            return None
+        if list(matrix.shape) != payload.get("shape") or matrix.shape[0] != len(payload.get("chunks", [])):
+            return None
+        return cls(matrix, payload["chunks"], source_hash=payload["source_hash"], model=payload["model"])